@@ -3,6 +3,7 @@ cat > build.sh << 'EOF'
 set -o errexit
 
 pip install -r requirements.txt
+python manage.py build_static
 python manage.py collectstatic --no-input
 python manage.py migrate
 EOF
@@ -14,5 +15,6 @@ git push
 set -o errexit
 
 pip install -r requirements.txt
+python manage.py build_static
 python manage.py collectstatic --no-input
 python manage.py migrate
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""
+Configuración de gunicorn (se carga sola al ejecutar `gunicorn servicereports.wsgi`).
+
+El master carga Django y precalienta plantillas, URLconf, WeasyPrint y el logo antes del
+fork (preload_app), así los workers comparten esa memoria y su primera petición no es lenta.
+Todo se puede ajustar con variables de entorno.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Carga la app en el master y hace fork después (copy-on-write)
+preload_app = True
+
+# Reciclado de workers para contener fugas de memoria (Pango/Pillow);
+# el jitter evita que todos se reinicien al mismo tiempo
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 500))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 50))
+
+# Los PDF/Word y la memoria con Gemini pueden tardar
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# El heartbeat de los workers en disco lento puede provocar timeouts falsos
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+def when_ready(server):
+    """Se ejecuta en el master, ya con la app cargada y antes de crear los workers."""
+    from servicereports.precarga import precargar
+
+    precargar(documentos=os.environ.get('GUNICORN_PRECARGAR_DOCUMENTOS', '1') != '0')
+
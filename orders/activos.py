@@ -0,0 +1,100 @@
+"""
+Registro de activos: los equipos del cliente identificados por número de serie.
+
+Cada serie que se captura en los equipos de una orden se normaliza (mayúsculas,
+sin espacios, guiones ni puntos) y se enlaza a un único Asset. "¿Qué le hemos hecho
+a la serie X?" pasa a ser una búsqueda por índice (serie_normalizada) más un join a
+sus órdenes, en vez de recorrer los equipos de todas las órdenes.
+
+Los equipos que se guardan uno por uno (formset de la orden) se enlazan con una
+señal pre_save; las altas con bulk_create (seed_data, importacion) llaman a
+`vincular` antes de insertar. El respaldo lleva los activos y el enlace tal cual.
+"""
+import re
+import unicodedata
+
+from django.db.models.signals import pre_save
+from django.utils import timezone
+
+from .models import Asset, Equipment, ServiceOrder
+
+LARGO = Asset._meta.get_field('serie_normalizada').max_length
+_SEPARADORES = re.compile(r'[\W_]+')
+
+
+def normalizar(serie):
+    """' sn-ab 12.34 ' -> 'SNAB1234'. Cadena vacía si no hay serie."""
+    if not serie:
+        return ''
+    return _SEPARADORES.sub('', unicodedata.normalize('NFKC', serie)).upper()[:LARGO]
+
+
+def _clientes(equipos):
+    """cliente_nombre de la orden de cada equipo (order_id -> nombre), en una consulta."""
+    clientes, faltan = {}, set()
+    for e in equipos:
+        if Equipment.order.is_cached(e):
+            clientes[e.order_id] = e.order.cliente_nombre
+        elif e.order_id:
+            faltan.add(e.order_id)
+    if faltan:
+        clientes.update(ServiceOrder.objects.filter(pk__in=faltan).values_list('pk', 'cliente_nombre'))
+    return clientes
+
+
+def vincular(equipos):
+    """
+    Asigna `asset_id` a cada equipo según su serie, creando los activos que falten.
+    Marca, modelo y cliente del activo quedan con lo último capturado. No guarda los equipos.
+    """
+    por_serie = {}
+    for e in equipos:
+        clave = normalizar(e.serie)
+        if clave:
+            por_serie.setdefault(clave, []).append(e)
+        else:
+            e.asset_id = None
+    if not por_serie:
+        return
+
+    clientes = _clientes(equipos)
+    activos = Asset.objects.in_bulk(list(por_serie), field_name='serie_normalizada')
+    nuevos = [Asset(serie=grupo[0].serie.strip()[:LARGO], serie_normalizada=clave)
+              for clave, grupo in por_serie.items() if clave not in activos]
+    if nuevos:
+        # ignore_conflicts: otro proceso pudo dar de alta la misma serie entretanto
+        Asset.objects.bulk_create(nuevos, ignore_conflicts=True)
+        activos.update(Asset.objects.in_bulk([a.serie_normalizada for a in nuevos], field_name='serie_normalizada'))
+
+    cambiados, ahora = [], timezone.now()
+    for clave, grupo in por_serie.items():
+        activo = activos[clave]
+        ultimo = grupo[-1]
+        datos = {'marca': ultimo.marca, 'modelo': ultimo.modelo, 'cliente_nombre': clientes.get(ultimo.order_id)}
+        datos = {campo: valor.strip()[:Asset._meta.get_field(campo).max_length]
+                 for campo, valor in datos.items() if valor and valor.strip()}
+        if any(getattr(activo, campo) != valor for campo, valor in datos.items()):
+            for campo, valor in datos.items():
+                setattr(activo, campo, valor)
+            activo.actualizado = ahora
+            cambiados.append(activo)
+        for e in grupo:
+            e.asset_id = activo.pk
+    if cambiados:
+        Asset.objects.bulk_update(cambiados, ['marca', 'modelo', 'cliente_nombre', 'actualizado'])
+
+
+def buscar(texto):
+    """Activos cuya serie normalizada empieza con `texto` (usa activo_serie_prefijo_idx)."""
+    clave = normalizar(texto)
+    if not clave:
+        return Asset.objects.none()
+    return Asset.objects.filter(serie_normalizada__startswith=clave).order_by('serie_normalizada')
+
+
+def _antes_de_guardar_equipo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        vincular([instance])
+
+
+pre_save.connect(_antes_de_guardar_equipo, sender=Equipment)
@@ -0,0 +1,197 @@
+"""
+Agenda de visitas reagendadas (reagenda, reagenda_fecha, reagenda_hora).
+
+La página de agenda (una semana, un ingeniero o todos) y el calendario .ics de cada
+usuario leen lo mismo: `visitas(desde, hasta, nombres)`, que sale del índice parcial
+orden_reagenda_idx (reagenda_fecha, ingeniero_nombre) WHERE reagenda.
+
+El ingeniero de una orden es texto (ingeniero_nombre): a un usuario le tocan las
+órdenes con su nombre completo o su username, igual que al buscar su firma.
+
+Los clientes de calendario consultan el .ics cada pocos minutos. Su ETag sale de una
+versión en caché (`versiones`) que cambia al confirmarse el guardado o borrado de una
+orden (señales aquí; borrado, importacion y seed_data llaman a `invalidar`), así que si nada cambió la
+respuesta es un 304 sin consultar órdenes ni generar el calendario. El .ics generado
+también queda en caché bajo su ETag.
+
+El calendario no usa la sesión (los clientes de calendario no la tienen): la URL lleva
+un token por usuario firmado con SECRET_KEY y su hash de contraseña; cambiar la
+contraseña invalida la URL anterior.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from . import versiones
+from .models import ServiceOrder
+
+CACHE_VERSION = 'agenda:version'
+DURACION_CACHE = 60 * 60
+SAL_TOKEN = 'orders.agenda.calendario'
+
+# El .ics lleva del mes pasado a medio año adelante
+DIAS_ATRAS = 30
+DIAS_ADELANTE = 180
+# Las órdenes no dicen cuánto dura la visita
+DURACION_VISITA = timedelta(hours=1)
+
+CAMPOS = ('folio', 'cliente_nombre', 'ubicacion', 'titulo', 'ingeniero_nombre', 'reagenda_fecha',
+          'reagenda_hora', 'reagenda_motivo', 'actualizado')
+
+
+def nombres_de(user):
+    """Cómo puede aparecer el usuario en ingeniero_nombre."""
+    return sorted({n for n in (user.get_full_name().strip(), user.username) if n})
+
+
+def lunes(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def visitas(desde, hasta, nombres=None):
+    """Órdenes reagendadas con fecha en [desde, hasta), de los ingenieros `nombres` (o de todos)."""
+    qs = ServiceOrder.objects.filter(reagenda=True, reagenda_fecha__gte=desde, reagenda_fecha__lt=hasta)
+    if nombres is not None:
+        qs = qs.filter(ingeniero_nombre__in=nombres)
+    return qs.only(*CAMPOS).order_by('reagenda_fecha', 'reagenda_hora', 'ingeniero_nombre', 'folio')
+
+
+def ingenieros():
+    """Nombres de ingeniero con alguna visita reagendada (selector de la agenda)."""
+    return (ServiceOrder.objects.filter(reagenda=True, reagenda_fecha__isnull=False)
+            .exclude(ingeniero_nombre__isnull=True).exclude(ingeniero_nombre='')
+            .values_list('ingeniero_nombre', flat=True).distinct().order_by('ingeniero_nombre'))
+
+
+# ------------------------------------------------------------
+# Token del calendario
+# ------------------------------------------------------------
+def _firma(user):
+    return salted_hmac(SAL_TOKEN, f'{user.pk}:{user.password}').hexdigest()[:32]
+
+
+def token(user):
+    return f'{user.pk}-{_firma(user)}'
+
+
+def usuario_del_token(valor):
+    """El usuario activo dueño del token, o None."""
+    pk, _, firma = (valor or '').partition('-')
+    if not pk.isdigit() or not firma:
+        return None
+    user = User.objects.filter(pk=pk, is_active=True).first()
+    if user is None or not constant_time_compare(firma, _firma(user)):
+        return None
+    return user
+
+
+# ------------------------------------------------------------
+# Versión (ETag) y caché
+# ------------------------------------------------------------
+def invalidar():
+    """Nueva versión al confirmarse la transacción: cambian los ETag y los .ics en caché ya no se leen."""
+    versiones.renovar(CACHE_VERSION)
+
+
+def etag(user, hoy):
+    """ETag del .ics del usuario: cambia con cualquier orden, con su nombre y con el día (la ventana se mueve)."""
+    base = f'{versiones.actual(CACHE_VERSION)}|{user.pk}|{"|".join(nombres_de(user))}|{hoy.isoformat()}'
+    return f'"{hashlib.md5(base.encode()).hexdigest()}"'
+
+
+# ------------------------------------------------------------
+# iCalendar (RFC 5545)
+# ------------------------------------------------------------
+def _texto(valor):
+    valor = (valor or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+    return valor.replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _plegar(linea):
+    """Corta a 75 octetos; las líneas de continuación empiezan con un espacio."""
+    datos = linea.encode()
+    if len(datos) <= 75:
+        return linea
+    partes, inicio, limite = [], 0, 75
+    while inicio < len(datos):
+        fin = min(inicio + limite, len(datos))
+        # No partir un carácter UTF-8 a la mitad
+        while fin < len(datos) and (datos[fin] & 0xC0) == 0x80:
+            fin -= 1
+        partes.append(datos[inicio:fin].decode())
+        inicio, limite = fin, 74
+    return '\r\n '.join(partes)
+
+
+def _utc(momento):
+    return momento.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _evento(orden, url_orden, dominio):
+    lineas = [
+        'BEGIN:VEVENT',
+        f'UID:reagenda-{orden.pk}@{dominio}',
+        f'DTSTAMP:{_utc(orden.actualizado)}',
+    ]
+    if orden.reagenda_hora:
+        inicio = timezone.make_aware(datetime.combine(orden.reagenda_fecha, orden.reagenda_hora))
+        lineas += [f'DTSTART:{_utc(inicio)}', f'DTEND:{_utc(inicio + DURACION_VISITA)}']
+    else:
+        siguiente = orden.reagenda_fecha + timedelta(days=1)
+        lineas += [f'DTSTART;VALUE=DATE:{orden.reagenda_fecha:%Y%m%d}', f'DTEND;VALUE=DATE:{siguiente:%Y%m%d}']
+    descripcion = '\n'.join(t for t in (orden.titulo, orden.reagenda_motivo, url_orden) if t)
+    lineas += [
+        f'SUMMARY:{_texto(f"{orden.cliente_nombre} ({orden.folio})")}',
+        f'DESCRIPTION:{_texto(descripcion)}',
+        f'URL:{url_orden}',
+    ]
+    if orden.ubicacion:
+        lineas.append(f'LOCATION:{_texto(orden.ubicacion)}')
+    lineas.append('END:VEVENT')
+    return lineas
+
+
+def icalendar(user, ordenes, url_orden, dominio):
+    """El .ics (texto con CRLF) con las visitas `ordenes`; `url_orden(orden)` da el enlace absoluto."""
+    nombre = user.get_full_name() or user.username
+    lineas = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//ServicioTech//Agenda de reagendas//ES',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_texto(f"Reagendas de {nombre}")}',
+        f'X-WR-TIMEZONE:{timezone.get_current_timezone_name()}',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT15M',
+    ]
+    for orden in ordenes:
+        lineas += _evento(orden, url_orden(orden), dominio)
+    lineas.append('END:VCALENDAR')
+    return ''.join(_plegar(linea) + '\r\n' for linea in lineas)
+
+
+def calendario(user, hoy, etiqueta, url_orden, dominio):
+    """El .ics del usuario con su ventana de visitas alrededor de `hoy`; se genera una vez por ETag."""
+    clave = 'agenda:ics:' + etiqueta.strip('"')
+    contenido = cache.get(clave)
+    if contenido is None:
+        ordenes = visitas(hoy - timedelta(days=DIAS_ATRAS), hoy + timedelta(days=DIAS_ADELANTE), nombres_de(user))
+        contenido = icalendar(user, ordenes, url_orden, dominio)
+        cache.set(clave, contenido, DURACION_CACHE)
+    return contenido
+
+
+# ------------------------------------------------------------
+# Señales
+# ------------------------------------------------------------
+def _al_cambiar(sender, **kwargs):
+    invalidar()
+
+
+post_save.connect(_al_cambiar, sender=ServiceOrder, dispatch_uid='agenda_orden_save')
+post_delete.connect(_al_cambiar, sender=ServiceOrder, dispatch_uid='agenda_orden_delete')
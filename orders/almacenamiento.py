@@ -0,0 +1,165 @@
+"""
+Almacenamiento por contenido para firmas y evidencias.
+
+Cada archivo se guarda como <carpeta>/<ab>/<cd>/<sha256><ext>: la misma foto o la
+misma firma subida varias veces ocupa un solo archivo, y un nombre nunca cambia de
+contenido (se puede cachear para siempre).
+
+Como varias filas pueden apuntar al mismo archivo, nunca se borra directo: al cambiar
+o borrar una fila se llama a `liberar()` después del commit, que solo elimina el archivo
+si ya nadie lo referencia. `manage.py cleanup_media` barre los huérfanos que queden.
+
+`save` y `liberar` del mismo nombre se serializan con un lock de transacción de
+PostgreSQL (pg_advisory_xact_lock). Al reutilizar un archivo que ya existe, `save`
+le renueva la fecha de modificación, y `liberar` no borra archivos con menos de
+GRACIA segundos: la fila nueva que lo va a usar puede no haber hecho commit todavía.
+Esos los recoge después cleanup_media, que respeta la misma gracia.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import time
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+# Campos de archivo que usan este almacenamiento (modelo, campo)
+CAMPOS = (
+    ('orders.EngineerProfile', 'firma'),
+    ('orders.ServiceOrder', 'firma'),
+    ('orders.ServiceEvidence', 'archivo'),
+)
+
+NOMBRE_CONTENIDO = re.compile(r'^[^/]+/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+# Igual que el --gracia por omisión de cleanup_media
+GRACIA = 60 * 60
+
+
+def es_por_contenido(nombre):
+    return bool(NOMBRE_CONTENIDO.match(nombre or ''))
+
+
+def _bloquear(nombre):
+    """Lock por nombre de archivo hasta el fin de la transacción actual (solo PostgreSQL)."""
+    if connection.vendor != 'postgresql':
+        return
+    clave = int(hashlib.sha256(nombre.encode()).hexdigest()[:15], 16)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [clave])
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        sha = hashlib.sha256()
+        content.seek(0)
+        for bloque in content.chunks():
+            sha.update(bloque)
+        content.seek(0)
+        digest = sha.hexdigest()
+
+        # La carpeta de upload_to se conserva solo como primer nivel (firmas vs evidencias)
+        carpeta = name.replace('\\', '/').split('/', 1)[0] if '/' in name else 'archivos'
+        ext = os.path.splitext(name)[1].lower()
+        nombre = posixpath.join(carpeta, digest[:2], digest[2:4], digest + ext)
+
+        # Dentro de la transacción de la vista el lock dura hasta su commit (la fila ya es visible
+        # para `liberar`); fuera de una, al menos cubre la revisión y el cambio de fecha
+        with transaction.atomic():
+            _bloquear(nombre)
+            if self.exists(nombre):
+                # Ya lo tenemos (deduplicado): la fecha nueva lo protege de `liberar` y cleanup_media
+                os.utime(self.path(nombre))
+                return nombre
+            return super().save(nombre, content, max_length=max_length)
+
+
+def almacenamiento():
+    """Callable para `storage=` (así la migración no serializa la instancia)."""
+    return _almacenamiento
+
+
+_almacenamiento = AlmacenamientoPorContenido()
+
+
+# ------------------------------------------------------------
+# Conteo de referencias
+# ------------------------------------------------------------
+def referencias(nombre):
+    total = 0
+    for modelo, campo in CAMPOS:
+        total += apps.get_model(modelo)._default_manager.filter(**{campo: nombre}).count()
+    return total
+
+
+def nombres_referenciados():
+    """Todos los nombres de archivo que alguna fila usa (para cleanup_media)."""
+    nombres = set()
+    for modelo, campo in CAMPOS:
+        nombres.update(
+            apps.get_model(modelo)._default_manager.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            .values_list(campo, flat=True).iterator()
+        )
+    return nombres
+
+
+def liberar(nombre):
+    """Borra el archivo si ya ninguna fila lo referencia y no se acaba de subir o reutilizar."""
+    if not nombre:
+        return
+    with transaction.atomic():
+        # Espera a que termine la transacción que lo esté guardando y cuenta de nuevo
+        _bloquear(nombre)
+        if referencias(nombre) or not _almacenamiento.exists(nombre):
+            return
+        if time.time() - os.path.getmtime(_almacenamiento.path(nombre)) < GRACIA:
+            return  # su fila puede no haber hecho commit aún: lo barre cleanup_media
+        _almacenamiento.delete(nombre)
+
+
+def liberar_al_confirmar(nombre):
+    if nombre:
+        transaction.on_commit(lambda: liberar(nombre))
+
+
+# ------------------------------------------------------------
+# Señales: reemplazo y borrado de archivos
+# ------------------------------------------------------------
+def _campo_de(sender):
+    etiqueta = sender._meta.label
+    return next(campo for modelo, campo in CAMPOS if modelo == etiqueta)
+
+
+def _antes_de_guardar(sender, instance, **kwargs):
+    campo = _campo_de(sender)
+    instance._archivo_anterior = None
+    if instance.pk and (kwargs.get('update_fields') is None or campo in kwargs['update_fields']):
+        instance._archivo_anterior = (
+            sender._default_manager.filter(pk=instance.pk).values_list(campo, flat=True).first()
+        )
+
+
+def _despues_de_guardar(sender, instance, **kwargs):
+    anterior = getattr(instance, '_archivo_anterior', None)
+    if anterior and anterior != getattr(instance, _campo_de(sender)).name:
+        liberar_al_confirmar(anterior)
+
+
+def _despues_de_borrar(sender, instance, **kwargs):
+    liberar_al_confirmar(getattr(instance, _campo_de(sender)).name)
+
+
+for _modelo, _ in CAMPOS:
+    pre_save.connect(_antes_de_guardar, sender=_modelo)
+    post_save.connect(_despues_de_guardar, sender=_modelo)
+    post_delete.connect(_despues_de_borrar, sender=_modelo)
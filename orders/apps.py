@@ -3,4 +3,10 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "orders"
-    verbose_name = "Órdenes de Servicio"
\ No newline at end of file
+    verbose_name = "Órdenes de Servicio"
+
+    def ready(self):
+        # Conecta las señales que invalidan el usuario en caché, las de los resúmenes
+        # diarios, la que enlaza cada equipo con su activo, las del catálogo de materiales
+        # y las que cambian el ETag de los calendarios de la agenda
+        from . import activos, agenda, autenticacion, materiales, resumenes  # noqa: F401
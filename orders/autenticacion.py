@@ -0,0 +1,94 @@
+"""
+Usuario en caché para cada petición autenticada.
+
+AuthenticationMiddleware pide el usuario al backend con el que se inició sesión
+(backend.get_user). Estos backends lo leen de la caché junto con su EngineerProfile
+(select_related) y solo van a la BD cuando no está o se invalidó al guardar.
+Junto con las sesiones cached_db, una petición normal no consulta ni django_session
+ni auth_user.
+
+La invalidación espera a que se confirme la transacción (on_commit, como en
+versiones.py): si se borrara antes, otra petición podría volver a leer el usuario
+todavía sin confirmar y dejarlo en caché otros 15 minutos.
+"""
+from allauth.account.auth_backends import AuthenticationBackend
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import EngineerProfile
+
+User = get_user_model()
+
+TIEMPO_CACHE = 60 * 15
+
+
+def llave_usuario(user_id):
+    return f"usuario:{user_id}"
+
+
+def invalidar_usuario(user_id):
+    invalidar_usuarios([user_id])
+
+
+def invalidar_usuarios(user_ids):
+    """Borra de la caché a `user_ids` al confirmarse la transacción (en seguida si no hay una)."""
+    llaves = [llave_usuario(pk) for pk in user_ids]
+    if llaves:
+        transaction.on_commit(lambda: cache.delete_many(llaves))
+
+
+class UsuarioEnCacheMixin:
+    def get_user(self, user_id):
+        user = cache.get(llave_usuario(user_id))
+        if user is None:
+            try:
+                user = User._default_manager.select_related('profile').get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            cache.set(llave_usuario(user_id), user, TIEMPO_CACHE)
+        return user if self.user_can_authenticate(user) else None
+
+
+class ModelBackendEnCache(UsuarioEnCacheMixin, ModelBackend):
+    """Login con usuario/contraseña (admin)."""
+
+
+class AllauthBackendEnCache(UsuarioEnCacheMixin, AuthenticationBackend):
+    """Login por email y Microsoft (allauth)."""
+
+
+# ------------------------------------------------------------
+# Invalidación: cualquier cambio al usuario o a su firma
+# (incluye last_login, cambio de contraseña y desactivación)
+# ------------------------------------------------------------
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def usuario_cambiado(sender, instance, **kwargs):
+    invalidar_usuario(instance.pk)
+
+
+@receiver(post_save, sender=EngineerProfile)
+@receiver(post_delete, sender=EngineerProfile)
+def perfil_cambiado(sender, instance, **kwargs):
+    invalidar_usuario(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def permisos_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    # Grupos o permisos del usuario, cambiados desde el usuario (user.groups.add) o
+    # desde el grupo/permiso (group.user_set.add): ahí `instance` es el grupo o permiso
+    if not reverse:
+        if action.startswith('post_'):
+            invalidar_usuario(instance.pk)
+    elif action == 'pre_clear':
+        # Después del clear ya no se sabe a quiénes tenía
+        instance._usuarios_antes_de_limpiar = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidar_usuarios(getattr(instance, '_usuarios_antes_de_limpiar', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidar_usuarios(pk_set or [])
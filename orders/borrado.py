@@ -0,0 +1,189 @@
+"""
+Borrado masivo de órdenes por lotes.
+
+`QuerySet.delete()` hace que el Collector de Django cargue en memoria cada equipo,
+material, resguardo, evidencia y fila de memorias de la selección (y las señales de
+almacenamiento lo obligan a ir objeto por objeto). Aquí cada lote de LOTE órdenes se
+borra con DELETE ... WHERE order_id = ANY(...) directos, tabla por tabla, dentro de su
+propia transacción. Las FKs con SET_NULL (orden de devolución de un resguardo) se
+limpian antes con un UPDATE.
+
+Como esos DELETE no disparan señales, los archivos (firma de la orden y evidencias)
+se juntan antes y se liberan después del commit en un pool de hilos; `liberar()`
+solo borra el archivo si ya ninguna fila lo usa (almacenamiento por contenido). Si el
+worker muere antes, los archivos quedan huérfanos y los barre cleanup_media.
+Por lo mismo, el aporte de las órdenes a los resúmenes diarios se resta a mano
+y se invalidan el reporte de consumo de materiales y los calendarios de la agenda en caché.
+
+Las selecciones grandes no corren en un hilo del worker (gunicorn lo puede reciclar a
+medio trabajo): `iniciar_borrado` deja los ids pendientes en caché bajo
+`borrado:<trabajo>` y cada consulta de avance de la lista (`avanzar`) borra el
+siguiente lote. Si el worker muere a medio lote, su transacción se revierte y la
+siguiente consulta lo repite; si se cierra la página, el trabajo sigue al volver a ella.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection, connections, models, transaction
+
+from . import agenda, materiales, resumenes
+from .almacenamiento import liberar
+from .models import ServiceEvidence, ServiceOrder
+
+logger = logging.getLogger(__name__)
+
+LOTE = 500
+DURACION_PROGRESO = 24 * 60 * 60
+# Lo más que puede tardar un lote: si el worker muere, el candado caduca y otro lo retoma
+DURACION_CANDADO = 5 * 60
+
+# Los archivos se liberan en paralelo, fuera de la petición
+_archivos = ThreadPoolExecutor(max_workers=4, thread_name_prefix='borrado-media')
+
+
+# ------------------------------------------------------------
+# Borrado directo por lotes
+# ------------------------------------------------------------
+def _tablas_hijas():
+    """
+    (modelo, campo hacia la orden, ¿DELETE directo?) de todo lo que cuelga de
+    ServiceOrder: FKs con CASCADE y tablas intermedias de M2M (memorias técnicas).
+    """
+    for rel in ServiceOrder._meta.related_objects:
+        if rel.many_to_many:
+            intermedia = rel.through
+            campo = next(f.name for f in intermedia._meta.fields
+                         if f.is_relation and f.related_model is ServiceOrder)
+            yield intermedia, campo, True
+        elif rel.on_delete is models.CASCADE:
+            # Si la tabla hija tiene a su vez dependientes, que el Collector se encargue
+            directo = not rel.related_model._meta.related_objects
+            yield rel.related_model, rel.field.name, directo
+
+
+def _referencias_nulas():
+    """(queryset, campo) de las FKs hacia ServiceOrder con SET_NULL (ej. orden de devolución de un resguardo)."""
+    for rel in ServiceOrder._meta.related_objects:
+        if not rel.many_to_many and rel.on_delete is models.SET_NULL:
+            yield rel.related_model._default_manager.all(), rel.field.name
+
+
+def _archivos_del_lote(ids):
+    nombres = set(ServiceOrder.objects.filter(pk__in=ids).exclude(firma='').exclude(firma__isnull=True)
+                  .values_list('firma', flat=True))
+    nombres.update(ServiceEvidence.objects.filter(order_id__in=ids).exclude(archivo='')
+                   .values_list('archivo', flat=True))
+    return nombres
+
+
+def _borrar_directo(modelo, campo, ids):
+    """DELETE FROM <tabla> WHERE <campo> = ANY(ids): sin cargar filas ni disparar señales."""
+    tabla = connection.ops.quote_name(modelo._meta.db_table)
+    columna = connection.ops.quote_name(modelo._meta.get_field(campo).column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {tabla} WHERE {columna} = ANY(%s)', [list(ids)])
+        return cursor.rowcount
+
+
+def _liberar_en_hilo(nombre):
+    try:
+        liberar(nombre)
+    except Exception:
+        logger.exception("No se pudo liberar %s", nombre)
+    finally:
+        # Cada hilo abre su propia conexión: se devuelve al terminar
+        connections.close_all()
+
+
+def _liberar_archivos(nombres):
+    for nombre in nombres:
+        _archivos.submit(_liberar_en_hilo, nombre)
+
+
+def borrar_lote(ids):
+    """Borra un lote de órdenes y programa la limpieza de sus archivos. Regresa cuántas borró."""
+    with transaction.atomic():
+        archivos = _archivos_del_lote(ids)
+        resumenes.restar_ordenes(ids)
+        for qs, campo in _referencias_nulas():
+            qs.filter(**{f'{campo}__in': ids}).update(**{campo: None})
+        for modelo, campo, directo in _tablas_hijas():
+            if directo:
+                _borrar_directo(modelo, campo, ids)
+            else:
+                modelo._default_manager.filter(**{f'{campo}__in': ids}).delete()
+        borradas = _borrar_directo(ServiceOrder, ServiceOrder._meta.pk.name, ids)
+        transaction.on_commit(lambda: _liberar_archivos(archivos))
+        materiales.invalidar()
+        agenda.invalidar()
+    return borradas
+
+
+def borrar_ordenes(ids, lote=LOTE, al_avanzar=None):
+    """Borra las órdenes `ids` en lotes. `al_avanzar(borradas, total)` se llama tras cada lote."""
+    ids = sorted(set(int(i) for i in ids))
+    total, borradas = len(ids), 0
+    for inicio in range(0, total, lote):
+        borradas += borrar_lote(ids[inicio:inicio + lote])
+        if al_avanzar:
+            al_avanzar(borradas, total)
+    return borradas
+
+
+# ------------------------------------------------------------
+# Trabajos resumibles
+# ------------------------------------------------------------
+def _clave(trabajo):
+    return f'borrado:{trabajo}'
+
+
+def _publico(estado):
+    return {k: v for k, v in estado.items() if k != 'pendientes'}
+
+
+def progreso(trabajo):
+    estado = cache.get(_clave(trabajo))
+    return _publico(estado) if estado is not None else None
+
+
+def iniciar_borrado(ids):
+    """Registra el trabajo con sus ids pendientes y regresa su id; lo ejecuta `avanzar`."""
+    ids = sorted(set(int(i) for i in ids))
+    trabajo = uuid.uuid4().hex
+    cache.set(_clave(trabajo), {'estado': 'en_curso', 'borradas': 0, 'total': len(ids), 'pendientes': ids},
+              DURACION_PROGRESO)
+    return trabajo
+
+
+def avanzar(trabajo):
+    """
+    Borra el siguiente lote pendiente del trabajo y regresa su avance (None si no existe).
+    Un candado en caché evita que dos consultas simultáneas borren el mismo lote.
+    """
+    clave = _clave(trabajo)
+    if cache.get(clave) is None:
+        return None
+    candado = f'{clave}:candado'
+    if not cache.add(candado, 1, DURACION_CANDADO):
+        return progreso(trabajo)  # otra petición está borrando un lote
+    try:
+        # Se relee con el candado: otra petición pudo avanzar entretanto
+        estado = cache.get(clave)
+        if estado is None or estado['estado'] != 'en_curso':
+            return _publico(estado) if estado is not None else None
+        lote, resto = estado['pendientes'][:LOTE], estado['pendientes'][LOTE:]
+        try:
+            estado['borradas'] += borrar_lote(lote)
+        except Exception:
+            logger.exception("Falló el borrado masivo %s", trabajo)
+            estado['estado'] = 'error'
+        else:
+            estado['pendientes'] = resto
+            if not resto:
+                estado['estado'] = 'terminado'
+        cache.set(clave, estado, DURACION_PROGRESO)
+        return _publico(estado)
+    finally:
+        cache.delete(candado)
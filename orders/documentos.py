@@ -0,0 +1,439 @@
+"""
+Generación de documentos (Word con python-docx y PDF con WeasyPrint).
+
+Se importa de forma diferida desde las vistas: python-docx y WeasyPrint (Pango/cairo)
+solo se cargan la primera vez que alguien exporta un documento. Con gunicorn.conf.py
+el master lo importa y precalienta antes del fork (servicereports/precarga.py).
+"""
+import mimetypes
+import os
+import re
+from io import BytesIO
+from urllib.parse import unquote, urlsplit
+
+import weasyprint
+from docx import Document
+from docx.shared import Inches, Pt, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.enum.table import WD_TABLE_ALIGNMENT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils._os import safe_join
+
+from .metricas import medir
+from .models import SERVICE_TYPES
+
+
+_logo = None
+
+def logo_bytes():
+    """Logo corporativo, leído una sola vez por proceso (gunicorn lo precarga en el master)."""
+    global _logo
+    if _logo is None:
+        ruta = finders.find('orders/inovatech-logo.png')
+        if ruta:
+            with open(ruta, 'rb') as f:
+                _logo = f.read()
+        else:
+            _logo = b''
+    return _logo
+
+
+def precalentar_fuentes():
+    """Inicializa fontconfig/Pango renderizando un PDF mínimo (la primera vez es lenta)."""
+    generar_pdf("<p>ServicioTech</p>", base_url=None)
+
+
+# ================================================================
+# PDF
+# ================================================================
+
+def leer_archivo_local(url):
+    """
+    url_fetcher de WeasyPrint: las imágenes de /media/ y /static/ se leen del disco.
+    Así el PDF no hace peticiones HTTP a la propia app (que ahora pide sesión para
+    /media/ y que con workers sync podría esperar a sí misma).
+    """
+    ruta_url = unquote(urlsplit(url).path)
+    ruta = None
+    if ruta_url.startswith(settings.MEDIA_URL):
+        try:
+            ruta = default_storage.path(ruta_url[len(settings.MEDIA_URL):])
+        except (NotImplementedError, SuspiciousFileOperation):
+            ruta = None
+    elif ruta_url.startswith(settings.STATIC_URL):
+        nombre = ruta_url[len(settings.STATIC_URL):]
+        try:
+            # safe_join: un ../ en la URL no sale de STATIC_ROOT
+            ruta = finders.find(nombre) or safe_join(settings.STATIC_ROOT, nombre)
+        except SuspiciousFileOperation:
+            ruta = None
+
+    if ruta and os.path.isfile(ruta):
+        return {
+            'file_obj': open(ruta, 'rb'),
+            'mime_type': mimetypes.guess_type(ruta)[0] or 'application/octet-stream',
+            'redirected_url': url,
+        }
+    return weasyprint.default_url_fetcher(url)
+
+
+@medir('weasyprint')
+def generar_pdf(html_string, base_url):
+    """Convierte el HTML de order_detail (print_mode) en bytes de PDF."""
+    return weasyprint.HTML(string=html_string, base_url=base_url, url_fetcher=leer_archivo_local).write_pdf()
+
+
+# ================================================================
+# AUXILIARES PARA EL WORD (DISEÑO CORPORATIVO)
+# ================================================================
+
+def add_page_number(run):
+    """Inserta numeración dinámica 'Página X'."""
+    fldChar = OxmlElement('w:fldChar')
+    fldChar.set(qn('w:fldCharType'), 'begin')
+    run._r.append(fldChar)
+    instrText = OxmlElement('w:instrText')
+    instrText.set(qn('xml:space'), 'preserve')
+    instrText.text = "PAGE"
+    run._r.append(instrText)
+    fldChar = OxmlElement('w:fldChar')
+    fldChar.set(qn('w:fldCharType'), 'end')
+    run._r.append(fldChar)
+
+def add_table_of_contents(paragraph):
+    """Inserta el código de campo para el Índice Automático (TOC)."""
+    run = paragraph.add_run()
+    fldChar = OxmlElement('w:fldChar')
+    fldChar.set(qn('w:fldCharType'), 'begin')
+    run._r.append(fldChar)
+    instrText = OxmlElement('w:instrText')
+    instrText.set(qn('xml:space'), 'preserve')
+    instrText.text = 'TOC \\o "1-3" \\h \\z \\u'
+    run._r.append(instrText)
+    fldChar = OxmlElement('w:fldChar')
+    fldChar.set(qn('w:fldCharType'), 'end')
+    run._r.append(fldChar)
+
+def add_formatted_text(paragraph, text):
+    """Parsea negritas (**) para aplicarlas en el Word."""
+    parts = re.split(r'(\*\*.*?\*\*)', text)
+    for part in parts:
+        if part.startswith('**') and part.endswith('**'):
+            run = paragraph.add_run(part.replace('**', ''))
+            run.bold = True
+        else:
+            paragraph.add_run(part)
+
+
+# ================================================================
+# MEMORIA TÉCNICA (WORD)
+# ================================================================
+
+@medir('docx')
+def generar_memoria_word(memoria, ordenes, orden_principal, texto_limpio, autor, tecnico, fecha_ejecucion):
+    """Arma el Word de la memoria técnica. Retorna el Document (sin guardar)."""
+    document = Document()
+
+    # --- ENCABEZADO Y PIE (Logo Inova y Páginas) ---
+    section = document.sections[0]
+    header_para = section.header.paragraphs[0]
+    header_para.alignment = 2 # Derecha
+    if logo_bytes():
+        header_para.add_run().add_picture(BytesIO(logo_bytes()), width=Inches(1.0))
+
+    footer_para = section.footer.paragraphs[0]
+    footer_para.alignment = 1 # Centro
+    footer_para.add_run("Página ")
+    add_page_number(footer_para.add_run())
+
+    # --- PORTADA (RESTAURADA SEGÚN TU DISEÑO) ---
+    meses_es = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+    mes_es = meses_es[timezone.now().month - 1]
+    
+    document.add_paragraph("\n" * 4)
+    p_titulo = document.add_paragraph()
+    p_titulo.alignment = 1
+    run_t = p_titulo.add_run("MEMORIA TÉCNICA")
+    run_t.bold = True; run_t.font.size = Pt(28); run_t.font.color.rgb = RGBColor(31, 78, 120)
+
+    document.add_paragraph("\n" * 2)
+    p_cliente = document.add_paragraph()
+    p_cliente.alignment = 1
+    run_c = p_cliente.add_run(memoria.cliente_nombre.upper())
+    run_c.bold = True; run_c.font.size = Pt(22)
+    
+    p_sub = document.add_paragraph("Servicio de Ingeniería y Soporte Técnico")
+    p_sub.alignment = 1; p_sub.runs[0].font.size = Pt(14)
+
+    document.add_paragraph("\n" * 7)
+    p_empresa = document.add_paragraph("IT SOLUCIONES DE INNOVACION TECNOLOGICA AVANZA SA DE CV")
+    p_empresa.alignment = 1; p_empresa.runs[0].bold = True
+    
+    p_loc = document.add_paragraph(f"Monterrey, N.L. México | {mes_es} {timezone.now().year}")
+    p_loc.alignment = 1
+    document.add_page_break()
+
+    # --- TABLAS DE CONTROL ---
+    document.add_heading('CONTROL DE DOCUMENTACIÓN', level=1)
+    table_info = document.add_table(rows=3, cols=2); table_info.style = 'Table Grid'
+    for i, (l, v) in enumerate([("Autor:", autor), ("Área:", "Ingeniería de IT"), ("Localidad:", "Monterrey, Nuevo León")]):
+        table_info.cell(i, 0).text = l; table_info.cell(i, 1).text = v
+
+    document.add_paragraph("\n")
+    document.add_heading('HISTORIAL DE VERSIONES', level=1)
+    table_hist = document.add_table(rows=2, cols=5); table_hist.style = 'Table Grid'
+    for i, h in enumerate(["Versión", "Fecha", "Nombre", "Estado", "Comentario"]): table_hist.cell(0, i).text = h
+    row = table_hist.rows[1].cells
+    row[0].text = "2.0" if memoria.contenido_v2_user else "1.0"
+    row[1].text = timezone.now().strftime("%d/%m/%Y"); row[2].text = tecnico
+    row[3].text = "Finalizado"; row[4].text = "Revisión y firma"
+    document.add_page_break()
+
+    # --- TABLA DE CONTENIDOS (REEMPLAZA AL ÍNDICE) ---
+    document.add_heading('TABLA DE CONTENIDOS', level=1)
+    add_table_of_contents(document.add_paragraph())
+    document.add_page_break()
+
+    # --- RESUMEN DEL SERVICIO ---
+    document.add_heading('RESUMEN DEL SERVICIO', level=1)
+    table_sum = document.add_table(rows=5, cols=2); table_sum.style = 'Table Grid'
+    resumen_data = [
+        ("Folio de Referencia:", orden_principal.folio if orden_principal else "N/A"),
+        ("Cliente:", memoria.cliente_nombre),
+        ("Ubicación del Servicio:", orden_principal.ubicacion if (orden_principal and orden_principal.ubicacion) else "No especificada"),
+        ("Fecha de Ejecución:", fecha_ejecucion),
+        ("Técnico Responsable:", tecnico)
+    ]
+    for i, (l, v) in enumerate(resumen_data):
+        table_sum.cell(i, 0).text = l; table_sum.cell(i, 1).text = str(v)
+    document.add_paragraph("\n")
+
+    # --- CUERPO TÉCNICO (Detección refinada de Títulos) ---
+    for line in texto_limpio.split('\n'):
+        line = line.strip()
+        if not line: continue
+        
+        # Regla: Solo números romanos I al X al inicio de línea son Heading 2
+        # Quitamos la regla de 'isupper' para que no tome textos normales como títulos
+        if re.match(r'^(I|II|III|IV|V|VI|VII|VIII|IX|X)\.\s', line):
+            document.add_heading(line, level=2)
+        # Regla: A., B., C. o 1., 2. son Heading 3
+        elif re.match(r'^([A-Z]|\d+)\.\s', line):
+            document.add_heading(line, level=3)
+        else:
+            p = document.add_paragraph(); p.alignment = 3
+            add_formatted_text(p, line)
+
+    # --- ANEXO FOTOGRÁFICO (ANTES DE ELABORO) ---
+    evidencias = []
+    for o in ordenes: evidencias.extend(o.evidencias.all())
+
+    if evidencias:
+        document.add_page_break()
+        document.add_heading('ANEXO FOTOGRÁFICO', level=1)
+        table_pics = document.add_table(rows=0, cols=2)
+        for i in range(0, len(evidencias), 2):
+            row_cells = table_pics.add_row().cells
+            for j in range(2):
+                if i + j < len(evidencias):
+                    ev = evidencias[i+j]
+                    if ev.archivo and os.path.exists(ev.archivo.path):
+                        p = row_cells[j].paragraphs[0]; p.alignment = 1
+                        try:
+                            run = p.add_run(); run.add_picture(ev.archivo.path, width=Inches(2.5))
+                            cap = row_cells[j].add_paragraph(f"Fig {i+j+1}. {ev.comentario or 'Evidencia'}")
+                            cap.alignment = 1; cap.runs[0].font.size = Pt(9)
+                        except: pass
+
+    # --- FIRMA (ELABORO) ---
+    document.add_page_break()
+    document.add_paragraph("\n" * 5)
+    f = document.add_paragraph("ELABORO:"); f.alignment = 1
+    f.add_run("\n" * 3 + f"{tecnico.upper()}\n").bold = True
+    f.add_run("Gerencia Técnica")
+
+    return document
+
+
+# ================================================================
+# WORD INDIVIDUAL DE LA ORDEN (REPORTE CLÁSICO)
+# ================================================================
+
+# --- Helpers para estilos de Word ---
+def set_cell_color(cell, color):
+    tc = cell._tc.get_or_add_tcPr()
+    shd = OxmlElement('w:shd')
+    shd.set(qn('w:fill'), color)
+    tc.append(shd)
+
+def make_header_blue(cell, text):
+    cell.text = ""; p = cell.paragraphs[0]; r = p.add_run(text)
+    r.bold = True; r.font.color.rgb = RGBColor(255,255,255); set_cell_color(cell, '1F4E78')
+
+def make_label_gray(cell, text):
+    cell.text = ""; p = cell.paragraphs[0]; r = p.add_run(text)
+    r.bold = True; r.font.size = Pt(9); r.font.color.rgb = RGBColor(0,0,0); set_cell_color(cell, 'F2F2F2')
+
+def set_value_text(cell, text):
+    cell.text = str(text) if text else "-"; cell.paragraphs[0].runs[0].font.size = Pt(9)
+
+def insert_signature(cell, title, img_field, name):
+    cell.text = ""; p = cell.paragraphs[0]; p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    if img_field:
+        try:
+            if hasattr(img_field, 'path') and os.path.exists(img_field.path):
+                p.add_run().add_picture(img_field.path, height=Inches(0.6))
+            elif isinstance(img_field, str) and os.path.exists(img_field):
+                p.add_run().add_picture(img_field, height=Inches(0.6))
+        except: pass
+    else: p.add_run("\n\n\n")
+    p.add_run("\n_______________________\n")
+    if name: p.add_run(str(name)+"\n").bold=True
+    p.add_run(title).font.size = Pt(7)
+
+
+@medir('docx')
+def generar_word_orden(order):
+    """Arma el Word individual de una orden de servicio. Retorna el Document (sin guardar)."""
+    doc = Document()
+    
+    # Márgenes
+    s = doc.sections[0]
+    s.left_margin = s.right_margin = s.top_margin = s.bottom_margin = Inches(0.4)
+    w_total = s.page_width - s.left_margin - s.right_margin
+
+    # Encabezado con Logo
+    t = doc.add_table(rows=1, cols=3); t.autofit=False; t.alignment = WD_TABLE_ALIGNMENT.CENTER
+    t.columns[0].width = int(w_total*0.2)
+    t.columns[1].width = int(w_total*0.5)
+    t.columns[2].width = int(w_total*0.3)
+    
+    if logo_bytes():
+        t.rows[0].cells[0].paragraphs[0].add_run().add_picture(BytesIO(logo_bytes()), width=Inches(1.2))
+    
+    p = t.rows[0].cells[1].paragraphs[0]; p.alignment=1
+    r = p.add_run("ORDEN DE SERVICIO TÉCNICO"); r.bold=True; r.font.size=Pt(16); r.font.color.rgb=RGBColor(31,78,120)
+    
+    # Cuadro de Folio
+    tf = t.rows[0].cells[2].add_table(rows=2, cols=1); tf.alignment=2
+    tbl = tf._tbl; borders = OxmlElement('w:tblBorders')
+    for b in ['top','left','bottom','right','insideH']:
+        el = OxmlElement(f'w:{b}'); el.set(qn('w:val'),'single'); el.set(qn('w:sz'),'4'); borders.append(el)
+    tbl.tblPr.append(borders)
+    
+    tf.cell(0,0).paragraphs[0].add_run("FOLIO").bold=True
+    r = tf.cell(1,0).paragraphs[0].add_run(str(order.folio)); r.bold=True; r.font.color.rgb=RGBColor(192,0,0); r.font.size=Pt(12)
+    doc.add_paragraph()
+
+    # Tabla Principal
+    t = doc.add_table(rows=0, cols=4); t.style='Table Grid'
+    w1=int(w_total*0.15); w2=int(w_total*0.35)
+    for i in range(4): t.columns[i].width = w1 if i%2==0 else w2
+
+    # A. Info General
+    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " A. INFORMACIÓN GENERAL")
+    r=t.add_row(); make_label_gray(r.cells[0],"1. Cliente"); set_value_text(r.cells[1], order.cliente_nombre)
+    make_label_gray(r.cells[2],"2. Ubicación"); set_value_text(r.cells[3], order.ubicacion)
+    
+    r=t.add_row(); make_label_gray(r.cells[0],"3. Fecha"); set_value_text(r.cells[1], order.fecha_servicio)
+    make_label_gray(r.cells[2],"4. Contacto"); set_value_text(r.cells[3], order.cliente_contacto)
+
+    r=t.add_row(); make_label_gray(r.cells[0],"5. Tipo serv.")
+    marcados = set(order.tipos_servicio or [])
+    casillas = [f"{'☒' if codigo in marcados else '☐'} {etiqueta}" for codigo, etiqueta in SERVICE_TYPES]
+    txt = "\n".join("   ".join(casillas[i:i + 2]) for i in range(0, len(casillas), 2))
+    set_value_text(r.cells[1], txt)
+    make_label_gray(r.cells[2],"6. Ingeniero"); set_value_text(r.cells[3], order.ingeniero_nombre)
+
+    r=t.add_row(); set_cell_color(r.cells[0],'FFFFFF'); set_cell_color(r.cells[1],'FFFFFF')
+    make_label_gray(r.cells[2],"7. ID Ticket"); set_value_text(r.cells[3], order.ticket_id)
+
+    # B. Equipo
+    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " B. DATOS DEL EQUIPO")
+    r=t.add_row()
+    for i,x in enumerate(["Marca","Modelo","Serie","Descripción"]): make_label_gray(r.cells[i], x)
+    eq = order.equipos.first()
+    r=t.add_row()
+    if eq:
+        set_value_text(r.cells[0], eq.marca); set_value_text(r.cells[1], eq.modelo)
+        set_value_text(r.cells[2], eq.serie); set_value_text(r.cells[3], eq.descripcion)
+    else: r.cells[0].merge(r.cells[3]); set_value_text(r.cells[0], "Sin equipo.")
+
+    # C. Datos Técnicos
+    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " C. DATOS TÉCNICOS")
+    r=t.add_row(); make_label_gray(r.cells[0],"1. Título"); r.cells[1].merge(r.cells[3]); set_value_text(r.cells[1], order.titulo)
+    
+    r=t.add_row(); make_label_gray(r.cells[0],"2. Actividades"); c=r.cells[1]; c.merge(r.cells[3]); c.text=""
+    c.paragraphs[0].add_run(str(order.actividades)).font.size=Pt(9)
+    
+    # Evidencias en Word individual
+    if order.evidencias.exists():
+        c.paragraphs[0].add_run("\n\n--- EVIDENCIA FOTOGRÁFICA ---\n").bold=True
+        for f in order.evidencias.all():
+            if f.archivo and os.path.exists(f.archivo.path):
+                try: c.paragraphs[0].add_run().add_picture(f.archivo.path, width=Inches(2.5))
+                except: pass
+
+    r=t.add_row(); make_label_gray(r.cells[0],"3. Comentarios"); r.cells[1].merge(r.cells[3]); set_value_text(r.cells[1], order.comentarios)
+
+    # D. Costos
+    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " D. COSTOS Y TIEMPOS")
+    r=t.add_row(); make_label_gray(r.cells[0],"Tiempo (hrs)"); set_value_text(r.cells[1], order.horas)
+    make_label_gray(r.cells[2],"Costo"); set_value_text(r.cells[3], str(order.costo_mxn))
+
+    # E. Firmas
+    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " E. ACEPTACIÓN DEL SERVICIO")
+    r=t.add_row(); r.cells[0].merge(r.cells[3])
+    r.cells[0].paragraphs[0].add_run("Al firmar este documento se da por aceptada la conformidad de la entrega y finalización de los servicios y/o trabajos realizados. Este documento será comprobante del servicio realizado. Cualquier cambio posterior a la instalación (reinstalación, modificaciones, reubicación, reconfiguración o implementación adicional) podrá generar cargos extra. Es responsabilidad del cliente realizar el respaldo de la información contenida en los equipos antes de la atención del servicio. ").font.size=Pt(9)
+
+    r=t.add_row(); c=r.cells[0]; c.merge(r.cells[3]); ts=c.add_table(rows=1,cols=3); ts.autofit=False; ts.alignment=1
+    w3 = int(w_total/3)
+    for cl in ts.rows[0].cells: cl.width = w3
+
+    # Buscador de firmas
+    def find_u(n):
+        if not n: return None
+        target = str(n).lower().strip()
+        for u in User.objects.all():
+            fn = (u.get_full_name() or "").lower().strip()
+            un = u.username.lower().strip()
+            if fn == target or un == target: return u
+        return None
+
+    fi = None; ui = find_u(order.ingeniero_nombre)
+    if ui:
+        if hasattr(ui,'engineerprofile') and ui.engineerprofile.firma: fi=ui.engineerprofile.firma
+        elif hasattr(ui,'profile') and ui.profile.firma: fi=ui.profile.firma
+    
+    fv = None; uv = find_u(order.contacto_nombre)
+    if uv:
+        if hasattr(uv,'engineerprofile') and uv.engineerprofile.firma: fv=uv.engineerprofile.firma
+        elif hasattr(uv,'profile') and uv.profile.firma: fv=uv.profile.firma
+    
+# Firma del Visor (Ejecutivo de Ventas)
+    fv = None
+    nombre_visor = ""
+    if order.visor:
+     nombre_visor = order.visor.get_full_name() or order.visor.username
+    if hasattr(order.visor, 'profile') and order.visor.profile.firma:
+        fv = order.visor.profile.firma
+
+# -----------------------------------------------------------------------------------
+    # ESTE BLOQUE DEBE TENER 4 ESPACIOS AL INICIO (ESTAR DENTRO DE LA FUNCIÓN)
+    # -----------------------------------------------------------------------------------
+    
+    insert_signature(ts.cell(0,0), "Ingeniero de Soporte", fi, order.ingeniero_nombre)
+    insert_signature(ts.cell(0,1), "Cliente", order.firma, order.cliente_contacto)
+    
+    # Esta es la línea nueva para el Visor
+    insert_signature(ts.cell(0,2), "Contacto Ventas (Visor)", fv, nombre_visor)
+
+    return doc
@@ -0,0 +1,291 @@
+"""
+Exportación de la lista de órdenes a CSV y XLSX en streaming.
+
+Las filas salen de un `.values()` recorrido con `.iterator(chunk_size=...)` (en
+PostgreSQL es un cursor del lado del servidor), así que ni el queryset ni el archivo
+completo viven en memoria: la descarga empieza con el primer bloque de filas.
+
+El XLSX se arma a mano (es un zip de XML): la hoja se escribe con texto en línea
+(sin sharedStrings, que obligaría a juntar todas las cadenas antes) y el zip se va
+vaciando conforme el compresor suelta bytes. zipfile soporta destinos sin seek
+escribiendo los tamaños al final de cada archivo (data descriptor).
+"""
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import SERVICE_TYPES, Equipment, ServiceEvidence, ServiceMaterial, ServiceOrder
+
+FILAS_POR_BLOQUE = 2000
+BYTES_POR_ENVIO = 64 * 1024
+
+# (campo de .values(), encabezado)
+COLUMNAS = (
+    ('folio', 'Folio'),
+    ('creado', 'Creada'),
+    ('fecha_servicio', 'Fecha de servicio'),
+    ('estatus', 'Estatus'),
+    ('cliente_nombre', 'Cliente'),
+    ('cliente_contacto', 'Contacto'),
+    ('cliente_email', 'Correo cliente'),
+    ('cliente_telefono', 'Teléfono cliente'),
+    ('ubicacion', 'Ubicación'),
+    ('ingeniero_nombre', 'Ingeniero'),
+    ('visor__username', 'Contacto ventas'),
+    ('titulo', 'Título'),
+    ('tipos_servicio', 'Tipos de servicio'),
+    ('ticket_id', 'Ticket'),
+    ('horas', 'Horas'),
+    ('costo_mxn', 'Costo MXN'),
+    ('reagenda', 'Reagenda'),
+    ('reagenda_fecha', 'Fecha reagenda'),
+    ('email_enviado', 'Correo enviado'),
+    ('num_equipos', 'Equipos'),
+    ('num_materiales', 'Materiales'),
+    ('num_evidencias', 'Evidencias'),
+)
+ENCABEZADOS = [encabezado for _, encabezado in COLUMNAS]
+
+
+def _conteo(modelo):
+    """COUNT(*) de la tabla hija como subconsulta correlacionada (sin GROUP BY sobre las órdenes)."""
+    return Coalesce(
+        Subquery(
+            modelo.objects.filter(order=OuterRef('pk')).order_by().values('order')
+            .annotate(n=Count('pk')).values('n'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def filas(ordenes):
+    """Filas en el orden de COLUMNAS a partir del queryset ya filtrado de order_list."""
+    qs = ordenes.annotate(
+        num_equipos=_conteo(Equipment),
+        num_materiales=_conteo(ServiceMaterial),
+        num_evidencias=_conteo(ServiceEvidence),
+    ).values_list(*(campo for campo, _ in COLUMNAS))
+
+    estatus = dict(ServiceOrder.STATUS_CHOICES)
+    tipos = dict(SERVICE_TYPES)
+    i_creado, i_estatus, i_tipos = (
+        [campo for campo, _ in COLUMNAS].index(c) for c in ('creado', 'estatus', 'tipos_servicio')
+    )
+    for fila in qs.iterator(chunk_size=FILAS_POR_BLOQUE):
+        fila = list(fila)
+        fila[i_creado] = timezone.localtime(fila[i_creado]).replace(tzinfo=None) if fila[i_creado] else None
+        fila[i_estatus] = estatus.get(fila[i_estatus], fila[i_estatus])
+        fila[i_tipos] = ", ".join(tipos.get(t, t) for t in (fila[i_tipos] or []))
+        yield fila
+
+
+# ------------------------------------------------------------
+# CSV
+# ------------------------------------------------------------
+# Lo que Excel/LibreOffice toman como inicio de fórmula (cliente "=cmd|..." -> fórmula viva)
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parece_formula(texto):
+    return texto.startswith(INICIO_FORMULA)
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: regresa lo escrito en vez de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def _texto_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M')
+    if isinstance(valor, str) and parece_formula(valor):
+        return "'" + valor  # el apóstrofo hace que la hoja lo lea como texto
+    return valor
+
+
+def csv_streaming(filas):
+    escritor = csv.writer(_Eco())
+    # BOM: Excel abre el CSV como UTF-8 (acentos) sin pasar por el asistente de importación
+    yield '\ufeff' + escritor.writerow(ENCABEZADOS)
+    bloque = []
+    for fila in filas:
+        bloque.append(escritor.writerow([_texto_csv(v) for v in fila]))
+        if len(bloque) >= 500:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+# ------------------------------------------------------------
+# XLSX
+# ------------------------------------------------------------
+# Estilos: 0 normal, 1 fecha, 2 fecha y hora, 3 encabezado en negritas,
+# 4 texto con quotePrefix (el apóstrofo invisible de Excel: nunca se evalúa como fórmula)
+ESTILO_FECHA, ESTILO_FECHA_HORA, ESTILO_ENCABEZADO, ESTILO_TEXTO = 1, 2, 3, 4
+
+PARTES_FIJAS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Órdenes" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm"/></numFmts>'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="5">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0" quotePrefix="1"/>'
+        '</cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+INICIO_HOJA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+FIN_HOJA = '</sheetData></worksheet>'
+
+# Caracteres de control que XML 1.0 no permite (llegan a colarse al pegar desde otros sistemas)
+_NO_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_EPOCH_EXCEL = datetime(1899, 12, 30)
+_MAX_CELDA = 32767
+
+
+def _letra(indice):
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celda(ref, valor, estilo=0):
+    s = f' s="{estilo}"' if estilo else ''
+    if valor is None or valor == '':
+        return ''
+    if isinstance(valor, bool):
+        return f'<c r="{ref}" t="b"{s}><v>{int(valor)}</v></c>'
+    if isinstance(valor, datetime):
+        serial = (valor.replace(microsecond=0) - _EPOCH_EXCEL).total_seconds() / 86400
+        return f'<c r="{ref}" s="{ESTILO_FECHA_HORA}"><v>{serial:.6f}</v></c>'
+    if isinstance(valor, date):
+        serial = (valor - _EPOCH_EXCEL.date()).days
+        return f'<c r="{ref}" s="{ESTILO_FECHA}"><v>{serial}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c r="{ref}"{s}><v>{valor}</v></c>'
+    texto = _NO_XML.sub('', str(valor))[:_MAX_CELDA]
+    if not estilo and parece_formula(texto):
+        s = f' s="{ESTILO_TEXTO}"'
+    texto = escape(texto)
+    return f'<c r="{ref}" t="inlineStr"{s}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(numero, valores, letras, estilo=0):
+    celdas = ''.join(_celda(f'{letra}{numero}', v, estilo) for letra, v in zip(letras, valores))
+    return f'<row r="{numero}">{celdas}</row>'.encode('utf-8')
+
+
+class _Salida:
+    """Destino del zip: acumula lo que escribe zipfile hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self.partes = []
+        self.tamano = 0
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.tamano += len(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes, self.tamano = [], 0
+        return datos
+
+
+def xlsx_streaming(filas):
+    salida = _Salida()
+    letras = [_letra(i) for i in range(len(ENCABEZADOS))]
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for nombre, contenido in PARTES_FIJAS.items():
+            zf.writestr(nombre, contenido)
+        yield salida.vaciar()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as hoja:
+            hoja.write(INICIO_HOJA.encode('utf-8'))
+            hoja.write(_fila_xml(1, ENCABEZADOS, letras, ESTILO_ENCABEZADO))
+            for numero, fila in enumerate(filas, start=2):
+                hoja.write(_fila_xml(numero, fila, letras))
+                if salida.tamano >= BYTES_POR_ENVIO:
+                    yield salida.vaciar()
+            hoja.write(FIN_HOJA.encode('utf-8'))
+    yield salida.vaciar()
@@ -86,13 +86,17 @@ class ServiceOrderForm(forms.ModelForm):
 class EquipmentForm(forms.ModelForm):
     marca = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
     modelo = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
-    serie = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    # Sugerencias del registro de activos (ver asset_autocomplete y el JS de order_form.html)
+    serie = forms.CharField(required=False, widget=forms.TextInput(attrs={
+        'class': 'form-control', 'list': 'activos-sugerencias', 'autocomplete': 'off',
+    }))
     descripcion = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
     class Meta: model = Equipment; fields = "__all__"
 
 class ServiceMaterialForm(forms.ModelForm):
     cantidad = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control'}))
-    descripcion = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    # Sugerencias del catálogo de materiales (ver material_autocomplete y el JS de order_form.html)
+    descripcion = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'autocomplete': 'off'}))
     comentarios = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
     class Meta: model = ServiceMaterial; fields = "__all__"
 
@@ -100,7 +104,8 @@ class ShelterEquipmentForm(forms.ModelForm):
     cantidad = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control'}))
     descripcion = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
     comentarios = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
-    class Meta: model = ShelterEquipment; fields = "__all__"
+    # La custodia (estado, devolución) se registra desde equipos_en_resguardo, no aquí
+    class Meta: model = ShelterEquipment; fields = ["cantidad", "descripcion", "comentarios"]
 
 class ServiceEvidenceForm(forms.ModelForm):
     archivo = forms.FileField(required=False, widget=forms.FileInput(attrs={'class': 'form-control'}))
@@ -110,7 +115,7 @@ class ServiceEvidenceForm(forms.ModelForm):
 # Definiciones de FormSets
 EquipmentFormSet = inlineformset_factory(ServiceOrder, Equipment, form=EquipmentForm, extra=0, can_delete=True)
 ServiceMaterialFormSet = inlineformset_factory(ServiceOrder, ServiceMaterial, form=ServiceMaterialForm, extra=0, can_delete=True)
-ShelterEquipmentFormSet = inlineformset_factory(ServiceOrder, ShelterEquipment, form=ShelterEquipmentForm, extra=0, can_delete=True)
+ShelterEquipmentFormSet = inlineformset_factory(ServiceOrder, ShelterEquipment, form=ShelterEquipmentForm, fk_name="order", extra=0, can_delete=True)
 ServiceEvidenceFormSet = inlineformset_factory(ServiceOrder, ServiceEvidence, form=ServiceEvidenceForm, extra=0, can_delete=True)
 
 # ================================================================
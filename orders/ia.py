@@ -0,0 +1,30 @@
+"""
+Redacción de memorias técnicas con Gemini.
+
+Se importa de forma diferida desde las vistas: el SDK de Google (y markdown) solo se
+cargan en el worker la primera vez que alguien genera una memoria.
+"""
+import os
+
+import markdown
+from google import genai
+
+from .metricas import medir
+
+MODELO = "gemini-flash-latest"
+
+
+def redactar_memoria(cliente, ordenes):
+    """Pide a Gemini la memoria técnica de las órdenes y la regresa como HTML."""
+    contexto = "".join([f"\n[FOLIO {o.folio}] Actividades: {o.actividades}." for o in ordenes])
+    prompt = f"Actúa como Consultor Senior. Redacta una MEMORIA TÉCNICA para {cliente}. Usa Markdown. Datos: {contexto}"
+
+    try:
+        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        with medir('gemini'):
+            response = client.models.generate_content(model=MODELO, contents=prompt)
+        texto_ia = response.text if response.text else "Redacte manualmente."
+    except Exception:
+        texto_ia = "Error de conexión con Gemini."
+
+    return markdown.markdown(texto_ia)
@@ -0,0 +1,470 @@
+"""
+Importación rápida de órdenes desde respaldos.
+
+Lee en streaming el JSON de `dumpdata` (arreglo, como respaldo_antes_merge.json),
+JSON Lines (un objeto por línea) o el CSV de la exportación de la lista, detectando
+la codificación (UTF-8/16/32 con o sin BOM, con respaldo a cp1252).
+
+Las filas se validan y convierten por lotes y se insertan con bulk_create:
+- los folios se conservan (no pasa por ServiceOrder.save());
+- los pk no: cada pk del respaldo se remapea al nuevo, y equipos, materiales,
+  resguardos, evidencias y memorias se enlazan con ese mapa;
+- una orden cuyo folio ya existe se omite junto con sus hijos (re-importar es seguro);
+- los activos (orders.asset) y el catálogo de materiales (orders.material) no se copian:
+  los equipos se enlazan por su serie y los materiales por su descripción;
+- los usuarios se enlazan por username (filas auth.user del mismo respaldo); los
+  que no existen aquí se crean con los datos del respaldo.
+
+Los nombres de archivo (firmas, evidencias) se copian tal cual: los archivos
+viajan aparte, en la carpeta media.
+"""
+import codecs
+import csv
+import io
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import activos, agenda, materiales, resumenes, versiones
+from .models import (
+    SERVICE_TYPES, Equipment, ServiceEvidence, ServiceMaterial, ServiceOrder, ShelterEquipment, TechnicalMemory,
+)
+
+LOTE = 1000
+BLOQUE_LECTURA = 256 * 1024
+
+ORDEN = 'orders.serviceorder'
+HIJOS = {
+    'orders.equipment': Equipment,
+    'orders.servicematerial': ServiceMaterial,
+    'orders.shelterequipment': ShelterEquipment,
+    'orders.serviceevidence': ServiceEvidence,
+}
+MEMORIA = 'orders.technicalmemory'
+USUARIO = 'auth.user'
+# Se rehacen a partir de los equipos y materiales importados (activos.vincular, materiales.vincular)
+DERIVADOS = {'orders.asset', 'orders.material'}
+
+
+class ErrorImportacion(Exception):
+    pass
+
+
+# ------------------------------------------------------------
+# Lectura
+# ------------------------------------------------------------
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def detectar_codificacion(muestra):
+    """Codificación a partir de los primeros bytes del archivo."""
+    for bom, codificacion in BOMS:
+        if muestra.startswith(bom):
+            return codificacion
+    # UTF-16 sin BOM: el texto es casi todo ASCII, así que la mitad de los bytes son 0
+    if len(muestra) >= 4:
+        pares, impares = muestra[0::2], muestra[1::2]
+        if impares.count(0) > len(impares) * 0.4:
+            return 'utf-16-le'
+        if pares.count(0) > len(pares) * 0.4:
+            return 'utf-16-be'
+    try:
+        # final=False: no falla si la muestra corta un carácter multibyte al final
+        codecs.getincrementaldecoder('utf-8')().decode(muestra, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+
+def abrir(ruta, codificacion=None):
+    """Abre el archivo como texto; regresa (archivo, codificación)."""
+    binario = open(ruta, 'rb')
+    if not codificacion:
+        codificacion = detectar_codificacion(binario.read(64 * 1024))
+        binario.seek(0)
+    return io.TextIOWrapper(binario, encoding=codificacion, newline=''), codificacion
+
+
+def objetos_json(texto):
+    """
+    Objetos de un arreglo JSON o de JSON Lines, uno a la vez, leyendo por bloques
+    (json.load cargaría todo el respaldo en memoria).
+    """
+    decodificador = json.JSONDecoder()
+    buffer, pos, fin = '', 0, False
+    while True:
+        # Saltar espacios, '[' , ',' y ']' entre objetos
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]\ufeff':
+            pos += 1
+        if pos >= len(buffer):
+            if fin:
+                return
+            buffer, pos = texto.read(BLOQUE_LECTURA), 0
+            fin = not buffer
+            continue
+        try:
+            objeto, nuevo = decodificador.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if fin:
+                raise ErrorImportacion(f"JSON inválido cerca de: {buffer[pos:pos + 80]!r}")
+            # Objeto incompleto: leer otro bloque y reintentar
+            bloque = texto.read(BLOQUE_LECTURA)
+            fin = not bloque
+            buffer, pos = buffer[pos:] + bloque, 0
+            continue
+        pos = nuevo
+        yield objeto
+
+
+def objetos_csv(texto):
+    """
+    Filas del CSV como objetos de dumpdata (solo órdenes). Acepta los nombres de campo
+    del modelo o los encabezados en español de la exportación (orders:export).
+    """
+    from .exportacion import COLUMNAS
+
+    muestra = texto.read(BLOQUE_LECTURA)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra.split('\n', 1)[0], delimiters=',;\t|')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+
+    por_encabezado = {encabezado.lower(): campo for campo, encabezado in COLUMNAS}
+    encabezados = next(lector, None)
+    if not encabezados:
+        return
+    campos = [por_encabezado.get(e.strip().lstrip('\ufeff').lower(), e.strip().lstrip('\ufeff'))
+              for e in encabezados]
+
+    estatus = {etiqueta.lower(): codigo for codigo, etiqueta in ServiceOrder.STATUS_CHOICES}
+    tipos = {etiqueta.lower(): codigo for codigo, etiqueta in SERVICE_TYPES}
+    for fila in lector:
+        if not any(fila):
+            continue
+        # Los conteos de la exportación (num_equipos...) no son campos
+        campos_fila = {c: v for c, v in zip(campos, fila) if not c.startswith('num_')}
+        if 'estatus' in campos_fila:
+            campos_fila['estatus'] = estatus.get(campos_fila['estatus'].lower(), campos_fila['estatus'])
+        if 'tipos_servicio' in campos_fila:
+            campos_fila['tipos_servicio'] = [
+                tipos.get(t.strip().lower(), t.strip()) for t in campos_fila['tipos_servicio'].split(',') if t.strip()
+            ]
+        yield {'model': ORDEN, 'pk': None, 'fields': campos_fila}
+
+
+def leer(ruta, formato=None, codificacion=None):
+    """(iterador de objetos, codificación detectada)."""
+    texto, codificacion = abrir(ruta, codificacion)
+    if not formato:
+        formato = 'csv' if str(ruta).lower().endswith('.csv') else 'json'
+    return (objetos_csv(texto) if formato == 'csv' else objetos_json(texto)), codificacion
+
+
+# ------------------------------------------------------------
+# Conversión de campos
+# ------------------------------------------------------------
+SI_NO = {'sí': True, 'si': True, 'no': False}
+
+
+def _campos(modelo):
+    return {f.name: f for f in modelo._meta.concrete_fields if not f.primary_key}
+
+
+def convertir(modelo, campos_fuente, campos_modelo, ignorados):
+    """Valores listos para el constructor del modelo; ValidationError si alguno no sirve."""
+    valores = {}
+    for nombre, valor in campos_fuente.items():
+        if '__' in nombre:
+            continue  # visor__username y similares: los resuelve el Importador
+        campo = campos_modelo.get(nombre)
+        if campo is None or campo.is_relation:
+            if campo is None:
+                ignorados[(modelo._meta.label_lower, nombre)] += 1
+            continue
+        if valor == '' and (campo.null or not isinstance(campo, (models.CharField, models.TextField))):
+            valor = None
+        if valor is None:
+            if not campo.null:
+                if campo.has_default():
+                    continue
+                if isinstance(campo, (models.CharField, models.TextField, models.FileField)):
+                    valor = ''
+            valores[nombre] = valor
+            continue
+        if isinstance(campo, models.BooleanField) and isinstance(valor, str):
+            valor = SI_NO.get(valor.strip().lower(), valor)
+        try:
+            valor = campo.to_python(valor)
+        except ValidationError as e:
+            raise ValidationError(f"{nombre}: {'; '.join(e.messages)}")
+        if isinstance(campo, models.DateTimeField) and timezone.is_naive(valor):
+            valor = timezone.make_aware(valor)
+        if isinstance(campo, models.CharField) and campo.max_length and len(valor) > campo.max_length:
+            raise ValidationError(f"{nombre}: más de {campo.max_length} caracteres")
+        if isinstance(campo, ArrayField):
+            # Cada elemento contra el campo base (ej. tipos_servicio solo acepta códigos de SERVICE_TYPES)
+            try:
+                campo.validate(valor, None)
+            except ValidationError as e:
+                raise ValidationError(f"{nombre}: {'; '.join(e.messages)}")
+        valores[nombre] = valor
+    # Sin la fecha en el respaldo, la de hoy (ver fechas_del_respaldo)
+    for nombre, campo in campos_modelo.items():
+        if _fecha_automatica(campo) and valores.get(nombre) is None:
+            valores[nombre] = timezone.now()
+    return valores
+
+
+# Campos con auto_now/auto_now_add apagados por fechas_del_respaldo (siguen siendo automáticos)
+_apagadas = set()
+
+
+def _fecha_automatica(campo):
+    return campo in _apagadas or getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+
+
+@contextmanager
+def fechas_del_respaldo(*modelos):
+    """
+    Apaga auto_now/auto_now_add mientras se importa: bulk_create pisaría `creado` y
+    `actualizado` con la hora actual (y restaurarlas con bulk_update duplica el trabajo).
+    Cambia el campo para todo el proceso: úsese solo desde comandos de manage.py.
+    """
+    campos = [f for modelo in modelos for f in modelo._meta.concrete_fields if _fecha_automatica(f)]
+    originales = [(f, f.auto_now, f.auto_now_add) for f in campos]
+    for campo in campos:
+        campo.auto_now = campo.auto_now_add = False
+    _apagadas.update(campos)
+    try:
+        yield
+    finally:
+        _apagadas.difference_update(campos)
+        for campo, auto_now, auto_now_add in originales:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+# ------------------------------------------------------------
+# Importador
+# ------------------------------------------------------------
+class Importador:
+    """Recibe objetos con forma de dumpdata y los inserta por lotes."""
+
+    def __init__(self, lote=LOTE, al_avanzar=None):
+        self.lote = lote
+        self.al_avanzar = al_avanzar
+        self.inicio = time.perf_counter()
+
+        self.ordenes = {}           # pk del respaldo -> pk nuevo (None si se omitió)
+        self.folios = set()         # folios vistos en esta corrida
+        self.usuarios_fuente = {}   # pk del respaldo -> username
+        self.datos_usuario = {}     # username -> campos de auth.user (para crear los que falten)
+        self.usuarios = {}          # username -> pk local (None si no existe)
+
+        self.pendientes = defaultdict(list)
+        self.creados = Counter()
+        self.omitidos = Counter()
+        self.ignorados = Counter()  # (modelo, campo) que ya no existen en el modelo
+        self.errores = []
+        self.campos = {modelo: _campos(modelo)
+                       for modelo in (ServiceOrder, TechnicalMemory, *HIJOS.values())}
+
+    # --- entrada ---
+    def agregar(self, objeto):
+        etiqueta = objeto.get('model', '').lower()
+        campos = objeto.get('fields', {})
+        if etiqueta == USUARIO:
+            self.usuarios_fuente[objeto['pk']] = campos.get('username')
+            self.datos_usuario[campos.get('username')] = campos
+            return
+        if etiqueta in DERIVADOS:
+            return
+        if etiqueta == ORDEN:
+            self.pendientes[ORDEN].append(objeto)
+        elif etiqueta in HIJOS or etiqueta == MEMORIA:
+            self.pendientes[etiqueta].append(objeto)
+        else:
+            self.omitidos[etiqueta or '(sin modelo)'] += 1
+            return
+        if len(self.pendientes[etiqueta]) >= self.lote:
+            self.vaciar(etiqueta)
+
+    def importar(self, objetos):
+        with fechas_del_respaldo(ServiceOrder, TechnicalMemory, *HIJOS.values()):
+            for objeto in objetos:
+                self.agregar(objeto)
+            self.terminar()
+
+    def terminar(self):
+        self.vaciar(ORDEN)
+        for etiqueta in (*HIJOS, MEMORIA):
+            self.vaciar(etiqueta)
+
+    def vaciar(self, etiqueta):
+        objetos, self.pendientes[etiqueta] = self.pendientes[etiqueta], []
+        if not objetos:
+            return
+        if etiqueta != ORDEN:
+            # Los hijos necesitan el pk nuevo de su orden
+            self.vaciar(ORDEN)
+        with transaction.atomic():
+            if etiqueta == ORDEN:
+                self.insertar_ordenes(objetos)
+            elif etiqueta == MEMORIA:
+                self.insertar_memorias(objetos)
+            else:
+                self.insertar_hijos(HIJOS[etiqueta], etiqueta, objetos)
+        if self.al_avanzar and etiqueta == ORDEN:
+            self.al_avanzar(self)
+
+    # --- apoyo ---
+    def error(self, etiqueta, pk, mensaje):
+        self.omitidos[etiqueta] += 1
+        self.errores.append(f"{etiqueta} pk={pk}: {mensaje}")
+
+    def resolver_usuarios(self, nombres):
+        faltan = {n for n in nombres if n and n not in self.usuarios}
+        if not faltan:
+            return
+        encontrados = dict(User.objects.filter(username__in=faltan).values_list('username', 'pk'))
+        # Los que vienen en el respaldo pero no existen aquí se crean (con su hash de contraseña)
+        campos_usuario = _campos(User)
+        nuevos = []
+        for nombre in faltan - encontrados.keys():
+            if nombre in self.datos_usuario:
+                try:
+                    nuevos.append(User(**convertir(User, self.datos_usuario[nombre], campos_usuario, Counter())))
+                except ValidationError as e:
+                    self.error(USUARIO, nombre, "; ".join(e.messages))
+        if nuevos:
+            User.objects.bulk_create(nuevos)
+            self.creados[USUARIO] += len(nuevos)
+            encontrados.update(User.objects.filter(username__in=[u.username for u in nuevos])
+                               .values_list('username', 'pk'))
+        for nombre in faltan:
+            self.usuarios[nombre] = encontrados.get(nombre)
+
+    def usuario(self, campos, campo):
+        """pk local del usuario: por pk del respaldo (vía auth.user) o por `<campo>__username` (CSV)."""
+        nombre = campos.get(f'{campo}__username') or self.usuarios_fuente.get(campos.get(campo))
+        return self.usuarios.get(nombre)
+
+    def _nombres_usuario(self, objetos, campo):
+        return [o['fields'].get(f'{campo}__username') or self.usuarios_fuente.get(o['fields'].get(campo))
+                for o in objetos]
+
+    # --- inserción ---
+    def insertar_ordenes(self, objetos):
+        campos_modelo = self.campos[ServiceOrder]
+        folios = [o['fields'].get('folio') for o in objetos]
+        existentes = set(ServiceOrder.objects.filter(folio__in=[f for f in folios if f])
+                         .values_list('folio', flat=True))
+        self.resolver_usuarios(self._nombres_usuario(objetos, 'visor'))
+
+        nuevas, pks = [], []
+        for objeto in objetos:
+            pk, campos = objeto.get('pk'), objeto['fields']
+            folio = campos.get('folio')
+            if not folio:
+                self.error(ORDEN, pk, "sin folio")
+                self.ordenes[pk] = None
+                continue
+            if folio in existentes or folio in self.folios:
+                self.omitidos[f'{ORDEN} (folio existente)'] += 1
+                self.ordenes[pk] = None
+                continue
+            try:
+                valores = convertir(ServiceOrder, campos, campos_modelo, self.ignorados)
+            except ValidationError as e:
+                self.error(ORDEN, pk, "; ".join(e.messages))
+                self.ordenes[pk] = None
+                continue
+            self.folios.add(folio)
+            nuevas.append(ServiceOrder(visor_id=self.usuario(campos, 'visor'), **valores))
+            pks.append(pk)
+
+        ServiceOrder.objects.bulk_create(nuevas, batch_size=self.lote)
+        resumenes.sumar(nuevas)
+        materiales.invalidar()
+        agenda.invalidar()
+        versiones.renovar(versiones.FILAS_LISTA)
+        for pk, orden in zip(pks, nuevas):
+            if pk is not None:
+                self.ordenes[pk] = orden.pk
+        self.creados[ORDEN] += len(nuevas)
+
+    def insertar_hijos(self, modelo, etiqueta, objetos):
+        campos_modelo = self.campos[modelo]
+        nuevos = []
+        for objeto in objetos:
+            campos = objeto['fields']
+            orden = self.ordenes.get(campos.get('order'))
+            if orden is None:
+                # Orden omitida (folio existente o con error) o que no viene en el respaldo
+                self.omitidos[f'{etiqueta} (sin orden)'] += 1
+                continue
+            try:
+                valores = convertir(modelo, campos, campos_modelo, self.ignorados)
+            except ValidationError as e:
+                self.error(etiqueta, objeto.get('pk'), "; ".join(e.messages))
+                continue
+            if modelo is ShelterEquipment:
+                # La orden de devolución se remapea como la orden dueña (None si no vino o se omitió)
+                valores['orden_devolucion_id'] = self.ordenes.get(campos.get('orden_devolucion'))
+            nuevos.append(modelo(order_id=orden, **valores))
+        if modelo is Equipment:
+            activos.vincular(nuevos)
+        elif modelo is ServiceMaterial:
+            materiales.vincular(nuevos)
+        modelo.objects.bulk_create(nuevos, batch_size=self.lote)
+        self.creados[etiqueta] += len(nuevos)
+
+    def insertar_memorias(self, objetos):
+        campos_modelo = self.campos[TechnicalMemory]
+        self.resolver_usuarios(self._nombres_usuario(objetos, 'creado_por'))
+        nuevas, enlaces = [], []
+        for objeto in objetos:
+            campos = objeto['fields']
+            autor = self.usuario(campos, 'creado_por')
+            ordenes = [self.ordenes[o] for o in campos.get('orders', []) if self.ordenes.get(o)]
+            if autor is None or not ordenes:
+                self.omitidos[f'{MEMORIA} (sin autor u órdenes)'] += 1
+                continue
+            try:
+                valores = convertir(TechnicalMemory, campos, campos_modelo, self.ignorados)
+            except ValidationError as e:
+                self.error(MEMORIA, objeto.get('pk'), "; ".join(e.messages))
+                continue
+            nuevas.append(TechnicalMemory(creado_por_id=autor, **valores))
+            enlaces.append(ordenes)
+
+        TechnicalMemory.objects.bulk_create(nuevas, batch_size=self.lote)
+        Intermedia = TechnicalMemory.orders.through
+        Intermedia.objects.bulk_create(
+            [Intermedia(technicalmemory_id=m.pk, serviceorder_id=o) for m, ordenes in zip(nuevas, enlaces) for o in ordenes],
+            batch_size=self.lote,
+        )
+        self.creados[MEMORIA] += len(nuevas)
+
+    # --- reporte ---
+    @property
+    def total_creados(self):
+        return sum(self.creados.values())
+
+    @property
+    def segundos(self):
+        return time.perf_counter() - self.inicio
@@ -0,0 +1,42 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import respaldo
+
+
+class Command(BaseCommand):
+    help = ("Respaldo de la base (NDJSON por modelo) y de media (tar con sha256) en una carpeta nueva. "
+            "Con --desde solo guarda lo que cambió; se restaura con manage.py restore.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', default=os.path.join(settings.BASE_DIR, 'respaldos'),
+                            help="Carpeta donde se crean los respaldos (default: respaldos/).")
+        parser.add_argument('--desde',
+                            help="Incremental: fecha ISO (2025-01-31 o 2025-01-31T22:00) o 'ultimo' "
+                                 "para continuar desde el respaldo más reciente de --salida.")
+        parser.add_argument('--sin-media', action='store_true', help="Solo la base de datos.")
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde'] == 'ultimo':
+            anterior = respaldo.ultimo_respaldo(options['salida'])
+            if not anterior:
+                raise CommandError(f"No hay respaldos previos en {options['salida']}: haz primero uno completo.")
+            desde = respaldo.fecha(respaldo.leer_manifiesto(anterior)['hasta'])
+            self.stdout.write(f"Incremental sobre {os.path.basename(anterior)}")
+        elif options['desde']:
+            try:
+                desde = respaldo.fecha(options['desde'])
+            except ValueError:
+                raise CommandError(f"Fecha inválida: {options['desde']}")
+
+        carpeta, manifiesto = respaldo.respaldar(
+            options['salida'], desde=desde, media=not options['sin_media'],
+            al_avanzar=lambda modelo, filas: self.stdout.write(f"  {modelo}: {filas} filas"),
+        )
+        if 'media' in manifiesto:
+            media = manifiesto['media']
+            self.stdout.write(f"  media: {media['archivos']} archivos ({media['bytes'] / 1024 / 1024:.1f} MB)")
+        self.stdout.write(self.style.SUCCESS(f"Respaldo listo en {carpeta}"))
@@ -0,0 +1,76 @@
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+URL_CSS = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+SOURCE_MAP = re.compile(r"^\s*(/\*# sourceMappingURL=.*?\*/|//# sourceMappingURL=.*)$", re.MULTILINE)
+CHARSET = re.compile(r'@charset\s+"[^"]*";\s*', re.IGNORECASE)
+
+
+class Command(BaseCommand):
+    help = ("Arma los paquetes de STATIC_BUNDLES (CSS y JS concatenados y minificados) en static/. "
+            "Se corre antes de collectstatic, que les pone hash y genera las versiones .gz/.br.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sin-minificar', action='store_true', help="Solo concatena (para depurar).")
+
+    def handle(self, *args, **options):
+        destino_base = Path(settings.STATICFILES_DIRS[0])
+        minificar = not options['sin_minificar']
+        if minificar:
+            try:
+                import rcssmin
+                import rjsmin
+            except ImportError:
+                self.stdout.write(self.style.WARNING("rjsmin/rcssmin no instalados: se concatena sin minificar."))
+                minificar = False
+
+        for nombre, fuentes in settings.STATIC_BUNDLES.items():
+            partes = []
+            for fuente in fuentes:
+                ruta = finders.find(fuente)
+                if not ruta:
+                    raise CommandError(f"{nombre}: no se encontró {fuente}")
+                texto = Path(ruta).read_text(encoding='utf-8')
+                texto = SOURCE_MAP.sub('', texto)
+                if nombre.endswith('.css'):
+                    texto = self.reubicar_urls(CHARSET.sub('', texto), fuente, nombre)
+                partes.append(f"/* {fuente} */\n{texto.strip()}\n")
+
+            if nombre.endswith('.css'):
+                contenido = '@charset "UTF-8";\n' + "\n".join(partes)
+                if minificar:
+                    contenido = rcssmin.cssmin(contenido, keep_bang_comments=True)
+            else:
+                # ";" entre archivos por si alguno no termina en punto y coma
+                contenido = ";\n".join(partes)
+                if minificar:
+                    contenido = rjsmin.jsmin(contenido, keep_bang_comments=True)
+
+            destino = destino_base / nombre
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            destino.write_text(contenido, encoding='utf-8')
+            original = sum(Path(finders.find(f)).stat().st_size for f in fuentes)
+            self.stdout.write(f"{nombre}: {len(fuentes)} archivos, {original / 1024:.0f} KB -> "
+                              f"{destino.stat().st_size / 1024:.0f} KB")
+
+        self.stdout.write(self.style.SUCCESS("Paquetes listos. Sigue: manage.py collectstatic"))
+
+    def reubicar_urls(self, css, fuente, paquete):
+        """Las url() relativas (fuentes de iconos, imágenes) se reescriben respecto al paquete."""
+        dir_fuente = posixpath.dirname(fuente)
+        dir_paquete = posixpath.dirname(paquete)
+
+        def reemplazar(m):
+            url = m.group(2).strip()
+            if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+                return m.group(0)
+            ruta, sep, resto = re.match(r'([^?#]*)([?#]?)(.*)', url).groups()
+            nueva = posixpath.relpath(posixpath.normpath(posixpath.join(dir_fuente, ruta)), dir_paquete)
+            return f'url("{nueva}{sep}{resto}")'
+
+        return URL_CSS.sub(reemplazar, css)
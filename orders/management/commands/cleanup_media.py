@@ -0,0 +1,78 @@
+import os
+import time
+
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from orders.almacenamiento import (
+    CAMPOS, GRACIA, _almacenamiento as almacen, es_por_contenido, nombres_referenciados,
+)
+
+
+class Command(BaseCommand):
+    help = ("Borra de media/ los archivos de firmas y evidencias que ya no usa ninguna fila. "
+            "Con --migrar, antes pasa los archivos viejos (nombres con uuid) al almacenamiento por contenido.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Solo reporta, no borra ni mueve nada.")
+        parser.add_argument('--migrar', action='store_true',
+                            help="Reescribe los archivos con nombre viejo como <sha256> (deduplica lo existente).")
+        parser.add_argument('--gracia', type=int, default=GRACIA // 60,
+                            help="Minutos: no se tocan archivos más nuevos (subidas en curso).")
+
+    def handle(self, *args, **options):
+        if options['migrar']:
+            self.migrar(options['dry_run'])
+
+        referenciados = nombres_referenciados()
+        limite = time.time() - options['gracia'] * 60
+        huerfanos, liberado = 0, 0
+
+        for carpeta in self.carpetas():
+            for nombre, ruta in self.recorrer(carpeta):
+                if nombre in referenciados or os.path.getmtime(ruta) > limite:
+                    continue
+                huerfanos += 1
+                liberado += os.path.getsize(ruta)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  huérfano: {nombre}")
+                if not options['dry_run']:
+                    almacen.delete(nombre)
+
+        accion = "Se borrarían" if options['dry_run'] else "Borrados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{accion} {huerfanos} archivos huérfanos ({liberado / 1024 / 1024:.1f} MB)."
+        ))
+
+    def carpetas(self):
+        """Primer nivel de upload_to de cada campo (engineer_signatures, signatures, evidencias)."""
+        for modelo, campo in CAMPOS:
+            upload_to = apps.get_model(modelo)._meta.get_field(campo).upload_to
+            yield upload_to.split('/', 1)[0]
+
+    def recorrer(self, carpeta):
+        base = almacen.path(carpeta)
+        for raiz, _, archivos in os.walk(base):
+            for archivo in archivos:
+                ruta = os.path.join(raiz, archivo)
+                yield os.path.relpath(ruta, almacen.location).replace(os.sep, '/'), ruta
+
+    def migrar(self, dry_run):
+        movidos = 0
+        for modelo, campo in CAMPOS:
+            Modelo = apps.get_model(modelo)
+            filas = (Modelo._default_manager.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                     .values_list('pk', campo))
+            for pk, nombre in filas.iterator():
+                if es_por_contenido(nombre) or not almacen.exists(nombre):
+                    continue
+                movidos += 1
+                if dry_run:
+                    continue
+                with almacen.open(nombre) as f:
+                    nuevo = almacen.save(nombre, File(f, nombre))
+                # update() no dispara señales: el archivo viejo lo recoge el barrido de abajo
+                Modelo._default_manager.filter(pk=pk).update(**{campo: nuevo})
+        accion = "Se migrarían" if dry_run else "Migrados"
+        self.stdout.write(f"{accion} {movidos} archivos al almacenamiento por contenido.")
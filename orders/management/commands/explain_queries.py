@@ -0,0 +1,101 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import ServiceOrder, TechnicalMemory
+from orders.views import rango_fechas
+
+
+class Command(BaseCommand):
+    help = "Ejecuta EXPLAIN sobre las consultas de las vistas principales y reporta si usan índices."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Crea N órdenes sintéticas antes de medir (se revierten al terminar).")
+        parser.add_argument('--analyze', action='store_true',
+                            help="Usa EXPLAIN ANALYZE (ejecuta realmente las consultas).")
+        parser.add_argument('--verbose-plan', action='store_true',
+                            help="Imprime el plan completo de cada consulta.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write("Este benchmark requiere PostgreSQL.")
+            return
+
+        # Todo dentro de una transacción que se revierte: los datos sintéticos no se quedan
+        with transaction.atomic():
+            if options['seed']:
+                self.sembrar(options['seed'])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE orders_serviceorder")
+                cursor.execute("ANALYZE orders_technicalmemory")
+
+            fallas = 0
+            for vista, nombre, qs in self.consultas():
+                plan = qs.explain(analyze=options['analyze'])
+                usa_indice = 'Index' in plan
+                if not usa_indice:
+                    fallas += 1
+                estado = self.style.SUCCESS("ÍNDICE") if usa_indice else self.style.WARNING("SEQ SCAN")
+                self.stdout.write(f"[{estado}] {vista}: {nombre}")
+                if options['verbose_plan'] or not usa_indice:
+                    for linea in plan.splitlines():
+                        self.stdout.write(f"      {linea}")
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"\n{fallas} consulta(s) sin índice.")
+
+    def consultas(self):
+        """Las mismas consultas que arman las vistas (dashboard, order_list, memorias)."""
+        hoy = timezone.localdate()
+        inicio_mes = hoy.replace(day=1).isoformat()
+        desde, hasta = rango_fechas(inicio_mes, hoy.isoformat(), 'creado')
+        desde_srv, hasta_srv = rango_fechas(inicio_mes, hoy.isoformat(), 'fecha_servicio')
+        cliente = ServiceOrder.objects.values_list('cliente_nombre', flat=True).first() or "Cliente"
+
+        return [
+            ("dashboard", "pendientes", ServiceOrder.objects.filter(estatus='borrador').values('pk')),
+            ("dashboard", "recientes", ServiceOrder.objects.all().order_by('-creado')[:5]),
+            ("order_list", "página por defecto", ServiceOrder.objects.all().order_by('-creado')[:15]),
+            ("order_list", "filtro estatus", ServiceOrder.objects.filter(estatus='finalizado').order_by('-creado')[:15]),
+            ("order_list", "filtro empresa", ServiceOrder.objects.filter(cliente_nombre=cliente).order_by('-creado')[:15]),
+            ("order_list", "rango de creación (mes)",
+             ServiceOrder.objects.filter(creado__gte=desde, creado__lt=hasta).order_by('-creado')[:15]),
+            ("order_list", "rango de fecha de servicio (mes)",
+             ServiceOrder.objects.filter(fecha_servicio__gte=desde_srv, fecha_servicio__lt=hasta_srv)
+             .order_by('-fecha_servicio', '-creado')[:15]),
+            ("order_list", "select de empresas",
+             ServiceOrder.objects.exclude(cliente_nombre='').values_list('cliente_nombre', flat=True).distinct().order_by('cliente_nombre')),
+            ("memory_selection", "finalizadas",
+             ServiceOrder.objects.filter(estatus='finalizado').order_by('-fecha_servicio')[:50]),
+            ("memory_preview", "historial del cliente",
+             TechnicalMemory.objects.filter(cliente_nombre__iexact=cliente).order_by('-creado')[:5]),
+        ]
+
+    def sembrar(self, total):
+        """Datos mínimos y rápidos (bulk_create) para que el planificador tenga volumen real."""
+        clientes = [f"Cliente Benchmark {i}" for i in range(max(total // 50, 1))]
+        ingenieros = [f"Ingeniero {i}" for i in range(10)]
+        ahora = timezone.now()
+        ordenes = []
+        for i in range(total):
+            ordenes.append(ServiceOrder(
+                folio=f"BENCH-{i:07d}",
+                cliente_nombre=random.choice(clientes),
+                ingeniero_nombre=random.choice(ingenieros),
+                estatus=random.choice(['borrador', 'finalizado', 'finalizado', 'finalizado']),
+                fecha_servicio=(ahora - timedelta(days=random.randint(0, 730))).date(),
+            ))
+        ServiceOrder.objects.bulk_create(ordenes, batch_size=2000)
+
+        # bulk_create pone la misma fecha de creación a todas; la repartimos en 2 años
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE orders_serviceorder SET creado = now() - random() * interval '730 days' "
+                "WHERE folio LIKE %s", ['BENCH-%']
+            )
+        self.stdout.write(f"Sembradas {total} órdenes sintéticas.")
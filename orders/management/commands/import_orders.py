@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from orders import importacion
+
+
+class Command(BaseCommand):
+    help = ("Importa órdenes (con equipos, materiales, resguardos, evidencias y memorias) desde respaldos "
+            "JSON de dumpdata, JSON Lines o el CSV de la exportación. Conserva folios, remapea los pk y "
+            "omite las órdenes cuyo folio ya existe. Mucho más rápido que loaddata.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivos', nargs='+', help="Respaldos a importar (en orden).")
+        parser.add_argument('--formato', choices=['json', 'csv'], help="Por defecto, según la extensión.")
+        parser.add_argument('--codificacion', help="Forzar la codificación (por defecto se detecta).")
+        parser.add_argument('--lote', type=int, default=importacion.LOTE, help="Filas por bulk_create.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Valida e inserta dentro de una transacción que se revierte al final.")
+
+    def handle(self, *args, **options):
+        verbosidad = options['verbosity']
+        importador = importacion.Importador(
+            lote=options['lote'],
+            al_avanzar=self.avance if verbosidad > 0 else None,
+        )
+
+        with transaction.atomic():
+            for ruta in options['archivos']:
+                try:
+                    objetos, codificacion = importacion.leer(ruta, options['formato'], options['codificacion'])
+                except OSError as e:
+                    raise CommandError(f"No se pudo abrir {ruta}: {e}")
+                self.stdout.write(f"{ruta} ({codificacion})")
+                try:
+                    importador.importar(objetos)
+                except (importacion.ErrorImportacion, UnicodeDecodeError) as e:
+                    raise CommandError(f"{ruta}: {e}")
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        self.reporte(importador, verbosidad, options['dry_run'])
+
+    def avance(self, importador):
+        self.stdout.write(
+            f"  {importador.total_creados} filas en {importador.segundos:.1f}s "
+            f"({importador.total_creados / max(importador.segundos, 1e-6):.0f} filas/s)"
+        )
+
+    def reporte(self, importador, verbosidad, dry_run):
+        for etiqueta, n in sorted(importador.creados.items()):
+            self.stdout.write(f"  {etiqueta}: {n} creados")
+        for etiqueta, n in sorted(importador.omitidos.items()):
+            self.stdout.write(f"  omitidos {etiqueta}: {n}")
+        if importador.ignorados:
+            campos = ", ".join(f"{modelo}.{campo}" for modelo, campo in sorted(importador.ignorados))
+            self.stdout.write(self.style.WARNING(f"  Campos que ya no existen (ignorados): {campos}"))
+        for error in importador.errores[:20 if verbosidad < 2 else None]:
+            self.stdout.write(self.style.ERROR(f"  {error}"))
+        if len(importador.errores) > 20 and verbosidad < 2:
+            self.stdout.write(f"  ... y {len(importador.errores) - 20} errores más (usa -v 2).")
+
+        total, segundos = importador.total_creados, importador.segundos
+        accion = "Se importarían" if dry_run else "Importadas"
+        self.stdout.write(self.style.SUCCESS(
+            f"{accion} {total} filas en {segundos:.1f}s ({total / max(segundos, 1e-6):.0f} filas/s)."
+        ))
@@ -0,0 +1,158 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import ServiceOrder, TechnicalMemory
+
+
+class Command(BaseCommand):
+    help = ("Prueba de carga con el cliente de pruebas de Django sobre los flujos de órdenes. "
+            "Reporta latencia p50/p95 y número de consultas por escenario. Todo se revierte al terminar.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=20, help="Repeticiones por escenario.")
+        parser.add_argument('--usuario', help="Usuario con el que se navega (por defecto, el primer superusuario).")
+        parser.add_argument('--solo', nargs='+', help="Ejecuta solo estos escenarios.")
+        parser.add_argument('--salida', help="Guarda los resultados en JSON para comparar corridas.")
+
+    def handle(self, *args, **options):
+        if options['usuario']:
+            user = User.objects.filter(username=options['usuario']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if not user:
+            raise CommandError("No hay usuario para la prueba (usa --usuario o crea un superusuario).")
+
+        ordenes = list(ServiceOrder.objects.order_by('-creado').values_list('pk', flat=True)[:200])
+        if not ordenes:
+            raise CommandError("No hay órdenes. Genera datos con: manage.py seed_data")
+
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        self.client = Client(HTTP_HOST=host, raise_request_exception=False)
+        self.client.force_login(user)
+        self.user = user
+        self.ordenes = ordenes
+        self.cliente = ServiceOrder.objects.filter(pk=ordenes[0]).values_list('cliente_nombre', flat=True).first()
+
+        resultados = {}
+        # Las altas/ediciones de la prueba no se quedan en la base
+        with transaction.atomic():
+            escenarios = self.escenarios()
+            nombres = options['solo'] or list(escenarios)
+            for nombre in nombres:
+                if nombre not in escenarios:
+                    raise CommandError(f"Escenario desconocido: {nombre}. Opciones: {', '.join(escenarios)}")
+                resultados[nombre] = self.medir(escenarios[nombre], options['iteraciones'])
+                self.imprimir(nombre, resultados[nombre])
+            transaction.set_rollback(True)
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                json.dump({'fecha': timezone.now().isoformat(), 'resultados': resultados}, f, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+    # ------------------------------------------------------------
+    # Escenarios
+    # ------------------------------------------------------------
+    def escenarios(self):
+        hoy = timezone.localdate()
+        inicio_mes = hoy.replace(day=1)
+        return {
+            'dashboard': lambda i: self.client.get(reverse('orders:dashboard')),
+            'lista': lambda i: self.client.get(reverse('orders:list')),
+            'lista_busqueda': lambda i: self.client.get(reverse('orders:list'), {'q': self.cliente.split()[0]}),
+            'lista_filtros': lambda i: self.client.get(reverse('orders:list'), {
+                'estatus': 'finalizado', 'fecha_inicio': inicio_mes.isoformat(), 'fecha_fin': hoy.isoformat(),
+            }),
+            'lista_paginada': lambda i: self.client.get(reverse('orders:list'), {'page': i % 10 + 2}),
+            'detalle': lambda i: self.client.get(reverse('orders:detail', args=[self.orden(i)])),
+            'preview': lambda i: self.client.get(reverse('orders:preview', args=[self.orden(i)])),
+            'crear': self.crear,
+            'editar': self.editar,
+            'word': lambda i: self.client.get(reverse('orders:download_word', args=[self.orden(i)])),
+            'pdf': self.pdf,
+            'memoria_word': self.memoria_word,
+        }
+
+    def orden(self, i):
+        return self.ordenes[i % len(self.ordenes)]
+
+    def datos_formsets(self):
+        datos = {}
+        for prefijo in ('equipos', 'materiales', 'resguardos', 'evidencias'):
+            datos[f'{prefijo}-TOTAL_FORMS'] = 0
+            datos[f'{prefijo}-INITIAL_FORMS'] = 0
+        return datos
+
+    def crear(self, i):
+        datos = {'cliente_nombre': f"Carga {i}", 'titulo': "Orden de prueba de carga", 'accion': 'borrador'}
+        datos.update(self.datos_formsets())
+        return self.client.post(reverse('orders:create'), datos)
+
+    def editar(self, i):
+        orden = ServiceOrder.objects.get(pk=self.orden(i))
+        datos = {'cliente_nombre': orden.cliente_nombre, 'titulo': f"Editada {i}",
+                 'version': orden.version, 'accion': 'borrador'}
+        datos.update(self.datos_formsets())
+        # Los formsets existentes se envían vacíos: solo se mide la edición de la orden
+        return self.client.post(reverse('orders:update', args=[orden.pk]), datos)
+
+    def pdf(self, i):
+        """No hay endpoint de PDF (se genera dentro de email_order); se mide el mismo render."""
+        from orders import documentos
+
+        orden = ServiceOrder.objects.get(pk=self.orden(i))
+        html = render_to_string('orders/order_detail.html', {'object': orden, 'print_mode': True})
+        documentos.generar_pdf(html, f"http://{self.client.defaults['HTTP_HOST']}/")
+
+    def memoria_word(self, i):
+        ids = self.ordenes[:5]
+        memoria = TechnicalMemory.objects.create(
+            cliente_nombre=self.cliente, contenido_v1_ia="<p>Memoria de prueba</p>", creado_por=self.user,
+        )
+        return self.client.post(reverse('orders:memory_download'), {
+            'memoria_id': memoria.pk,
+            'texto_final': "<h2>I. Introducción</h2><p>Texto de prueba de carga.</p>",
+            'selected_ids': str(ids),
+        })
+
+    # ------------------------------------------------------------
+    # Medición
+    # ------------------------------------------------------------
+    def medir(self, escenario, iteraciones):
+        tiempos, consultas, errores = [], [], 0
+        for i in range(iteraciones):
+            with CaptureQueriesContext(connection) as ctx:
+                inicio = time.perf_counter()
+                response = escenario(i)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(ctx.captured_queries))
+            if response is not None and response.status_code >= 400:
+                errores += 1
+
+        cuantiles = statistics.quantiles(tiempos, n=20, method="inclusive") if len(tiempos) > 1 else tiempos * 19
+        return {
+            'n': iteraciones,
+            'p50_ms': round(statistics.median(tiempos), 1),
+            'p95_ms': round(cuantiles[18], 1),
+            'max_ms': round(max(tiempos), 1),
+            'consultas': round(statistics.mean(consultas), 1),
+            'errores': errores,
+        }
+
+    def imprimir(self, nombre, r):
+        linea = (f"{nombre:<16} p50 {r['p50_ms']:>8.1f} ms   p95 {r['p95_ms']:>8.1f} ms   "
+                 f"max {r['max_ms']:>8.1f} ms   consultas {r['consultas']:>6.1f}")
+        if r['errores']:
+            linea += self.style.ERROR(f"   errores {r['errores']}")
+        self.stdout.write(linea)
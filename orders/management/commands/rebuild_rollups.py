@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from orders.resumenes import reconstruir
+
+
+class Command(BaseCommand):
+    help = ("Recalcula los resúmenes diarios del dashboard (órdenes, horas y costo por estatus, tipo, "
+            "ingeniero y cliente) a partir de las órdenes. Sin fechas, recalcula todo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Primer día a recalcular (AAAA-MM-DD).")
+        parser.add_argument('--hasta', help="Último día a recalcular (AAAA-MM-DD).")
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for opcion in ('desde', 'hasta'):
+            if options[opcion]:
+                fechas[opcion] = parse_date(options[opcion])
+                if fechas[opcion] is None:
+                    raise CommandError(f"Fecha inválida en --{opcion}: {options[opcion]}")
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            filas = reconstruir(**fechas)
+        self.stdout.write(self.style.SUCCESS(
+            f"{filas} resúmenes recalculados en {time.perf_counter() - inicio:.1f}s."
+        ))
@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import respaldo
+
+
+class Command(BaseCommand):
+    help = ("Restaura respaldos de manage.py backup. Con la carpeta base aplica el último completo y "
+            "sus incrementales; con la carpeta de un respaldo, solo ese. Deja la base igual que al "
+            "respaldar (upserts por pk y borra lo que ya no existía). Para mezclar datos de otro "
+            "sistema usa import_orders.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('ruta', help="Carpeta base de respaldos o carpeta de un respaldo.")
+        parser.add_argument('--sin-media', action='store_true', help="No extrae media.tar.")
+        parser.add_argument('--sin-verificar', action='store_true',
+                            help="No compara los archivos del tar contra media.sha256 antes de restaurar.")
+
+    def handle(self, *args, **options):
+        cadena = respaldo.cadena(options['ruta'])
+        if not cadena:
+            raise CommandError(f"No hay respaldos completos en {options['ruta']}")
+        media = not options['sin_media']
+
+        if media and not options['sin_verificar']:
+            for carpeta in cadena:
+                malos = respaldo.verificar_media(carpeta)
+                if malos:
+                    raise CommandError(f"{carpeta}: {len(malos)} archivos no coinciden con su sha256 "
+                                       f"(ej. {malos[0]}). No se restauró nada.")
+
+        for carpeta in cadena:
+            self.stdout.write(carpeta)
+            resultado = respaldo.restaurar(carpeta, media=media, al_avanzar=self.avance)
+            if media:
+                self.stdout.write(f"  media: {resultado['media']} archivos")
+
+        # Fragmentos de plantilla y usuarios en caché pueden ser de antes de restaurar
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(f"Restaurados {len(cadena)} respaldos."))
+
+    def avance(self, modelo, filas, borradas):
+        extra = f", {borradas} borradas" if borradas else ""
+        self.stdout.write(f"  {modelo}: {filas} filas{extra}")
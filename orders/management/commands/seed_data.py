@@ -0,0 +1,239 @@
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders import agenda
+from orders import materiales as catalogo
+from orders.activos import vincular
+from orders.almacenamiento import almacenamiento
+from orders.borrado import borrar_ordenes
+from orders.resumenes import sumar
+from orders.models import (
+    SERVICE_TYPES, EngineerProfile, Equipment, ServiceEvidence, ServiceMaterial,
+    ServiceOrder, ShelterEquipment,
+)
+
+# Marca de los datos sintéticos (para poder borrarlos con --limpiar)
+TICKET_SEED = "SEED-"
+
+EMPRESAS = ["Grupo", "Industrias", "Comercializadora", "Servicios", "Corporativo", "Distribuidora", "Laboratorios"]
+GIROS = ["del Norte", "Regiomontana", "Aceros", "Logística", "Alimentos", "Textil", "Médica", "Automotriz"]
+CIUDADES = ["Monterrey, N.L.", "San Pedro Garza García, N.L.", "Apodaca, N.L.", "Saltillo, Coah.", "Guadalupe, N.L."]
+NOMBRES = ["Ana", "Luis", "María", "Jorge", "Carlos", "Sofía", "Diego", "Fernanda", "Ricardo", "Paola", "Héctor", "Valeria"]
+APELLIDOS = ["García", "Martínez", "López", "Hernández", "González", "Pérez", "Rodríguez", "Treviño", "Garza", "Cantú"]
+MARCAS = [("HP", "ProLiant DL380"), ("Dell", "PowerEdge R740"), ("Cisco", "Catalyst 9200"), ("Lenovo", "ThinkSystem SR650"),
+          ("Fortinet", "FortiGate 60F"), ("Ubiquiti", "UniFi U6"), ("APC", "Smart-UPS 1500")]
+MATERIALES = ["Cable UTP Cat6 (m)", "Conector RJ45", "Patch cord 1m", "Disco SSD 1TB", "Memoria RAM 16GB", "Fuente de poder",
+              "Canaleta 20mm (m)", "Jack Cat6"]
+ACTIVIDADES = [
+    "Se realizó diagnóstico del equipo y se detectó falla en la fuente de poder.",
+    "Se instaló y configuró el equipo según el levantamiento previo.",
+    "Mantenimiento preventivo: limpieza, revisión de ventiladores y actualización de firmware.",
+    "Se configuraron VLANs y políticas de acceso en el switch principal.",
+    "Capacitación al personal del cliente sobre el uso de la consola de administración.",
+    "Se reemplazó disco dañado y se reconstruyó el arreglo RAID.",
+]
+
+
+class Command(BaseCommand):
+    help = "Genera clientes, ingenieros y órdenes sintéticas (con evidencias y firmas) para pruebas de carga."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=50, help="Número de clientes (empresas) distintos.")
+        parser.add_argument('--ingenieros', type=int, default=8, help="Número de ingenieros (usuarios staff).")
+        parser.add_argument('--ordenes', type=int, default=1000, help="Número de órdenes a crear.")
+        parser.add_argument('--evidencias', type=int, default=2, help="Evidencias (imágenes) por orden.")
+        parser.add_argument('--sin-archivos', action='store_true',
+                            help="No genera imágenes de evidencia ni firmas (solo filas).")
+        parser.add_argument('--lote', type=int, default=500, help="Órdenes por lote de bulk_create.")
+        parser.add_argument('--semilla', type=int, default=None, help="Semilla del generador aleatorio.")
+        parser.add_argument('--limpiar', action='store_true', help="Borra los datos sintéticos previos y termina.")
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            ids = ServiceOrder.objects.filter(ticket_id__startswith=TICKET_SEED).values_list('pk', flat=True)
+            borradas = borrar_ordenes(
+                list(ids), al_avanzar=lambda hechas, total: self.stdout.write(f"  {hechas}/{total} órdenes borradas..."),
+            )
+            usuarios, _ = User.objects.filter(username__startswith='seed.').delete()
+            self.stdout.write(self.style.SUCCESS(f"Borradas {borradas} órdenes y {usuarios} registros de usuarios."))
+            return
+
+        self.rng = random.Random(options['semilla'])
+        self.archivos = not options['sin_archivos']
+        inicio = timezone.now()
+
+        clientes = self.generar_clientes(options['clientes'])
+        self.parques = {}  # cliente -> [(marca, modelo, serie)] de sus equipos
+        ingenieros = self.crear_usuarios(options['ingenieros'], staff=True)
+        visores = self.crear_usuarios(max(options['ingenieros'] // 2, 1), staff=False)
+        self.pool_imagenes = [self.imagen_evidencia() for _ in range(12)] if self.archivos else []
+
+        total = options['ordenes']
+        base = ServiceOrder.objects.count()
+        creadas = 0
+        while creadas < total:
+            n = min(options['lote'], total - creadas)
+            with transaction.atomic():
+                self.crear_lote(base + creadas, n, clientes, ingenieros, visores, options['evidencias'])
+            creadas += n
+            self.stdout.write(f"  {creadas}/{total} órdenes...")
+
+        segundos = (timezone.now() - inicio).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo: {len(clientes)} clientes, {len(ingenieros)} ingenieros, {total} órdenes en {segundos:.1f}s."
+        ))
+
+    # ------------------------------------------------------------
+    # Catálogos
+    # ------------------------------------------------------------
+    def generar_clientes(self, total):
+        clientes = []
+        for i in range(total):
+            nombre = f"{self.rng.choice(EMPRESAS)} {self.rng.choice(GIROS)} {i + 1}"
+            contacto = f"{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}"
+            clientes.append({
+                'cliente_nombre': nombre,
+                'cliente_contacto': contacto,
+                'cliente_email': f"contacto{i + 1}@cliente{i + 1}.com.mx",
+                'cliente_telefono': f"81{self.rng.randint(10000000, 99999999)}",
+                'ubicacion': self.rng.choice(CIUDADES),
+            })
+        return clientes
+
+    def crear_usuarios(self, total, staff):
+        rol = 'ing' if staff else 'visor'
+        usuarios = []
+        for i in range(total):
+            username = f"seed.{rol}{i + 1}"
+            user, creado = User.objects.get_or_create(username=username, defaults={
+                'first_name': self.rng.choice(NOMBRES),
+                'last_name': f"{self.rng.choice(APELLIDOS)} {i + 1}",
+                'email': f"{username}@inovatech.com.mx",
+                'is_staff': staff,
+            })
+            if creado:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+                if self.archivos:
+                    perfil, _ = EngineerProfile.objects.get_or_create(user=user)
+                    perfil.firma.save(f"firma_{username}.png", ContentFile(self.imagen_firma()), save=True)
+            usuarios.append(user)
+        return usuarios
+
+    # ------------------------------------------------------------
+    # Órdenes
+    # ------------------------------------------------------------
+    def crear_lote(self, base, total, clientes, ingenieros, visores, evidencias_por_orden):
+        hoy = timezone.localdate()
+        tz = timezone.get_current_timezone()
+        ordenes = []
+        for i in range(total):
+            seq = base + i + 1
+            cliente = self.rng.choice(clientes)
+            ingeniero = self.rng.choice(ingenieros)
+            # Siempre antes de hoy para no alterar la numeración de folios del día
+            fecha = hoy - timedelta(days=self.rng.randint(1, 730))
+            creado = timezone.make_aware(datetime.combine(fecha, time(self.rng.randint(8, 18), self.rng.randint(0, 59))), tz)
+            finalizada = self.rng.random() < 0.8
+            reagenda = self.rng.random() < 0.1
+            orden = ServiceOrder(
+                folio=f"OS-{fecha:%Y%m%d}-Z{seq:05d}",
+                ticket_id=f"{TICKET_SEED}{seq}",
+                fecha_servicio=fecha,
+                visor=self.rng.choice(visores),
+                tipos_servicio=self.rng.sample([c for c, _ in SERVICE_TYPES], self.rng.randint(1, 2)),
+                ingeniero_nombre=ingeniero.get_full_name(),
+                titulo=f"Servicio a {cliente['cliente_nombre']}",
+                actividades=" ".join(self.rng.sample(ACTIVIDADES, 3)),
+                comentarios="Sin comentarios adicionales." if self.rng.random() < 0.7 else "Cliente solicita seguimiento.",
+                horas=Decimal(self.rng.randint(1, 16)) / 2,
+                costo_mxn=Decimal(self.rng.randint(0, 400) * 50),
+                reagenda=reagenda,
+                reagenda_fecha=fecha + timedelta(days=self.rng.randint(1, 20)) if reagenda else None,
+                reagenda_hora=time(self.rng.randint(8, 17)) if reagenda else None,
+                estatus='finalizado' if finalizada else 'borrador',
+                email_enviado=finalizada and self.rng.random() < 0.9,
+                **cliente,
+            )
+            if self.archivos and finalizada:
+                orden.firma.name = almacenamiento().save(f"signatures/firma_cliente_seed_{seq}.png", ContentFile(self.imagen_firma()))
+            orden._creado_real = creado
+            ordenes.append(orden)
+
+        ServiceOrder.objects.bulk_create(ordenes)
+
+        # auto_now_add/auto_now ignoran el valor en bulk_create; bulk_update no los toca
+        for orden in ordenes:
+            orden.creado = orden.actualizado = orden._creado_real
+        ServiceOrder.objects.bulk_update(ordenes, ['creado', 'actualizado'])
+        sumar(ordenes)  # bulk_create no dispara las señales de los resúmenes diarios
+
+        equipos, materiales, resguardos, evidencias = [], [], [], []
+        for orden in ordenes:
+            parque = self.parques.setdefault(orden.cliente_nombre, [])
+            for _ in range(self.rng.randint(1, 3)):
+                # Más de la mitad de las visitas son a equipos que ya atendimos (historial por serie)
+                if parque and self.rng.random() < 0.6:
+                    marca, modelo, serie = self.rng.choice(parque)
+                else:
+                    marca, modelo = self.rng.choice(MARCAS)
+                    serie = f"SN{self.rng.randint(10**7, 10**8 - 1)}"
+                    parque.append((marca, modelo, serie))
+                equipos.append(Equipment(order=orden, marca=marca, modelo=modelo, serie=serie,
+                                         descripcion=f"{marca} {modelo}"))
+            for _ in range(self.rng.randint(0, 4)):
+                materiales.append(ServiceMaterial(order=orden, cantidad=self.rng.randint(1, 20),
+                                                  descripcion=self.rng.choice(MATERIALES)))
+            for _ in range(self.rng.randint(0, 2) if self.rng.random() < 0.2 else 0):
+                marca, modelo = self.rng.choice(MARCAS)
+                resguardos.append(ShelterEquipment(order=orden, cantidad=1, descripcion=f"{marca} {modelo}",
+                                                   comentarios="En resguardo para diagnóstico"))
+            if self.archivos:
+                for n in range(evidencias_por_orden):
+                    ruta = f"evidencias/{orden._creado_real:%Y/%m}/seed_{orden.pk}_{n}.jpg"
+                    ev = ServiceEvidence(order=orden, comentario=f"Evidencia {n + 1}")
+                    ev.archivo.name = almacenamiento().save(ruta, ContentFile(self.rng.choice(self.pool_imagenes)))
+                    evidencias.append(ev)
+
+        vincular(equipos)  # bulk_create no dispara la señal que los enlaza con su activo
+        Equipment.objects.bulk_create(equipos)
+        catalogo.vincular(materiales)  # ídem con su material del catálogo
+        ServiceMaterial.objects.bulk_create(materiales)
+        catalogo.invalidar()
+        agenda.invalidar()
+        ShelterEquipment.objects.bulk_create(resguardos)
+        ServiceEvidence.objects.bulk_create(evidencias)
+
+    # ------------------------------------------------------------
+    # Imágenes sintéticas
+    # ------------------------------------------------------------
+    def imagen_evidencia(self):
+        """JPEG de 1280x720 parecido a una foto comprimida por ServiceEvidence.save()."""
+        img = Image.new("RGB", (1280, 720), tuple(self.rng.randint(40, 200) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(40):
+            x, y = self.rng.randint(0, 1200), self.rng.randint(0, 650)
+            draw.rectangle([x, y, x + self.rng.randint(20, 300), y + self.rng.randint(20, 200)],
+                           fill=tuple(self.rng.randint(0, 255) for _ in range(3)))
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=70, optimize=True)
+        return buffer.getvalue()
+
+    def imagen_firma(self):
+        """PNG transparente con un trazo, como el que genera signature.js."""
+        img = Image.new("RGBA", (400, 150), (255, 255, 255, 0))
+        draw = ImageDraw.Draw(img)
+        puntos = [(20 + i * 18, 75 + self.rng.randint(-40, 40)) for i in range(20)]
+        draw.line(puntos, fill=(0, 0, 0, 255), width=3)
+        buffer = BytesIO()
+        img.save(buffer, format='PNG')
+        return buffer.getvalue()
@@ -0,0 +1,79 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Lo mismo que hace un worker de gunicorn al arrancar: setup + URLconf + aplicación WSGI
+CODIGO_ARRANQUE = """
+import os, resource, time
+inicio = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", {settings!r})
+import django
+django.setup()
+import importlib
+importlib.import_module({urlconf!r})
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+{extra}
+fin = time.perf_counter()
+print("ARRANQUE_MS", (fin - inicio) * 1000)
+print("RSS_KB", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+EXTRA_DOCUMENTOS = "import orders.documentos, orders.ia"
+
+LINEA_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+class Command(BaseCommand):
+    help = ("Mide el arranque de un worker (python -X importtime): tiempo, memoria (RSS) "
+            "y los módulos que más tardan en importarse.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help="Arranques a medir (se reporta la mediana).")
+        parser.add_argument('--top', type=int, default=15, help="Cuántos módulos pesados listar.")
+        parser.add_argument('--con-documentos', action='store_true',
+                            help="Incluye orders.documentos y orders.ia (costo del primer Word/PDF/memoria).")
+
+    def handle(self, *args, **options):
+        codigo = CODIGO_ARRANQUE.format(
+            settings=os.environ.get('DJANGO_SETTINGS_MODULE', 'servicereports.settings'),
+            urlconf=settings.ROOT_URLCONF,
+            extra=EXTRA_DOCUMENTOS if options['con_documentos'] else "",
+        )
+
+        tiempos, memoria, modulos, todos = [], [], {}, set()
+        for _ in range(options['repeticiones']):
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", codigo],
+                capture_output=True, text=True, cwd=settings.BASE_DIR,
+            )
+            if proc.returncode != 0:
+                raise CommandError(f"El arranque falló:\n{proc.stderr[-2000:]}")
+            for linea in proc.stdout.splitlines():
+                if linea.startswith("ARRANQUE_MS"):
+                    tiempos.append(float(linea.split()[1]))
+                elif linea.startswith("RSS_KB"):
+                    memoria.append(int(linea.split()[1]))
+            # Solo módulos de primer nivel (sin sangría): su acumulado incluye a sus hijos
+            for m in LINEA_IMPORTTIME.finditer(proc.stderr):
+                todos.add(m.group(4))
+                if m.group(3) == " ":
+                    modulos.setdefault(m.group(4), []).append(int(m.group(2)))
+
+        self.stdout.write(f"Arranque (mediana de {len(tiempos)}): {statistics.median(tiempos):.0f} ms")
+        self.stdout.write(f"Memoria máxima (RSS):        {statistics.median(memoria) / 1024:.1f} MB")
+        self.stdout.write("\nMódulos más pesados (acumulado, mediana):")
+        pesados = sorted(((statistics.median(v), k) for k, v in modulos.items()), reverse=True)
+        for micros, nombre in pesados[:options['top']]:
+            self.stdout.write(f"  {micros / 1000:8.1f} ms  {nombre}")
+
+        cargados = {k for k in todos if k in ('weasyprint', 'docx', 'google.genai', 'markdown')}
+        if cargados and not options['con_documentos']:
+            self.stdout.write(self.style.WARNING(
+                f"\nAtención: el arranque importa librerías pesadas: {', '.join(sorted(cargados))}"
+            ))
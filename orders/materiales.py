@@ -0,0 +1,255 @@
+"""
+Catálogo de materiales y reporte de consumo.
+
+Cada línea de material de una orden (ServiceMaterial) se enlaza a un Material según
+su descripción normalizada (minúsculas, sin acentos ni signos, espacios colapsados):
+"Cable UTP cat-6" y "cable utp cat 6" son la misma pieza. Solo se enlaza por
+coincidencia exacta de esa clave; lo parecido no se junta solo, se sugiere mientras
+se captura (`sugerir`, trigramas de pg_trgm sobre material_clave_trgm) para que el
+ingeniero elija la descripción que ya existe.
+
+El reporte de consumo (`consumo_mensual`) sale de una sola consulta agrupada por mes
+y material. Cada mes se guarda en caché bajo dos versiones (ver `versiones`): la de su
+mes y cliente, que cambia cuando una línea de material o la fecha o el cliente de una
+orden tocan ese mes (señales aquí, `invalidar_meses`), y una general que cambia al
+editar el catálogo o en las cargas masivas (borrado, importacion y seed_data llaman a
+`invalidar`). Así los meses ya calculados y no tocados no se vuelven a consultar.
+Las órdenes sin fecha de servicio no entran al reporte.
+"""
+import hashlib
+import re
+import unicodedata
+from datetime import date
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import versiones
+from .models import Material, ServiceMaterial, ServiceOrder
+
+LARGO = Material._meta.get_field('clave').max_length
+_SIGNOS = re.compile(r'[\W_]+')
+
+CACHE_VERSION = 'materiales:version'
+DURACION_CACHE = 6 * 60 * 60
+# Menos de 3 letras no da trigramas útiles: se busca por prefijo
+MINIMO_TRIGRAMAS = 3
+
+
+def normalizar(texto):
+    """' Cable  UTP Cat-6 ' -> 'cable utp cat 6'. Cadena vacía si no hay texto."""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(_SIGNOS.sub(' ', texto.lower()).split())[:LARGO]
+
+
+def vincular(consumos):
+    """Asigna `material_id` a cada línea según su descripción, creando los materiales que falten. No las guarda."""
+    por_clave = {}
+    for c in consumos:
+        clave = normalizar(c.descripcion)
+        if clave:
+            por_clave.setdefault(clave, []).append(c)
+        else:
+            c.material_id = None
+    if not por_clave:
+        return
+
+    materiales = Material.objects.in_bulk(list(por_clave), field_name='clave')
+    nuevos = [Material(clave=clave, descripcion=grupo[0].descripcion.strip()[:LARGO])
+              for clave, grupo in por_clave.items() if clave not in materiales]
+    if nuevos:
+        # ignore_conflicts: otro proceso pudo dar de alta la misma pieza entretanto
+        Material.objects.bulk_create(nuevos, ignore_conflicts=True)
+        materiales.update(Material.objects.in_bulk([m.clave for m in nuevos], field_name='clave'))
+
+    for clave, grupo in por_clave.items():
+        for c in grupo:
+            c.material_id = materiales[clave].pk
+
+
+def sugerir(texto):
+    """Materiales del catálogo parecidos a `texto`, del más al menos parecido."""
+    clave = normalizar(texto)
+    if not clave:
+        return Material.objects.none()
+    if len(clave) < MINIMO_TRIGRAMAS:
+        return Material.objects.filter(clave__startswith=clave).order_by('clave')
+    # `clave % texto` (parecido completo, con errores de dedo) o `clave %> texto` (lo escrito es
+    # parte de la descripción): los dos usan el índice GIN; la similitud solo ordena lo que pasó
+    return (Material.objects.filter(Q(clave__trigram_similar=clave) | Q(clave__trigram_word_similar=clave))
+            .annotate(parecido=TrigramWordSimilarity(clave, 'clave'))
+            .order_by('-parecido', 'clave'))
+
+
+# ------------------------------------------------------------
+# Reporte de consumo por mes
+# ------------------------------------------------------------
+def _mes(d):
+    return date(d.year, d.month, 1)
+
+
+def sumar_meses(mes, n):
+    """Primer día del mes `n` meses después (o antes, si `n` es negativo) del de `mes`."""
+    anio, indice = divmod(mes.year * 12 + mes.month - 1 + n, 12)
+    return date(anio, indice + 1, 1)
+
+
+def meses(desde, hasta):
+    """Primer día de cada mes entre `desde` y `hasta` (incluidos)."""
+    mes, ultimo, lista = _mes(desde), _mes(hasta), []
+    while mes <= ultimo:
+        lista.append(mes)
+        mes = sumar_meses(mes, 1)
+    return lista
+
+
+def _filtro(cliente):
+    # Los nombres de cliente traen espacios y acentos: no sirven tal cual como clave de memcached
+    return hashlib.md5(cliente.encode()).hexdigest() if cliente else 'todos'
+
+
+def _version_mes(mes, cliente):
+    return f'{CACHE_VERSION}:{mes:%Y-%m}:{_filtro(cliente)}'
+
+
+def invalidar():
+    """Descarta todos los meses en caché al confirmarse la transacción."""
+    versiones.renovar(CACHE_VERSION)
+
+
+def invalidar_meses(pares):
+    """Descarta solo los meses de `pares` [(fecha_servicio, cliente_nombre), ...]: los de ese cliente y los de todos."""
+    claves = set()
+    for fecha, cliente in pares:
+        if fecha:
+            claves.update((_version_mes(_mes(fecha), cliente), _version_mes(_mes(fecha), '')))
+    if claves:
+        versiones.renovar(*claves)
+
+
+def _clave_mes(general, version, mes, cliente):
+    return f'materiales:{general}:{version}:{mes:%Y-%m}:{_filtro(cliente)}'
+
+
+def _consultar(desde, hasta, cliente):
+    """{mes: [(material_id, descripcion, sku, cantidad, ordenes), ...]} de [desde, hasta) en una consulta."""
+    qs = ServiceMaterial.objects.filter(
+        material__isnull=False, order__fecha_servicio__gte=desde, order__fecha_servicio__lt=hasta)
+    if cliente:
+        qs = qs.filter(order__cliente_nombre=cliente)
+    filas = (qs.annotate(mes=TruncMonth('order__fecha_servicio'))
+             .values('mes', 'material_id', 'material__descripcion', 'material__sku')
+             .annotate(cantidad=Sum('cantidad'), ordenes=Count('order_id', distinct=True))
+             .order_by())
+    por_mes = {}
+    for f in filas:
+        por_mes.setdefault(f['mes'], []).append(
+            (f['material_id'], f['material__descripcion'], f['material__sku'], f['cantidad'], f['ordenes']))
+    return por_mes
+
+
+def consumo_mensual(desde, hasta, cliente=''):
+    """
+    Consumo por material entre los meses de `desde` y `hasta`:
+    {'meses': [date...], 'filas': [{'material_id', 'descripcion', 'sku', 'por_mes', 'cantidad', 'ordenes'}]}
+    ordenado de mayor a menor cantidad. Solo se consultan los meses que no están en caché.
+    """
+    lista = meses(desde, hasta)
+    general = versiones.actual(CACHE_VERSION)
+    por_mes = versiones.actuales([_version_mes(mes, cliente) for mes in lista])
+    claves = {mes: _clave_mes(general, por_mes[_version_mes(mes, cliente)], mes, cliente) for mes in lista}
+    guardados = cache.get_many(list(claves.values()))
+    datos = {mes: guardados[clave] for mes, clave in claves.items() if clave in guardados}
+
+    faltan = [mes for mes in lista if mes not in datos]
+    if faltan:
+        nuevos = _consultar(faltan[0], sumar_meses(faltan[-1], 1), cliente)
+        nuevos = {mes: nuevos.get(mes, []) for mes in faltan}
+        cache.set_many({claves[mes]: filas for mes, filas in nuevos.items()}, DURACION_CACHE)
+        datos.update(nuevos)
+
+    filas, posicion = {}, {mes: i for i, mes in enumerate(lista)}
+    for mes in lista:
+        for material_id, descripcion, sku, cantidad, ordenes in datos[mes]:
+            fila = filas.setdefault(material_id, {
+                'material_id': material_id, 'descripcion': descripcion, 'sku': sku,
+                'por_mes': [0] * len(lista), 'cantidad': 0, 'ordenes': 0,
+            })
+            fila['por_mes'][posicion[mes]] = cantidad
+            fila['cantidad'] += cantidad
+            fila['ordenes'] += ordenes
+    return {
+        'meses': lista,
+        'filas': sorted(filas.values(), key=lambda f: (-f['cantidad'], f['descripcion'])),
+    }
+
+
+# ------------------------------------------------------------
+# Señales
+# ------------------------------------------------------------
+def _antes_de_guardar_consumo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        vincular([instance])
+
+
+def _consumo_de(order_id, orden=None):
+    """(fecha_servicio, cliente_nombre) de la orden, de la instancia si ya está cargada."""
+    if orden is not None:
+        return orden.fecha_servicio, orden.cliente_nombre
+    return ServiceOrder.objects.filter(pk=order_id).values_list('fecha_servicio', 'cliente_nombre').first()
+
+
+def _al_cambiar_consumo(sender, instance, raw=False, **kwargs):
+    if raw:
+        invalidar()
+        return
+    orden = instance.order if ServiceMaterial.order.is_cached(instance) else None
+    par = _consumo_de(instance.order_id, orden)
+    if par:
+        invalidar_meses([par])
+
+
+def _antes_de_guardar_orden(sender, instance, raw=False, update_fields=None, **kwargs):
+    # La fecha y el cliente deciden en qué mes y filtro cae el consumo: se guardan los de antes
+    instance._consumo_antes = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not {'fecha_servicio', 'cliente_nombre'} & set(update_fields):
+        return
+    instance._consumo_antes = _consumo_de(instance.pk)
+
+
+def _al_guardar_orden(sender, instance, raw=False, **kwargs):
+    if raw:
+        invalidar()
+        return
+    antes = getattr(instance, '_consumo_antes', None)
+    ahora = (instance.fecha_servicio, instance.cliente_nombre)
+    # Una orden nueva aún no tiene materiales; si no cambió ni fecha ni cliente, su consumo sigue en su lugar
+    if antes and tuple(antes) != ahora:
+        invalidar_meses([antes, ahora])
+
+
+def _al_borrar_orden(sender, instance, **kwargs):
+    invalidar_meses([(instance.fecha_servicio, instance.cliente_nombre)])
+
+
+def _al_cambiar_material(sender, **kwargs):
+    # Descripción o SKU del catálogo: salen en todos los meses
+    invalidar()
+
+
+pre_save.connect(_antes_de_guardar_consumo, sender=ServiceMaterial)
+post_save.connect(_al_cambiar_consumo, sender=ServiceMaterial, dispatch_uid='materiales_ServiceMaterial_save')
+post_delete.connect(_al_cambiar_consumo, sender=ServiceMaterial, dispatch_uid='materiales_ServiceMaterial_delete')
+pre_save.connect(_antes_de_guardar_orden, sender=ServiceOrder, dispatch_uid='materiales_ServiceOrder_pre_save')
+post_save.connect(_al_guardar_orden, sender=ServiceOrder, dispatch_uid='materiales_ServiceOrder_save')
+post_delete.connect(_al_borrar_orden, sender=ServiceOrder, dispatch_uid='materiales_ServiceOrder_delete')
+post_save.connect(_al_cambiar_material, sender=Material, dispatch_uid='materiales_Material_save')
+post_delete.connect(_al_cambiar_material, sender=Material, dispatch_uid='materiales_Material_delete')
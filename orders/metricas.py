@@ -0,0 +1,178 @@
+"""
+Métricas por petición: tiempo total, consultas SQL y tiempo en librerías pesadas
+(WeasyPrint, python-docx, Pillow, Gemini). Las llena MetricasMiddleware y se
+consultan en /metricas/ (HTML) y /metricas/prometheus/ (texto Prometheus).
+
+Los acumulados son por proceso: con varios workers de gunicorn cada uno reporta lo suyo.
+"""
+import threading
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+# Componentes que se miden aparte del tiempo de base de datos
+COMPONENTES = ('weasyprint', 'docx', 'pillow', 'gemini')
+
+# Límites (segundos) del histograma de latencia para Prometheus
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_actual = ContextVar('metricas_peticion', default=None)
+_lock = threading.Lock()
+_acumulado = {}
+
+
+class MetricasPeticion:
+    """Lo medido durante una sola petición."""
+
+    def __init__(self, guardar_sql=True):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.componentes = {}
+        self.guardar_sql = guardar_sql
+        self.sql = []
+
+    def agregar(self, componente, segundos):
+        self.componentes[componente] = self.componentes.get(componente, 0.0) + segundos
+
+    def registrar_sql(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.tiempo_db += duracion
+            # Se guarda un número acotado para el log de peticiones lentas
+            if self.guardar_sql and len(self.sql) < 200:
+                self.sql.append((duracion, sql))
+
+
+def iniciar(guardar_sql=True):
+    metricas = MetricasPeticion(guardar_sql)
+    token = _actual.set(metricas)
+    return metricas, token
+
+
+def reanudar(metricas):
+    """Vuelve a hacer actual una medición ya iniciada (cuerpo de una respuesta en streaming)."""
+    return _actual.set(metricas)
+
+
+def terminar(token):
+    _actual.reset(token)
+
+
+def registrar(componente, segundos):
+    """Suma tiempo de un componente a la petición en curso (si la hay)."""
+    metricas = _actual.get()
+    if metricas is not None:
+        metricas.agregar(componente, segundos)
+
+
+class medir(ContextDecorator):
+    """Mide un bloque o función: `with medir('weasyprint'): ...` o `@medir('docx')`."""
+
+    def __init__(self, componente):
+        self.componente = componente
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registrar(self.componente, time.perf_counter() - self._inicio)
+        return False
+
+
+# ------------------------------------------------------------
+# Acumulados por vista
+# ------------------------------------------------------------
+def acumular(vista, duracion, metricas, status):
+    with _lock:
+        datos = _acumulado.setdefault(vista, {
+            'peticiones': 0, 'errores': 0, 'tiempo_total': 0.0, 'tiempo_max': 0.0,
+            'consultas': 0, 'tiempo_db': 0.0,
+            'componentes': {c: 0.0 for c in COMPONENTES},
+            'buckets': [0] * len(BUCKETS),
+        })
+        datos['peticiones'] += 1
+        if status >= 500:
+            datos['errores'] += 1
+        datos['tiempo_total'] += duracion
+        datos['tiempo_max'] = max(datos['tiempo_max'], duracion)
+        datos['consultas'] += metricas.consultas
+        datos['tiempo_db'] += metricas.tiempo_db
+        for componente, segundos in metricas.componentes.items():
+            datos['componentes'][componente] = datos['componentes'].get(componente, 0.0) + segundos
+        for i, limite in enumerate(BUCKETS):
+            if duracion <= limite:
+                datos['buckets'][i] += 1
+
+
+def resumen():
+    """Copia de los acumulados, ordenada por tiempo total descendente."""
+    with _lock:
+        filas = []
+        for vista, d in _acumulado.items():
+            n = d['peticiones'] or 1
+            filas.append({
+                'vista': vista,
+                'peticiones': d['peticiones'],
+                'errores': d['errores'],
+                'promedio_ms': d['tiempo_total'] / n * 1000,
+                'max_ms': d['tiempo_max'] * 1000,
+                'consultas_promedio': d['consultas'] / n,
+                'db_promedio_ms': d['tiempo_db'] / n * 1000,
+                # Mismo orden que COMPONENTES (para pintar columnas)
+                'componentes_ms': [d['componentes'].get(c, 0.0) / n * 1000 for c in COMPONENTES],
+                'tiempo_total': d['tiempo_total'],
+            })
+    return sorted(filas, key=lambda f: f['tiempo_total'], reverse=True)
+
+
+def reiniciar():
+    with _lock:
+        _acumulado.clear()
+
+
+def prometheus():
+    """Acumulados en formato de exposición de texto de Prometheus."""
+    lineas = [
+        "# HELP serviciotech_request_seconds Tiempo de respuesta por vista.",
+        "# TYPE serviciotech_request_seconds histogram",
+    ]
+    with _lock:
+        datos = {vista: dict(d, componentes=dict(d['componentes']), buckets=list(d['buckets']))
+                 for vista, d in _acumulado.items()}
+
+    for vista, d in sorted(datos.items()):
+        for limite, cuenta in zip(BUCKETS, d['buckets']):
+            lineas.append(f'serviciotech_request_seconds_bucket{{view="{vista}",le="{limite}"}} {cuenta}')
+        lineas.append(f'serviciotech_request_seconds_bucket{{view="{vista}",le="+Inf"}} {d["peticiones"]}')
+        lineas.append(f'serviciotech_request_seconds_sum{{view="{vista}"}} {d["tiempo_total"]:.6f}')
+        lineas.append(f'serviciotech_request_seconds_count{{view="{vista}"}} {d["peticiones"]}')
+
+    lineas += ["# HELP serviciotech_request_errors_total Respuestas 5xx por vista.",
+               "# TYPE serviciotech_request_errors_total counter"]
+    for vista, d in sorted(datos.items()):
+        lineas.append(f'serviciotech_request_errors_total{{view="{vista}"}} {d["errores"]}')
+
+    lineas += ["# HELP serviciotech_db_queries_total Consultas SQL por vista.",
+               "# TYPE serviciotech_db_queries_total counter"]
+    for vista, d in sorted(datos.items()):
+        lineas.append(f'serviciotech_db_queries_total{{view="{vista}"}} {d["consultas"]}')
+
+    lineas += ["# HELP serviciotech_db_seconds_total Tiempo en base de datos por vista.",
+               "# TYPE serviciotech_db_seconds_total counter"]
+    for vista, d in sorted(datos.items()):
+        lineas.append(f'serviciotech_db_seconds_total{{view="{vista}"}} {d["tiempo_db"]:.6f}')
+
+    lineas += ["# HELP serviciotech_component_seconds_total Tiempo en librerías pesadas por vista.",
+               "# TYPE serviciotech_component_seconds_total counter"]
+    for vista, d in sorted(datos.items()):
+        for componente, segundos in sorted(d['componentes'].items()):
+            lineas.append(
+                f'serviciotech_component_seconds_total{{view="{vista}",component="{componente}"}} {segundos:.6f}'
+            )
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,85 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse
+
+from . import metricas
+
+logger = logging.getLogger('orders.lento')
+
+
+class MetricasMiddleware:
+    """
+    Mide cada petición (tiempo total, consultas SQL y tiempo en WeasyPrint/docx/Pillow/Gemini),
+    lo expone en la cabecera Server-Timing, lo acumula por vista y deja en el log
+    las peticiones que pasan de SLOW_REQUEST_MS junto con su SQL.
+
+    Las respuestas en streaming (exportaciones CSV/XLSX, descargas de respaldos) consultan
+    mientras se envía el cuerpo: se siguen midiendo al iterarlo y se acumulan al terminar.
+    Su Server-Timing, que sale antes del cuerpo, solo cubre hasta que la vista regresó.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.umbral = getattr(settings, 'SLOW_REQUEST_MS', 1000) / 1000
+
+    def __call__(self, request):
+        datos, token = metricas.iniciar()
+        try:
+            with connection.execute_wrapper(datos.registrar_sql):
+                response = self.get_response(request)
+        finally:
+            metricas.terminar(token)
+
+        duracion = time.perf_counter() - datos.inicio
+        partes = [f'total;dur={duracion * 1000:.1f}',
+                  f'db;dur={datos.tiempo_db * 1000:.1f};desc="{datos.consultas} consultas"']
+        partes += [f'{c};dur={s * 1000:.1f}' for c, s in datos.componentes.items()]
+        response['Server-Timing'] = ', '.join(partes)
+
+        # FileResponse solo lee un archivo (y reemplazar su contenido le quita wsgi.file_wrapper)
+        if response.streaming and not response.is_async and not isinstance(response, FileResponse):
+            response.streaming_content = self.medir_cuerpo(response.streaming_content, datos, request, response)
+        else:
+            self.registrar(request, response, datos)
+        return response
+
+    def medir_cuerpo(self, contenido, datos, request, response):
+        """Itera el cuerpo midiendo SQL y componentes en cada trozo; registra al terminar o al cerrarse."""
+        iterador = iter(contenido)
+        try:
+            while True:
+                # El servidor pide cada trozo por separado: la medición se reactiva solo mientras se genera
+                token = metricas.reanudar(datos)
+                try:
+                    with connection.execute_wrapper(datos.registrar_sql):
+                        trozo = next(iterador, None)
+                finally:
+                    metricas.terminar(token)
+                if trozo is None:
+                    return
+                yield trozo
+        finally:
+            if hasattr(iterador, 'close'):
+                iterador.close()
+            self.registrar(request, response, datos)
+
+    def registrar(self, request, response, datos):
+        duracion = time.perf_counter() - datos.inicio
+        match = request.resolver_match
+        vista = match.view_name if match else 'sin_ruta'
+        metricas.acumular(vista, duracion, datos, response.status_code)
+        if duracion >= self.umbral:
+            self.log_lento(request, vista, duracion, datos)
+
+    def log_lento(self, request, vista, duracion, datos):
+        lentas = sorted(datos.sql, key=lambda q: q[0], reverse=True)[:20]
+        detalle_sql = "\n".join(f"  {d * 1000:8.1f} ms  {sql}" for d, sql in lentas)
+        componentes = ", ".join(f"{c}={s * 1000:.0f}ms" for c, s in datos.componentes.items()) or "-"
+        logger.warning(
+            "Petición lenta %s %s (%s): %.0f ms | %d consultas, %.0f ms en BD | %s\n%s",
+            request.method, request.get_full_path(), vista, duracion * 1000,
+            datos.consultas, datos.tiempo_db * 1000, componentes, detalle_sql,
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_alter_servicematerial_descripcion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceorder',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
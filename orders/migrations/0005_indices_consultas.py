@@ -0,0 +1,45 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:05
+
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no bloquea escrituras, pero no puede ir en una transacción
+    atomic = False
+
+    dependencies = [
+        ('orders', '0004_serviceorder_version'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='serviceorder',
+            index=models.Index(fields=['-creado'], name='orden_creado_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='serviceorder',
+            index=models.Index(fields=['estatus', '-creado'], name='orden_estatus_creado_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='serviceorder',
+            index=models.Index(fields=['estatus', '-fecha_servicio'], name='orden_estatus_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='serviceorder',
+            index=models.Index(fields=['cliente_nombre'], name='orden_cliente_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='serviceorder',
+            index=models.Index(fields=['ingeniero_nombre'], name='orden_ingeniero_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='serviceorder',
+            index=models.Index(django.db.models.functions.text.Upper('cliente_nombre'), name='orden_cliente_upper_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='technicalmemory',
+            index=models.Index(django.db.models.functions.text.Upper('cliente_nombre'), models.OrderBy(models.F('creado'), descending=True), name='memoria_cliente_creado_idx'),
+        ),
+    ]
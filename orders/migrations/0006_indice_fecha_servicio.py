@@ -0,0 +1,19 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:07
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('orders', '0005_indices_consultas'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='serviceorder',
+            index=models.Index(fields=['-fecha_servicio', '-creado'], name='orden_fecha_servicio_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:27
+
+import orders.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_indice_fecha_servicio'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='engineerprofile',
+            name='firma',
+            field=models.ImageField(blank=True, null=True, storage=orders.almacenamiento.almacenamiento, upload_to='engineer_signatures/'),
+        ),
+        migrations.AlterField(
+            model_name='serviceevidence',
+            name='archivo',
+            field=models.FileField(storage=orders.almacenamiento.almacenamiento, upload_to='evidencias/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='serviceorder',
+            name='firma',
+            field=models.ImageField(blank=True, null=True, storage=orders.almacenamiento.almacenamiento, upload_to='signatures/'),
+        ),
+    ]
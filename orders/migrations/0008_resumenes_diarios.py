@@ -0,0 +1,83 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:42
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Copia de orders.resumenes tal como estaba en esta migración: si el módulo cambia,
+# la migración tiene que seguir calculando lo mismo
+CAMPOS = ('fecha_servicio', 'creado', 'estatus', 'tipos_servicio', 'ingeniero_nombre',
+          'cliente_nombre', 'horas', 'costo_mxn')
+LARGO_VALOR = 200
+
+
+def aportes(valores):
+    """Claves (fecha, dimensión, valor) a las que suma una orden."""
+    if valores['fecha_servicio']:
+        dia = valores['fecha_servicio']
+    else:
+        dia = timezone.localdate(valores['creado']) if valores['creado'] else timezone.localdate()
+    # Aquí tipos_servicio todavía es JSON: solo cuenta si es una lista
+    tipos = valores['tipos_servicio'] if isinstance(valores['tipos_servicio'], list) else []
+    claves = [
+        (dia, 'total', ''),
+        (dia, 'estatus', valores['estatus'] or ''),
+        (dia, 'ingeniero', (valores['ingeniero_nombre'] or '').strip()[:LARGO_VALOR]),
+        (dia, 'cliente', (valores['cliente_nombre'] or '').strip()[:LARGO_VALOR]),
+    ]
+    claves += [(dia, 'tipo', str(tipo)[:LARGO_VALOR]) for tipo in dict.fromkeys(tipos)]
+    return claves
+
+
+def acumular(filas):
+    """{clave: [ordenes, horas, costo]} de todas las órdenes."""
+    deltas = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for valores in filas:
+        horas = Decimal(valores['horas'] or 0)
+        costo = Decimal(valores['costo_mxn'] or 0)
+        for clave in aportes(valores):
+            d = deltas[clave]
+            d[0] += 1
+            d[1] += horas
+            d[2] += costo
+    return deltas
+
+
+def calcular_resumenes(apps, schema_editor):
+    ServiceOrder = apps.get_model('orders', 'ServiceOrder')
+    ResumenDiario = apps.get_model('orders', 'ResumenDiario')
+    deltas = acumular(ServiceOrder.objects.values(*CAMPOS).iterator(chunk_size=5000))
+    ResumenDiario.objects.bulk_create(
+        [ResumenDiario(fecha=f, dimension=d, valor=v, ordenes=n, horas=h, costo_mxn=c)
+         for (f, d, v), (n, h, c) in deltas.items() if n > 0],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_almacenamiento_por_contenido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('estatus', 'Estatus'), ('tipo', 'Tipo de servicio'), ('ingeniero', 'Ingeniero'), ('cliente', 'Cliente')], max_length=20)),
+                ('valor', models.CharField(blank=True, max_length=200)),
+                ('ordenes', models.IntegerField(default=0)),
+                ('horas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('costo_mxn', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'fecha'], name='resumen_dimension_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'dimension', 'valor'), name='resumen_dia_dimension_valor_uniq')],
+            },
+        ),
+        migrations.RunPython(calcular_resumenes, migrations.RunPython.noop),
+    ]
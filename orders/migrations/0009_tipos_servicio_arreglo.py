@@ -0,0 +1,50 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:46
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+SERVICE_TYPES = [
+    ('instalacion', 'Instalación'), ('configuracion', 'Configuración'), ('mantenimiento', 'Mantenimiento'),
+    ('garantia', 'Garantía'), ('revision', 'Falla/Revisión'), ('capacitacion', 'Capacitación'),
+]
+
+# jsonb -> varchar[]: PostgreSQL no acepta subconsultas en ALTER COLUMN ... USING, así que
+# se copia a una columna nueva. NULL, '[]' o cualquier cosa que no sea lista quedan en '{}'.
+JSON_A_ARREGLO = """
+    UPDATE orders_serviceorder SET tipos = CASE
+        WHEN jsonb_typeof(tipos_servicio) = 'array'
+        THEN ARRAY(SELECT left(t, 20) FROM jsonb_array_elements_text(tipos_servicio) AS t)::varchar(20)[]
+        ELSE '{}'
+    END
+"""
+ARREGLO_A_JSON = "UPDATE orders_serviceorder SET tipos_servicio = to_jsonb(tipos)"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceorder',
+            name='tipos',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(choices=SERVICE_TYPES, max_length=20), blank=True, default=list, size=None),
+        ),
+        migrations.RunSQL(JSON_A_ARREGLO, ARREGLO_A_JSON),
+        migrations.RemoveField(
+            model_name='serviceorder',
+            name='tipos_servicio',
+        ),
+        migrations.RenameField(
+            model_name='serviceorder',
+            old_name='tipos',
+            new_name='tipos_servicio',
+        ),
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tipos_servicio'], name='orden_tipos_servicio_gin'),
+        ),
+    ]
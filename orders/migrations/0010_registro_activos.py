@@ -0,0 +1,76 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:52
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia de orders.activos.normalizar tal como estaba en esta migración
+LARGO = 100
+_SEPARADORES = re.compile(r'[\W_]+')
+
+
+def normalizar(serie):
+    """' sn-ab 12.34 ' -> 'SNAB1234'. Cadena vacía si no hay serie."""
+    if not serie:
+        return ''
+    return _SEPARADORES.sub('', unicodedata.normalize('NFKC', serie)).upper()[:LARGO]
+
+
+def registrar_activos(apps, schema_editor):
+    # Un activo por serie normalizada; marca, modelo y cliente de la captura más reciente
+    Equipment = apps.get_model('orders', 'Equipment')
+    Asset = apps.get_model('orders', 'Asset')
+    activos, equipos = {}, {}
+    filas = (Equipment.objects.exclude(serie='').order_by('order__creado', 'pk')
+             .values_list('pk', 'serie', 'marca', 'modelo', 'order__cliente_nombre').iterator(chunk_size=5000))
+    for pk, serie, marca, modelo, cliente in filas:
+        clave = normalizar(serie)
+        if not clave:
+            continue
+        datos = activos.setdefault(clave, {'serie': serie.strip(), 'marca': '', 'modelo': '', 'cliente_nombre': ''})
+        for campo, valor in (('marca', marca), ('modelo', modelo), ('cliente_nombre', cliente)):
+            if valor and valor.strip():
+                datos[campo] = valor.strip()
+        equipos.setdefault(clave, []).append(pk)
+
+    Asset.objects.bulk_create([Asset(serie_normalizada=clave, **datos) for clave, datos in activos.items()],
+                              batch_size=2000)
+    ids = dict(Asset.objects.values_list('serie_normalizada', 'pk'))
+    Equipment.objects.bulk_update(
+        [Equipment(pk=pk, asset_id=ids[clave]) for clave, pks in equipos.items() for pk in pks],
+        ['asset'], batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_tipos_servicio_arreglo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Asset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(max_length=100, verbose_name='Serie')),
+                ('serie_normalizada', models.CharField(editable=False, max_length=100, unique=True)),
+                ('marca', models.CharField(blank=True, max_length=100, verbose_name='Marca')),
+                ('modelo', models.CharField(blank=True, max_length=100, verbose_name='Modelo')),
+                ('cliente_nombre', models.CharField(blank=True, max_length=200, verbose_name='Último cliente')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['serie_normalizada'], name='activo_serie_prefijo_idx', opclasses=['varchar_pattern_ops'])],
+            },
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='asset',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='equipos', to='orders.asset'),
+        ),
+        migrations.RunPython(registrar_activos, migrations.RunPython.noop),
+    ]
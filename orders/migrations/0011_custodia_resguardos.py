@@ -0,0 +1,38 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_registro_activos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shelterequipment',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='shelterequipment',
+            name='estado',
+            field=models.CharField(choices=[('en_resguardo', 'En resguardo'), ('devuelto', 'Devuelto')], default='en_resguardo', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='shelterequipment',
+            name='fecha_devolucion',
+            field=models.DateField(blank=True, null=True, verbose_name='Fecha de devolución'),
+        ),
+        migrations.AddField(
+            model_name='shelterequipment',
+            name='orden_devolucion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='devoluciones', to='orders.serviceorder', verbose_name='Orden de devolución'),
+        ),
+        migrations.AddIndex(
+            model_name='shelterequipment',
+            index=models.Index(condition=models.Q(('estado', 'en_resguardo')), fields=['order'], name='resguardo_abierto_idx'),
+        ),
+    ]
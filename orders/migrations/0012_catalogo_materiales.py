@@ -0,0 +1,77 @@
+# Generated by Django 5.1.14 on 2026-10-19 14:58
+
+import re
+import unicodedata
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Copia de orders.materiales.normalizar tal como estaba en esta migración
+LARGO = 200
+_SIGNOS = re.compile(r'[\W_]+')
+
+
+def normalizar(texto):
+    """' Cable  UTP Cat-6 ' -> 'cable utp cat 6'. Cadena vacía si no hay texto."""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(_SIGNOS.sub(' ', texto.lower()).split())[:LARGO]
+
+
+def catalogar_materiales(apps, schema_editor):
+    # Un material por descripción normalizada, con la descripción de la primera vez que se capturó
+    ServiceMaterial = apps.get_model('orders', 'ServiceMaterial')
+    Material = apps.get_model('orders', 'Material')
+    materiales, consumos = {}, {}
+    filas = (ServiceMaterial.objects.order_by('order__creado', 'pk')
+             .values_list('pk', 'descripcion').iterator(chunk_size=5000))
+    for pk, descripcion in filas:
+        clave = normalizar(descripcion)
+        if not clave:
+            continue
+        materiales.setdefault(clave, descripcion.strip())
+        consumos.setdefault(clave, []).append(pk)
+
+    Material.objects.bulk_create([Material(clave=clave, descripcion=descripcion)
+                                  for clave, descripcion in materiales.items()], batch_size=2000)
+    ids = dict(Material.objects.values_list('clave', 'pk'))
+    ServiceMaterial.objects.bulk_update(
+        [ServiceMaterial(pk=pk, material_id=ids[clave]) for clave, pks in consumos.items() for pk in pks],
+        ['material'], batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_custodia_resguardos'),
+    ]
+
+    operations = [
+        # gin_trgm_ops (índice material_clave_trgm); pg_trgm es "trusted" desde PostgreSQL 13
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='Material',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(editable=False, max_length=200, unique=True)),
+                ('descripcion', models.CharField(max_length=200, verbose_name='Descripción')),
+                ('sku', models.CharField(blank=True, max_length=50, verbose_name='SKU')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['clave'], name='material_clave_trgm', opclasses=['gin_trgm_ops'])],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('sku', ''), _negated=True), fields=('sku',), name='material_sku_uniq')],
+            },
+        ),
+        migrations.AddField(
+            model_name='servicematerial',
+            name='material',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='consumos', to='orders.material'),
+        ),
+        migrations.RunPython(catalogar_materiales, migrations.RunPython.noop),
+    ]
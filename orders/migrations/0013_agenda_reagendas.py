@@ -0,0 +1,19 @@
+# Generated by Django 5.1.14 on 2026-10-19 15:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_catalogo_materiales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='serviceorder',
+            index=models.Index(condition=models.Q(('reagenda', True)), fields=['reagenda_fecha', 'ingeniero_nombre'], name='orden_reagenda_idx'),
+        ),
+    ]
@@ -1,4 +1,7 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.contrib.auth.models import User
 import uuid
@@ -7,6 +10,8 @@ from PIL import Image
 from io import BytesIO
 import os
 from django.core.files.base import ContentFile
+from .metricas import medir
+from .almacenamiento import almacenamiento
 
 SERVICE_TYPES = [
     ("instalacion", "Instalación"),
@@ -21,7 +26,7 @@ SERVICE_TYPES = [
 class EngineerProfile(models.Model):
     # CORRECCIÓN: Usamos CASCADE. Si se borra el usuario, se borra el perfil.
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
-    firma = models.ImageField(upload_to="engineer_signatures/", null=True, blank=True)
+    firma = models.ImageField(upload_to="engineer_signatures/", storage=almacenamiento, null=True, blank=True)
 
     def __str__(self):
         return f"Perfil de {self.user.username}"
@@ -60,7 +65,11 @@ class ServiceOrder(models.Model):
     )
     # --------------------------------------------
 
-    tipos_servicio = models.JSONField(default=list, blank=True, null=True)
+    # Arreglo nativo (varchar[]) con índice GIN: `tipos_servicio__contains=['garantia']`
+    # y `__overlap` se resuelven con el índice en vez de recorrer JSON
+    tipos_servicio = ArrayField(
+        models.CharField(max_length=20, choices=SERVICE_TYPES), default=list, blank=True,
+    )
     tipo_servicio_otro = models.CharField(max_length=200, blank=True, null=True)
 
     # Ingeniero (Nombre texto)
@@ -85,7 +94,7 @@ class ServiceOrder(models.Model):
     reagenda_motivo = models.TextField(blank=True)
 
     # Firmas y Estado
-    firma = models.ImageField(upload_to="signatures/", null=True, blank=True)
+    firma = models.ImageField(upload_to="signatures/", storage=almacenamiento, null=True, blank=True)
     indicaciones_especiales = models.TextField(blank=True, help_text="Indicaciones internas. No se imprime.")
     
     estatus = models.CharField(max_length=20, choices=STATUS_CHOICES, default='borrador')
@@ -94,8 +103,14 @@ class ServiceOrder(models.Model):
     actualizado = models.DateTimeField(auto_now=True)
     email_enviado = models.BooleanField(default=False)
 
+    # Control de concurrencia optimista: se incrementa en cada guardado completo
+    version = models.PositiveIntegerField(default=0, editable=False)
+
     # Métodos auxiliares
     def save(self, *args, **kwargs):
+        # Los guardados parciales (ej. email_enviado) no cuentan como edición
+        if kwargs.get('update_fields') is None:
+            self.version = (self.version or 0) + 1
         if not self.folio:
             today = timezone.now().strftime("%Y%m%d")
             prefix = f"OS-{today}"
@@ -114,6 +129,34 @@ class ServiceOrder(models.Model):
             self.folio = f"{prefix}-{initial}{new_num:03d}"
         super().save(*args, **kwargs)
 
+    class Meta:
+        # Índices según las consultas reales de las vistas (ver manage.py explain_queries)
+        indexes = [
+            # order_list / dashboard: orden por -creado y rangos de fecha de creación
+            models.Index(fields=['-creado'], name='orden_creado_idx'),
+            # dashboard (conteos por estatus) y filtros de order_list por estatus
+            models.Index(fields=['estatus', '-creado'], name='orden_estatus_creado_idx'),
+            # order_list filtrando/ordenando por fecha de servicio (rango de fechas)
+            models.Index(fields=['-fecha_servicio', '-creado'], name='orden_fecha_servicio_idx'),
+            # memory_selection: finalizadas ordenadas por -fecha_servicio
+            models.Index(fields=['estatus', '-fecha_servicio'], name='orden_estatus_fecha_idx'),
+            # Filtro exacto por empresa y lista de empresas/ingenieros para los selects
+            models.Index(fields=['cliente_nombre'], name='orden_cliente_idx'),
+            models.Index(fields=['ingeniero_nombre'], name='orden_ingeniero_idx'),
+            # Búsquedas sin distinguir mayúsculas (Django traduce iexact a UPPER(...))
+            models.Index(Upper('cliente_nombre'), name='orden_cliente_upper_idx'),
+            # Filtro de order_list y reportes por tipo de servicio (@> / &&)
+            GinIndex(fields=['tipos_servicio'], name='orden_tipos_servicio_gin'),
+            # agenda: visitas reagendadas por semana e ingeniero (solo las marcadas como reagenda)
+            models.Index(fields=['reagenda_fecha', 'ingeniero_nombre'], condition=models.Q(reagenda=True),
+                         name='orden_reagenda_idx'),
+        ]
+
+    @property
+    def etag(self):
+        """ETag fuerte de la versión actual (para If-Match / If-None-Match)."""
+        return f'"{self.pk}-{self.version}"'
+
     @property
     def tipos_servicio_labels(self):
         mapa = dict(SERVICE_TYPES)
@@ -123,6 +166,51 @@ class ServiceOrder(models.Model):
         return f"{self.folio} - {self.cliente_nombre}"
 
 
+# --- REGISTRO DE ACTIVOS (equipos del cliente por número de serie, ver orders/activos.py) ---
+
+class Asset(models.Model):
+    """Un equipo físico: todas las filas de Equipment con la misma serie normalizada."""
+    serie = models.CharField("Serie", max_length=100)  # como se capturó la primera vez
+    serie_normalizada = models.CharField(max_length=100, unique=True, editable=False)
+    marca = models.CharField("Marca", max_length=100, blank=True)
+    modelo = models.CharField("Modelo", max_length=100, blank=True)
+    cliente_nombre = models.CharField("Último cliente", max_length=200, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Autocompletado por prefijo (LIKE 'ABC%'): el índice del unique no sirve con collation no-C
+            models.Index(fields=['serie_normalizada'], name='activo_serie_prefijo_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return f"{self.serie} ({self.marca} {self.modelo})".strip()
+
+
+# --- CATÁLOGO DE MATERIALES (ver orders/materiales.py) ---
+
+class Material(models.Model):
+    """Una pieza del catálogo: todas las líneas de material cuya descripción normalizada coincide."""
+    clave = models.CharField(max_length=200, unique=True, editable=False)  # descripción normalizada
+    descripcion = models.CharField("Descripción", max_length=200)  # como se capturó la primera vez
+    sku = models.CharField("SKU", max_length=50, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sku'], condition=~models.Q(sku=''), name='material_sku_uniq'),
+        ]
+        indexes = [
+            # Sugerencias mientras se captura (operadores % y %> de pg_trgm)
+            GinIndex(fields=['clave'], opclasses=['gin_trgm_ops'], name='material_clave_trgm'),
+        ]
+
+    def __str__(self):
+        return f"{self.sku} {self.descripcion}".strip()
+
+
 # --- TABLAS RELACIONADAS ---
 
 class Equipment(models.Model): 
@@ -131,42 +219,70 @@ class Equipment(models.Model):
     modelo = models.CharField("Modelo", max_length=100, blank=True)
     serie = models.CharField("Serie", max_length=100, blank=True)
     descripcion = models.TextField("Descripción", blank=True)
+    # Se asigna solo a partir de la serie (activos.vincular); no va en los formularios
+    asset = models.ForeignKey(Asset, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                              related_name="equipos")
 
 class ServiceMaterial(models.Model): 
     order = models.ForeignKey(ServiceOrder, on_delete=models.CASCADE, related_name="materiales")
     cantidad = models.PositiveIntegerField(default=1)
     descripcion = models.CharField(max_length=200)
     comentarios = models.CharField(max_length=200, blank=True)
+    # Se asigna solo a partir de la descripción (materiales.vincular); no va en los formularios
+    material = models.ForeignKey(Material, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                 related_name="consumos")
 
 class ShelterEquipment(models.Model):
+    ESTADOS = [
+        ('en_resguardo', 'En resguardo'),
+        ('devuelto', 'Devuelto'),
+    ]
+
     order = models.ForeignKey(ServiceOrder, on_delete=models.CASCADE, related_name="resguardos")
     cantidad = models.PositiveIntegerField(default=1, null=True, blank=True)
     descripcion = models.CharField(max_length=200, blank=True)
     comentarios = models.CharField(max_length=200, blank=True)
 
+    # Custodia: se abre con la orden que lo recibe y se cierra al devolverlo al cliente
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='en_resguardo')
+    fecha_devolucion = models.DateField("Fecha de devolución", null=True, blank=True)
+    orden_devolucion = models.ForeignKey(
+        ServiceOrder, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="devoluciones", verbose_name="Orden de devolución",
+    )
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # equipos_en_resguardo: solo los abiertos (una fracción pequeña de la tabla)
+            models.Index(fields=['order'], condition=models.Q(estado='en_resguardo'),
+                         name='resguardo_abierto_idx'),
+        ]
+
     def __str__(self):
         return f"Resguardo: {self.descripcion}"
 
 class ServiceEvidence(models.Model):
     order = models.ForeignKey(ServiceOrder, on_delete=models.CASCADE, related_name="evidencias")
-    archivo = models.FileField(upload_to="evidencias/%Y/%m/")
+    archivo = models.FileField(upload_to="evidencias/%Y/%m/", storage=almacenamiento)
     comentario = models.CharField(max_length=255, blank=True)
     creado = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
         if self.archivo and not self.pk:
             try:
-                img = Image.open(self.archivo)
-                if img.height > 1080 or img.width > 1920:
-                    output_size = (1920, 1080)
-                    img.thumbnail(output_size)
-                
-                buffer = BytesIO()
-                if img.mode in ("RGBA", "P"): 
-                    img = img.convert("RGB")
-                
-                img.save(buffer, format='JPEG', quality=70, optimize=True)
-                buffer.seek(0)
+                with medir('pillow'):
+                    img = Image.open(self.archivo)
+                    if img.height > 1080 or img.width > 1920:
+                        output_size = (1920, 1080)
+                        img.thumbnail(output_size)
+
+                    buffer = BytesIO()
+                    if img.mode in ("RGBA", "P"):
+                        img = img.convert("RGB")
+
+                    img.save(buffer, format='JPEG', quality=70, optimize=True)
+                    buffer.seek(0)
                 
                 nombre_archivo = os.path.splitext(self.archivo.name)[0] + ".jpg"
                 self.archivo = ContentFile(buffer.read(), name=nombre_archivo)
@@ -192,5 +308,42 @@ class TechnicalMemory(models.Model):
     creado_por = models.ForeignKey(User, on_delete=models.CASCADE)
     creado = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Historial de memory_preview: cliente_nombre__iexact ordenado por -creado
+            models.Index(Upper('cliente_nombre'), models.F('creado').desc(), name='memoria_cliente_creado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Memoria {self.cliente_nombre} - {self.creado.date()}"
+
+# --- RESÚMENES DIARIOS (tendencias del dashboard, ver orders/resumenes.py) ---
+
+class ResumenDiario(models.Model):
+    """Órdenes, horas y costo por día y por dimensión. Se mantiene al guardar/borrar órdenes."""
+    DIMENSIONES = [
+        ('total', 'Total'),
+        ('estatus', 'Estatus'),
+        ('tipo', 'Tipo de servicio'),
+        ('ingeniero', 'Ingeniero'),
+        ('cliente', 'Cliente'),
+    ]
+
+    fecha = models.DateField()
+    dimension = models.CharField(max_length=20, choices=DIMENSIONES)
+    valor = models.CharField(max_length=200, blank=True)
+    ordenes = models.IntegerField(default=0)
+    horas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    costo_mxn = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'dimension', 'valor'], name='resumen_dia_dimension_valor_uniq'),
+        ]
+        indexes = [
+            # Tendencias: una dimensión en un rango de fechas
+            models.Index(fields=['dimension', 'fecha'], name='resumen_dimension_fecha_idx'),
+        ]
+
     def __str__(self):
-        return f"Memoria {self.cliente_nombre} - {self.creado.date()}"
\ No newline at end of file
+        return f"{self.fecha} {self.dimension}={self.valor}: {self.ordenes}"
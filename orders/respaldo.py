@@ -0,0 +1,355 @@
+"""
+Respaldos incrementales de base de datos y media (manage.py backup / manage.py restore).
+
+Cada respaldo es una carpeta <AAAAMMDD-HHMMSS>[-inc] con:
+- <app.modelo>.ndjson: un objeto por línea en el formato de dumpdata, escrito con el
+  serializador jsonl sobre `.iterator(chunk_size=...)` (cursor del lado del servidor en
+  PostgreSQL, dentro de una transacción REPEATABLE READ de solo lectura: foto
+  consistente sin bloquear a nadie);
+- <app.modelo>.pks: los pk vigentes de cada tabla, para que la restauración
+  borre lo que se eliminó entre respaldos;
+- media.tar + media.sha256: los archivos de media nuevos o cambiados, con su hash
+  (formato de sha256sum) calculado al mismo tiempo que se escriben al tar;
+- manifiesto.json: fechas, filas por modelo y tamaño de media.
+
+En modo incremental (`--desde`) solo se escriben las filas cambiadas según
+INCREMENTAL; el resto de las tablas son chicas y van completas en cada respaldo.
+El `hasta` del manifiesto (de donde sigue el próximo incremental) es el momento de la
+foto menos MARGEN_TRANSACCIONES: una transacción que fechó sus filas antes de la foto
+pero confirmó después no sale en esta, y así entra en la siguiente.
+La restauración aplica un respaldo completo y después sus incrementales, con
+upserts por pk (re-aplicar es seguro).
+"""
+import hashlib
+import json
+import os
+import tarfile
+from datetime import datetime, time, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import resumenes
+from .importacion import fechas_del_respaldo
+
+FILAS_POR_BLOQUE = 2000
+FORMATO_CARPETA = '%Y%m%d-%H%M%S'
+MANIFIESTO = 'manifiesto.json'
+
+MODELOS = ['auth.user', 'orders.engineerprofile', 'orders.serviceorder', 'orders.asset', 'orders.material',
+           'orders.equipment', 'orders.servicematerial', 'orders.shelterequipment', 'orders.serviceevidence',
+           'orders.technicalmemory']
+# Datos derivados: no se respaldan, se recalculan al restaurar
+DERIVADOS = ['orders.resumendiario']
+
+# Cómo saber qué cambió desde el respaldo anterior (modelo -> campo de fecha)
+INCREMENTAL = {
+    'orders.serviceorder': 'actualizado',
+    'orders.asset': 'actualizado',
+    # Equipos y materiales solo se editan desde el formulario de la orden
+    'orders.equipment': 'order__actualizado',
+    'orders.servicematerial': 'order__actualizado',
+    # Los resguardos también cambian al devolverlos (equipos_en_resguardo)
+    'orders.shelterequipment': 'actualizado',
+    # Las evidencias solo se agregan o se borran
+    'orders.serviceevidence': 'creado',
+}
+# Lo más que tarda una transacción entre fechar sus filas (auto_now) y confirmarlas
+# (una importación grande es lo más lento); el siguiente incremental repite ese tramo
+MARGEN_TRANSACCIONES = timedelta(minutes=30)
+
+
+def modelos():
+    """Modelos en orden de dependencias (los padres antes que los hijos)."""
+    por_etiqueta = {m._meta.label_lower: m for m in apps.get_models()}
+    etiquetas = MODELOS + sorted(
+        m._meta.label_lower for m in apps.get_app_config('orders').get_models()
+        if m._meta.label_lower not in MODELOS + DERIVADOS
+    )
+    return serializers.sort_dependencies([(None, [por_etiqueta[e] for e in etiquetas])])
+
+
+# ------------------------------------------------------------
+# Respaldo
+# ------------------------------------------------------------
+def ultimo_respaldo(base):
+    """Carpeta del respaldo más reciente en `base` (o None)."""
+    if not os.path.isdir(base):
+        return None
+    carpetas = sorted(c for c in os.listdir(base) if os.path.isfile(os.path.join(base, c, MANIFIESTO)))
+    return os.path.join(base, carpetas[-1]) if carpetas else None
+
+
+def leer_manifiesto(carpeta):
+    with open(os.path.join(carpeta, MANIFIESTO), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _instantanea():
+    """Transacción de solo lectura con una sola foto de la base para todo el respaldo."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+
+
+def respaldar_modelo(modelo, carpeta, desde=None):
+    etiqueta = modelo._meta.label_lower
+    qs = modelo._default_manager.order_by('pk')
+    if desde and etiqueta in INCREMENTAL:
+        qs = qs.filter(**{f'{INCREMENTAL[etiqueta]}__gte': desde})
+    m2m = [f.name for f in modelo._meta.many_to_many]
+    if m2m:
+        # Con chunk_size, el prefetch se hace por bloque (sin N+1 y sin cargar todo)
+        qs = qs.prefetch_related(*m2m)
+
+    filas = _Contador(qs.iterator(chunk_size=FILAS_POR_BLOQUE))
+    with open(os.path.join(carpeta, f'{etiqueta}.ndjson'), 'w', encoding='utf-8') as f:
+        # El serializador jsonl escribe cada objeto al stream conforme lo recibe
+        serializers.serialize('jsonl', filas, stream=f, cls=CodificadorExacto)
+
+    with open(os.path.join(carpeta, f'{etiqueta}.pks'), 'w', encoding='utf-8') as f:
+        for pk in modelo._default_manager.values_list('pk', flat=True).order_by('pk').iterator(
+                chunk_size=FILAS_POR_BLOQUE * 5):
+            f.write(f'{pk}\n')
+    return filas.total
+
+
+class CodificadorExacto(DjangoJSONEncoder):
+    """DjangoJSONEncoder recorta las horas a milisegundos; aquí van completas (el ETag de preview las usa)."""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class _Contador:
+    def __init__(self, iterable):
+        self.iterable, self.total = iterable, 0
+
+    def __iter__(self):
+        for objeto in self.iterable:
+            self.total += 1
+            yield objeto
+
+
+class _LectorConHash:
+    """Envuelve el archivo que lee tarfile para sacar el sha256 en la misma pasada."""
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.sha = hashlib.sha256()
+
+    def read(self, n=-1):
+        datos = self.archivo.read(n)
+        self.sha.update(datos)
+        return datos
+
+
+def respaldar_media(carpeta, desde=None):
+    """Archivos de MEDIA_ROOT modificados desde `desde` a media.tar (en streaming)."""
+    raiz = str(settings.MEDIA_ROOT)
+    limite = desde.timestamp() if desde else None
+    archivos, total = 0, 0
+    with tarfile.open(os.path.join(carpeta, 'media.tar'), 'w|') as tar, \
+            open(os.path.join(carpeta, 'media.sha256'), 'w', encoding='utf-8') as hashes:
+        for dir_actual, _, nombres in os.walk(raiz):
+            for nombre in sorted(nombres):
+                ruta = os.path.join(dir_actual, nombre)
+                info = os.stat(ruta)
+                if limite and info.st_mtime < limite:
+                    continue
+                relativa = os.path.relpath(ruta, raiz).replace(os.sep, '/')
+                with open(ruta, 'rb') as f:
+                    miembro = tar.gettarinfo(fileobj=f, arcname=relativa)
+                    lector = _LectorConHash(f)
+                    tar.addfile(miembro, lector)
+                hashes.write(f'{lector.sha.hexdigest()}  {relativa}\n')
+                archivos += 1
+                total += info.st_size
+    return archivos, total
+
+
+def respaldar(base, desde=None, media=True, al_avanzar=None):
+    """Escribe un respaldo nuevo en `base` y regresa (carpeta, manifiesto)."""
+    nombre = timezone.localtime().strftime(FORMATO_CARPETA) + ('-inc' if desde else '')
+    carpeta = os.path.join(base, nombre)
+    os.makedirs(carpeta)
+
+    manifiesto = {
+        'version': 1,
+        'desde': desde.isoformat() if desde else None,
+        'hasta': None,
+        'modelos': {},
+    }
+    with transaction.atomic():
+        _instantanea()
+        # PostgreSQL toma la foto con la primera consulta, después de este momento: lo
+        # confirmado antes entra; lo fechado antes y confirmado después, solo si cae en el margen
+        foto = timezone.now()
+        manifiesto['hasta'] = (foto - MARGEN_TRANSACCIONES).isoformat()
+        for modelo in modelos():
+            filas = respaldar_modelo(modelo, carpeta, desde)
+            manifiesto['modelos'][modelo._meta.label_lower] = filas
+            if al_avanzar:
+                al_avanzar(modelo._meta.label_lower, filas)
+
+    if media:
+        archivos, total = respaldar_media(carpeta, desde)
+        manifiesto['media'] = {'archivos': archivos, 'bytes': total}
+
+    with open(os.path.join(carpeta, MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+    return carpeta, manifiesto
+
+
+# ------------------------------------------------------------
+# Restauración
+# ------------------------------------------------------------
+def cadena(ruta):
+    """
+    Respaldos a aplicar, en orden: si `ruta` es un respaldo, ese; si es la carpeta
+    base, el último completo y los incrementales posteriores.
+    """
+    if os.path.isfile(os.path.join(ruta, MANIFIESTO)):
+        return [ruta]
+    carpetas = sorted(c for c in os.listdir(ruta) if os.path.isfile(os.path.join(ruta, c, MANIFIESTO)))
+    completos = [i for i, c in enumerate(carpetas) if not c.endswith('-inc')]
+    if not completos:
+        return []
+    return [os.path.join(ruta, c) for c in carpetas[completos[-1]:]]
+
+
+def _lineas(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def _upsert(modelo, objetos):
+    """INSERT ... ON CONFLICT (pk) DO UPDATE para un bloque, más sus M2M."""
+    pk = modelo._meta.pk
+    campos = [f.name for f in modelo._meta.concrete_fields if not f.primary_key]
+    modelo._default_manager.bulk_create(
+        [o.object for o in objetos], update_conflicts=True, unique_fields=[pk.name], update_fields=campos,
+    )
+    for campo in modelo._meta.many_to_many:
+        intermedia = campo.remote_field.through
+        origen, destino = campo.m2m_field_name(), campo.m2m_reverse_field_name()
+        ids = [o.object.pk for o in objetos if campo.name in o.m2m_data]
+        intermedia._default_manager.filter(**{f'{origen}__in': ids}).delete()
+        intermedia._default_manager.bulk_create([
+            intermedia(**{f'{origen}_id': o.object.pk, f'{destino}_id': relacionado})
+            for o in objetos for relacionado in o.m2m_data.get(campo.name, [])
+        ])
+
+
+def restaurar_modelo(modelo, carpeta, lote=FILAS_POR_BLOQUE):
+    etiqueta = modelo._meta.label_lower
+    ruta = os.path.join(carpeta, f'{etiqueta}.ndjson')
+    if not os.path.exists(ruta):
+        return 0, 0
+
+    # Primero se borra lo que no existía al respaldar: una fila nueva puede ocupar un
+    # valor único (ej. el folio) de una fila que el respaldo trae de vuelta
+    borradas = 0
+    ruta_pks = os.path.join(carpeta, f'{etiqueta}.pks')
+    if os.path.exists(ruta_pks):
+        with open(ruta_pks, encoding='utf-8') as f:
+            vigentes = {int(linea) for linea in f if linea.strip()}
+        sobran = [pk for pk in modelo._default_manager.values_list('pk', flat=True).iterator() if pk not in vigentes]
+        if sobran:
+            borradas = _borrar(modelo, sobran)
+
+    filas, bloque = 0, []
+    for objeto in serializers.deserialize('python', _lineas(ruta), ignorenonexistent=True):
+        bloque.append(objeto)
+        if len(bloque) >= lote:
+            _upsert(modelo, bloque)
+            filas += len(bloque)
+            bloque = []
+    if bloque:
+        _upsert(modelo, bloque)
+        filas += len(bloque)
+    return filas, borradas
+
+
+def _borrar(modelo, pks):
+    if modelo._meta.label_lower == 'orders.serviceorder':
+        from .borrado import borrar_ordenes
+        return borrar_ordenes(pks)
+    borradas = 0
+    for inicio in range(0, len(pks), FILAS_POR_BLOQUE):
+        borradas += modelo._default_manager.filter(pk__in=pks[inicio:inicio + FILAS_POR_BLOQUE]).delete()[0]
+    return borradas
+
+
+def verificar_media(carpeta):
+    """Nombres del tar cuyo sha256 no coincide con media.sha256 (vacío si todo bien)."""
+    ruta_hashes = os.path.join(carpeta, 'media.sha256')
+    if not os.path.exists(ruta_hashes):
+        return []
+    esperados = {}
+    with open(ruta_hashes, encoding='utf-8') as f:
+        for linea in f:
+            if linea.strip():
+                sha, nombre = linea.rstrip('\n').split('  ', 1)
+                esperados[nombre] = sha
+    malos = []
+    with tarfile.open(os.path.join(carpeta, 'media.tar'), 'r|') as tar:
+        for miembro in tar:
+            if miembro.isfile():
+                sha = hashlib.sha256()
+                f = tar.extractfile(miembro)
+                for bloque in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(bloque)
+                if esperados.get(miembro.name) != sha.hexdigest():
+                    malos.append(miembro.name)
+    return malos
+
+
+def restaurar_media(carpeta):
+    ruta = os.path.join(carpeta, 'media.tar')
+    if not os.path.exists(ruta):
+        return 0
+    archivos = 0
+    with tarfile.open(ruta, 'r|') as tar:
+        for miembro in tar:
+            if miembro.isfile():
+                # filter='data' rechaza rutas absolutas, '..' y enlaces
+                tar.extract(miembro, settings.MEDIA_ROOT, filter='data')
+                archivos += 1
+    return archivos
+
+
+def restaurar(carpeta, media=True, al_avanzar=None):
+    """Aplica un respaldo (completo o incremental). Regresa {modelo: (filas, borradas)}."""
+    resultado = {}
+    lista = modelos()
+    with transaction.atomic(), fechas_del_respaldo(*lista):
+        for modelo in lista:
+            resultado[modelo._meta.label_lower] = restaurar_modelo(modelo, carpeta)
+            if al_avanzar:
+                al_avanzar(modelo._meta.label_lower, *resultado[modelo._meta.label_lower])
+        # Los pk llegaron explícitos: las secuencias de PostgreSQL se ajustan como en loaddata
+        sentencias = connection.ops.sequence_reset_sql(no_style(), lista)
+        if sentencias:
+            with connection.cursor() as cursor:
+                for sql in sentencias:
+                    cursor.execute(sql)
+        resumenes.reconstruir()
+    if media:
+        resultado['media'] = restaurar_media(carpeta)
+    return resultado
+
+
+def fecha(valor):
+    """ISO 8601 (con o sin hora) a datetime con zona."""
+    dt = datetime.fromisoformat(valor)
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
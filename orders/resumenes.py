@@ -0,0 +1,235 @@
+"""
+Resúmenes diarios (ResumenDiario) para las tendencias del dashboard.
+
+Cada orden aporta, en su día (fecha_servicio; si no tiene, el día en que se creó), a:
+    total, estatus=<estatus>, tipo=<cada tipo de servicio>, ingeniero=<nombre>, cliente=<nombre>
+con ordenes=1 más sus horas y costo. Una orden con dos tipos cuenta en ambos: la suma
+por tipo no es el total.
+
+Al guardar una orden se resta lo que aportaba antes y se suma lo nuevo en un solo
+INSERT ... ON CONFLICT DO UPDATE; al borrarla se resta. Así el dashboard lee
+O(días) filas en vez de recorrer todas las órdenes.
+
+bulk_create, update() y los DELETE directos no disparan señales: borrado.py,
+importacion.py y seed_data llaman a `sumar`/`restar_ordenes`, y
+`manage.py rebuild_rollups` recalcula todo (o un rango) desde las órdenes.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .models import SERVICE_TYPES, ResumenDiario, ServiceOrder
+
+# Lo que se lee de cada orden para calcular su aporte
+CAMPOS = ('fecha_servicio', 'creado', 'estatus', 'tipos_servicio', 'ingeniero_nombre',
+          'cliente_nombre', 'horas', 'costo_mxn')
+LARGO_VALOR = ResumenDiario._meta.get_field('valor').max_length
+
+
+# ------------------------------------------------------------
+# Aportes de una orden
+# ------------------------------------------------------------
+def _dia(fecha_servicio, creado):
+    if fecha_servicio:
+        return fecha_servicio
+    return timezone.localdate(creado) if creado else timezone.localdate()
+
+
+def aportes(valores):
+    """Claves (fecha, dimensión, valor) a las que suma una orden, dada como dict de CAMPOS."""
+    dia = _dia(valores['fecha_servicio'], valores['creado'])
+    claves = [
+        (dia, 'total', ''),
+        (dia, 'estatus', valores['estatus'] or ''),
+        (dia, 'ingeniero', (valores['ingeniero_nombre'] or '').strip()[:LARGO_VALOR]),
+        (dia, 'cliente', (valores['cliente_nombre'] or '').strip()[:LARGO_VALOR]),
+    ]
+    claves += [(dia, 'tipo', tipo[:LARGO_VALOR]) for tipo in dict.fromkeys(valores['tipos_servicio'] or [])]
+    return claves
+
+
+def acumular(filas, signo=1, deltas=None):
+    """Suma (o resta) los aportes de varias órdenes: {clave: [ordenes, horas, costo]}."""
+    deltas = deltas if deltas is not None else defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for valores in filas:
+        horas = Decimal(valores['horas'] or 0)
+        costo = Decimal(valores['costo_mxn'] or 0)
+        for clave in aportes(valores):
+            d = deltas[clave]
+            d[0] += signo
+            d[1] += signo * horas
+            d[2] += signo * costo
+    return deltas
+
+
+def _valores(orden):
+    return {campo: getattr(orden, campo) for campo in CAMPOS}
+
+
+# ------------------------------------------------------------
+# Escritura
+# ------------------------------------------------------------
+def aplicar(deltas):
+    """Aplica los deltas con un upsert por lote (PostgreSQL y SQLite ≥ 3.24)."""
+    filas = [(fecha, dim, valor, n, h, c) for (fecha, dim, valor), (n, h, c) in deltas.items() if n or h or c]
+    if not filas:
+        return
+    q = connection.ops.quote_name
+    tabla = q(ResumenDiario._meta.db_table)
+    sql = (
+        f"INSERT INTO {tabla} ({q('fecha')}, {q('dimension')}, {q('valor')}, {q('ordenes')}, {q('horas')}, "
+        f"{q('costo_mxn')}) VALUES (%s, %s, %s, %s, %s, %s) "
+        f"ON CONFLICT ({q('fecha')}, {q('dimension')}, {q('valor')}) DO UPDATE SET "
+        f"{q('ordenes')} = {tabla}.{q('ordenes')} + EXCLUDED.{q('ordenes')}, "
+        f"{q('horas')} = {tabla}.{q('horas')} + EXCLUDED.{q('horas')}, "
+        f"{q('costo_mxn')} = {tabla}.{q('costo_mxn')} + EXCLUDED.{q('costo_mxn')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, filas)
+    # Un día/valor que se quedó sin órdenes no aporta nada a las tendencias
+    fechas = {fila[0] for fila in filas if fila[3] < 0}
+    if fechas:
+        ResumenDiario.objects.filter(fecha__in=fechas, ordenes__lte=0).delete()
+
+
+def sumar(ordenes):
+    """Para altas con bulk_create (órdenes ya guardadas, con su `creado` definitivo)."""
+    aplicar(acumular(_valores(o) for o in ordenes))
+
+
+def restar_ordenes(ids):
+    """Antes de un borrado directo por pk (borrado.py)."""
+    aplicar(acumular(ServiceOrder.objects.filter(pk__in=ids).values(*CAMPOS), signo=-1))
+
+
+def reconstruir(desde=None, hasta=None):
+    """Recalcula los resúmenes de [desde, hasta] (fechas; None = sin límite) desde las órdenes."""
+    resumenes = ResumenDiario.objects.all()
+    ordenes = ServiceOrder.objects.all()
+    if desde:
+        resumenes = resumenes.filter(fecha__gte=desde)
+    if hasta:
+        resumenes = resumenes.filter(fecha__lte=hasta)
+    if desde or hasta:
+        # Mismo criterio que _dia(): fecha de servicio o, si no tiene, el día de creación
+        por_servicio, por_creacion = Q(), Q(fecha_servicio__isnull=True)
+        if desde:
+            por_servicio &= Q(fecha_servicio__gte=desde)
+            por_creacion &= Q(creado__date__gte=desde)
+        if hasta:
+            por_servicio &= Q(fecha_servicio__lte=hasta)
+            por_creacion &= Q(creado__date__lte=hasta)
+        ordenes = ordenes.filter(por_servicio | por_creacion)
+
+    deltas = acumular(ordenes.values(*CAMPOS).iterator(chunk_size=5000))
+    resumenes.delete()
+    ResumenDiario.objects.bulk_create(
+        [ResumenDiario(fecha=f, dimension=d, valor=v, ordenes=n, horas=h, costo_mxn=c)
+         for (f, d, v), (n, h, c) in deltas.items() if n > 0],
+        batch_size=2000,
+    )
+    return len(deltas)
+
+
+# ------------------------------------------------------------
+# Señales de ServiceOrder
+# ------------------------------------------------------------
+def _antes_de_guardar(sender, instance, update_fields=None, **kwargs):
+    instance._resumen_anterior = None
+    if instance.pk and (update_fields is None or set(update_fields) & set(CAMPOS)):
+        instance._resumen_anterior = ServiceOrder.objects.filter(pk=instance.pk).values(*CAMPOS).first()
+
+
+def _despues_de_guardar(sender, instance, created, update_fields=None, **kwargs):
+    anterior = getattr(instance, '_resumen_anterior', None)
+    if not created and anterior is None:
+        return  # guardado parcial que no toca nada de lo resumido
+    deltas = acumular([anterior], signo=-1) if anterior else None
+    aplicar(acumular([_valores(instance)], deltas=deltas))
+
+
+def _despues_de_borrar(sender, instance, **kwargs):
+    aplicar(acumular([_valores(instance)], signo=-1))
+
+
+pre_save.connect(_antes_de_guardar, sender=ServiceOrder)
+post_save.connect(_despues_de_guardar, sender=ServiceOrder)
+post_delete.connect(_despues_de_borrar, sender=ServiceOrder)
+
+
+# ------------------------------------------------------------
+# Lectura para el dashboard
+# ------------------------------------------------------------
+def _serie(dimension, desde, truncar, valores=None):
+    qs = ResumenDiario.objects.filter(dimension=dimension, fecha__gte=desde)
+    if valores is not None:
+        qs = qs.filter(valor__in=valores)
+    return (qs.annotate(periodo=truncar('fecha')).values('valor', 'periodo')
+            .annotate(ordenes=Sum('ordenes'), horas=Sum('horas'), costo=Sum('costo_mxn')))
+
+
+def _top(dimension, desde, orden, n):
+    return list(
+        ResumenDiario.objects.filter(dimension=dimension, fecha__gte=desde).exclude(valor='')
+        .values('valor').annotate(total=Sum(orden)).order_by('-total').values_list('valor', flat=True)[:n]
+    )
+
+
+def tendencias(semanas=8, meses=6, top=6):
+    """Datos del panel de tendencias: solo lee ResumenDiario."""
+    hoy = timezone.localdate()
+    inicio_semanas = hoy - timedelta(days=hoy.weekday() + 7 * (semanas - 1))
+    lista_semanas = [inicio_semanas + timedelta(weeks=i) for i in range(semanas)]
+
+    primero = hoy.replace(day=1)
+    lista_meses = [primero]
+    for _ in range(meses - 1):
+        lista_meses.insert(0, (lista_meses[0] - timedelta(days=1)).replace(day=1))
+
+    # Órdenes por semana (total)
+    por_semana = {f['periodo']: f for f in _serie('total', inicio_semanas, TruncWeek)}
+    totales = [{'inicio': s, 'ordenes': por_semana.get(s, {}).get('ordenes') or 0,
+                'horas': por_semana.get(s, {}).get('horas') or 0} for s in lista_semanas]
+    maximo = max((t['ordenes'] for t in totales), default=0) or 1
+    for t in totales:
+        t['pct'] = round(100 * t['ordenes'] / maximo)
+
+    # Órdenes y horas por tipo de servicio en esas semanas (una orden con dos tipos cuenta en ambos)
+    por_tipo = {f['valor']: f for f in ResumenDiario.objects.filter(dimension='tipo', fecha__gte=inicio_semanas)
+                .values('valor').annotate(ordenes=Sum('ordenes'), horas=Sum('horas'))}
+    tipos = [{'codigo': codigo, 'nombre': nombre, 'ordenes': por_tipo.get(codigo, {}).get('ordenes') or 0,
+              'horas': por_tipo.get(codigo, {}).get('horas') or 0} for codigo, nombre in SERVICE_TYPES]
+    maximo_tipo = max((t['ordenes'] for t in tipos), default=0) or 1
+    for t in tipos:
+        t['pct'] = round(100 * t['ordenes'] / maximo_tipo)
+
+    # Órdenes por ingeniero por semana
+    ingenieros = _top('ingeniero', inicio_semanas, 'ordenes', top)
+    celdas = defaultdict(dict)
+    for f in _serie('ingeniero', inicio_semanas, TruncWeek, ingenieros):
+        celdas[f['valor']][f['periodo']] = f['ordenes']
+    filas_ingenieros = [{'nombre': nombre, 'semanas': [celdas[nombre].get(s, 0) for s in lista_semanas],
+                         'total': sum(celdas[nombre].values())} for nombre in ingenieros]
+
+    # Horas y costo por cliente por mes
+    clientes = _top('cliente', lista_meses[0], 'costo_mxn', top)
+    meses_cliente = defaultdict(dict)
+    for f in _serie('cliente', lista_meses[0], TruncMonth, clientes):
+        meses_cliente[f['valor']][f['periodo']] = f
+    filas_clientes = [{'nombre': nombre, 'meses': [meses_cliente[nombre].get(m) for m in lista_meses]}
+                      for nombre in clientes]
+
+    return {
+        'semanas': lista_semanas,
+        'totales': totales,
+        'tipos': tipos,
+        'ingenieros': filas_ingenieros,
+        'meses': lista_meses,
+        'clientes': filas_clientes,
+    }
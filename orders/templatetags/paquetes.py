@@ -0,0 +1,35 @@
+"""
+{% paquete 'orders/dist/app.css' %} / {% paquete 'orders/dist/app.js' %}
+
+En producción emite una sola etiqueta hacia el paquete armado por `manage.py build_static`
+(con hash y comprimido por collectstatic). Con DEBUG, o si el paquete no se ha
+construido, emite una etiqueta por cada archivo fuente de STATIC_BUNDLES.
+"""
+from functools import lru_cache
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def paquete_construido(nombre):
+    return finders.find(nombre) is not None
+
+
+def etiqueta(ruta):
+    if ruta.endswith('.css'):
+        return format_html('<link rel="stylesheet" href="{}">', static(ruta))
+    # defer: se ejecuta en orden después de leer el HTML (igual que los scripts sueltos)
+    return format_html('<script defer src="{}"></script>', static(ruta))
+
+
+@register.simple_tag
+def paquete(nombre):
+    if not settings.DEBUG and paquete_construido(nombre):
+        return etiqueta(nombre)
+    return format_html_join('\n', '{}', ((etiqueta(ruta),) for ruta in settings.STATIC_BUNDLES[nombre]))
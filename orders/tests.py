@@ -0,0 +1,417 @@
+"""
+Pruebas de orders. Necesitan PostgreSQL (ArrayField, pg_trgm, pool de psycopg):
+    python manage.py test orders.tests
+"""
+import codecs
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from servicereports.precarga import precargar
+
+from . import autenticacion, importacion, metricas, respaldo, versiones
+from .forms import ServiceOrderForm
+from .models import Equipment, ResumenDiario, ServiceEvidence, ServiceMaterial, ServiceOrder
+
+
+# Las pruebas no corren collectstatic: sin manifiesto de WhiteNoise
+sin_manifiesto = override_settings(STORAGES={
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+def _pid():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_backend_pid()')
+        return cursor.fetchone()[0]
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql' and connection.settings_dict.get('OPTIONS', {}).get('pool'),
+                     "La base no usa el pool de psycopg (DB_POOL=0)")
+@sin_manifiesto
+class PoolDeConexionesTests(TransactionTestCase):
+    # El test client no cierra la conexión al terminar la petición (sí lo hace el
+    # servidor real, vía close_old_connections): aquí se cierra a mano, que con pool
+    # la devuelve al pool en lugar de desconectarla.
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        connection.close()
+
+    def _pedir(self):
+        self.assertEqual(self.client.get(reverse('orders:list')).status_code, 200)
+        pid = _pid()
+        connection.close()
+        return pid
+
+    def test_dos_peticiones_reusan_la_conexion(self):
+        self._pedir()
+        # connections_num: conexiones que el pool ha abierto en su vida
+        abiertas = connection.pool.get_stats()['connections_num']
+        pids = {self._pedir(), self._pedir()}
+        self.assertEqual(connection.pool.get_stats()['connections_num'], abiertas)
+        self.assertLessEqual(len(pids), abiertas)
+
+    def test_precarga_cierra_el_pool(self):
+        antes = self._pedir()
+        precargar(documentos=False)
+        # El worker arma su propio pool: otra conexión (otro backend de Postgres)
+        self.assertNotEqual(self._pedir(), antes)
+
+
+# ------------------------------------------------------------
+# Alta y edición de órdenes (control de concurrencia)
+# ------------------------------------------------------------
+def _datos_orden(**campos):
+    datos = {'cliente_nombre': 'ACME', 'horas': '0', 'costo_mxn': '0', 'accion': 'borrador', **campos}
+    for prefijo in ('equipos', 'materiales', 'resguardos', 'evidencias'):
+        datos.update({f'{prefijo}-TOTAL_FORMS': 0, f'{prefijo}-INITIAL_FORMS': 0})
+    return datos
+
+
+@sin_manifiesto
+class ConcurrenciaOrdenTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+
+    def _crear(self):
+        respuesta = self.client.post(reverse('orders:create'), _datos_orden())
+        orden = ServiceOrder.objects.get()
+        self.assertRedirects(respuesta, reverse('orders:detail', args=[orden.pk]), fetch_redirect_response=False)
+        return orden
+
+    def _editar(self, orden, **extra):
+        return self.client.post(reverse('orders:update', args=[orden.pk]),
+                                _datos_orden(cliente_nombre='ACME 2', **extra.pop('datos', {})), **extra)
+
+    def test_alta(self):
+        orden = self._crear()
+        self.assertEqual(orden.version, 1)
+        self.assertTrue(orden.folio)
+
+    def test_guardar_sube_la_version(self):
+        orden = self._crear()
+        respuesta = self._editar(orden, datos={'version': orden.version})
+        self.assertEqual(respuesta.status_code, 302)
+        orden.refresh_from_db()
+        self.assertEqual((orden.cliente_nombre, orden.version), ('ACME 2', 2))
+
+    def test_version_vieja_es_conflicto(self):
+        orden = self._crear()
+        ServiceOrder.objects.filter(pk=orden.pk).update(version=F('version') + 1)
+        respuesta = self._editar(orden, datos={'version': orden.version})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.context['version_form'], orden.version + 1)
+        self.assertEqual(ServiceOrder.objects.get(pk=orden.pk).cliente_nombre, 'ACME')
+
+    def test_if_match_viejo_es_412(self):
+        orden = self._crear()
+        ServiceOrder.objects.filter(pk=orden.pk).update(version=F('version') + 1)
+        respuesta = self._editar(orden, HTTP_IF_MATCH=orden.etag)
+        self.assertEqual(respuesta.status_code, 412)
+        self.assertEqual(respuesta['ETag'], f'"{orden.pk}-{orden.version + 1}"')
+
+    def test_if_match_de_otra_orden_es_412(self):
+        orden, otra = self._crear(), ServiceOrder.objects.create(cliente_nombre='Otra')
+        # Misma versión, otro pk: no debe pasar por coincidir el número
+        respuesta = self._editar(orden, HTTP_IF_MATCH=f'"{otra.pk}-{orden.version}"')
+        self.assertEqual(respuesta.status_code, 412)
+        self.assertEqual(ServiceOrder.objects.get(pk=orden.pk).version, orden.version)
+
+    def test_if_match_vigente_guarda(self):
+        orden = self._crear()
+        respuesta = self._editar(orden, HTTP_IF_MATCH=orden.etag)
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(ServiceOrder.objects.get(pk=orden.pk).version, orden.version + 1)
+
+    def test_guardado_entre_lectura_y_bloqueo_no_baja_la_version(self):
+        orden = self._crear()
+        validar = ServiceOrderForm.is_valid
+
+        def guardado_concurrente(form):
+            # Otro usuario guarda después de que la vista leyó la orden y antes del bloqueo
+            ServiceOrder.objects.filter(pk=orden.pk).update(version=F('version') + 1)
+            return validar(form)
+
+        with mock.patch.object(ServiceOrderForm, 'is_valid', guardado_concurrente):
+            respuesta = self._editar(orden)
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(ServiceOrder.objects.get(pk=orden.pk).version, orden.version + 2)
+
+
+# ------------------------------------------------------------
+# Métricas (MetricasMiddleware, /metricas/prometheus/)
+# ------------------------------------------------------------
+@sin_manifiesto
+class MetricasTests(TestCase):
+
+    def setUp(self):
+        metricas.reiniciar()
+        self.addCleanup(metricas.reiniciar)
+
+    def _vista(self, nombre):
+        return next(f for f in metricas.resumen() if f['vista'] == nombre)
+
+    @override_settings(METRICS_TOKEN='secreto')
+    def test_prometheus_con_token(self):
+        url = reverse('orders:metricas_prometheus')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_exportacion_en_streaming_cuenta_sus_consultas(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        ServiceOrder.objects.create(cliente_nombre='ACME')
+        respuesta = self.client.get(reverse('orders:export'))
+        self.assertTrue(respuesta.streaming)
+        # Hasta que se envía el cuerpo no se registra
+        self.assertFalse(any(f['vista'] == 'orders:export' for f in metricas.resumen()))
+        cuerpo = b''.join(respuesta.streaming_content)
+        respuesta.close()
+
+        self.assertIn(b'ACME', cuerpo)
+        fila = self._vista('orders:export')
+        self.assertEqual(fila['peticiones'], 1)
+        # La consulta de las órdenes corre al iterar el cuerpo, ya fuera de la vista
+        self.assertGreaterEqual(fila['consultas_promedio'], 1)
+
+
+# ------------------------------------------------------------
+# Usuario en caché (orders/autenticacion.py)
+# ------------------------------------------------------------
+class UsuarioEnCacheTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('ingeniero', password='x')
+        self.backend = autenticacion.ModelBackendEnCache()
+        self.addCleanup(cache.delete, autenticacion.llave_usuario(self.usuario.pk))
+
+    def test_se_invalida_al_confirmar(self):
+        self.backend.get_user(self.usuario.pk)
+        llave = autenticacion.llave_usuario(self.usuario.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.usuario.first_name = 'Ana'
+            self.usuario.save()
+            # Sin confirmar, otra petición volvería a cachear los datos viejos
+            self.assertIsNotNone(cache.get(llave))
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertIsNone(cache.get(llave))
+        self.assertEqual(self.backend.get_user(self.usuario.pk).first_name, 'Ana')
+
+    def test_limpiar_grupo_invalida_a_sus_usuarios(self):
+        grupo = Group.objects.create(name='Campo')
+        self.usuario.groups.add(grupo)
+        self.backend.get_user(self.usuario.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            grupo.user_set.clear()
+        self.assertIsNone(cache.get(autenticacion.llave_usuario(self.usuario.pk)))
+
+
+# ------------------------------------------------------------
+# Importación (manage.py import_orders)
+# ------------------------------------------------------------
+def _orden(pk, folio, **campos):
+    campos = {'folio': folio, 'cliente_nombre': 'ACME', 'estatus': 'borrador',
+              'creado': '2024-03-01T10:00:00Z', 'actualizado': '2024-03-02T10:00:00Z', **campos}
+    return {'model': 'orders.serviceorder', 'pk': pk, 'fields': campos}
+
+
+def _equipo(pk, orden, serie):
+    return {'model': 'orders.equipment', 'pk': pk, 'fields': {'order': orden, 'marca': 'Cisco', 'serie': serie}}
+
+
+def _material(pk, orden, descripcion, cantidad=1):
+    return {'model': 'orders.servicematerial', 'pk': pk,
+            'fields': {'order': orden, 'descripcion': descripcion, 'cantidad': cantidad}}
+
+
+class ImportacionTests(TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.carpeta.cleanup)
+
+    def _archivo(self, nombre, contenido, codificacion='utf-8'):
+        ruta = os.path.join(self.carpeta.name, nombre)
+        with open(ruta, 'wb') as f:
+            f.write(contenido if isinstance(contenido, bytes) else contenido.encode(codificacion))
+        return ruta
+
+    def _importar(self, ruta):
+        call_command('import_orders', ruta, verbosity=0, stdout=open(os.devnull, 'w'))
+
+    def test_remapea_pks_y_enlaza_hijos(self):
+        # Ocupa el pk que trae el respaldo: la orden importada debe quedar con otro
+        local = ServiceOrder.objects.create(cliente_nombre='Local')
+        objetos = [
+            _orden(local.pk, 'OS-IMP-1', cliente_nombre='Importado'),
+            _equipo(50, local.pk, 'sn-01'),
+            _material(60, local.pk, 'Cable UTP', cantidad=3),
+        ]
+        self._importar(self._archivo('respaldo.json', json.dumps(objetos)))
+
+        importada = ServiceOrder.objects.get(folio='OS-IMP-1')
+        self.assertNotEqual(importada.pk, local.pk)
+        self.assertEqual(list(importada.equipos.values_list('serie', flat=True)), ['sn-01'])
+        self.assertEqual(importada.materiales.get().cantidad, 3)
+        self.assertFalse(local.equipos.exists())
+        # Los derivados se enlazan al importar (activo por serie, material por descripción)
+        self.assertEqual(importada.equipos.get().asset.serie_normalizada, 'SN01')
+        self.assertEqual(importada.materiales.get().material.clave, 'cable utp')
+        # Conserva las fechas del respaldo
+        self.assertEqual(importada.creado.isoformat(), '2024-03-01T10:00:00+00:00')
+
+    def test_omite_folio_existente_con_sus_hijos(self):
+        existente = ServiceOrder.objects.create(cliente_nombre='Local')
+        objetos = [
+            _orden(1, existente.folio, cliente_nombre='Otra'),
+            _equipo(10, 1, 'sn-existente'),
+            _orden(2, 'OS-IMP-2'),
+            _equipo(20, 2, 'sn-nuevo'),
+        ]
+        ruta = self._archivo('respaldo.json', json.dumps(objetos))
+        self._importar(ruta)
+        # Re-importar el mismo archivo no duplica nada
+        self._importar(ruta)
+
+        existente.refresh_from_db()
+        self.assertEqual(existente.cliente_nombre, 'Local')
+        self.assertEqual(ServiceOrder.objects.filter(folio='OS-IMP-2').count(), 1)
+        self.assertEqual(list(Equipment.objects.values_list('serie', flat=True)), ['sn-nuevo'])
+
+    def test_renueva_las_filas_cacheadas_de_la_lista(self):
+        # Las órdenes importadas traen `actualizado` y `version` del respaldo
+        antes = versiones.actual(versiones.FILAS_LISTA)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._importar(self._archivo('respaldo.json', json.dumps([_orden(1, 'OS-IMP-4')])))
+        self.assertNotEqual(versiones.actual(versiones.FILAS_LISTA), antes)
+
+    def test_json_lines_sin_actualizado(self):
+        sin_fechas = _orden(1, 'OS-IMP-3')
+        del sin_fechas['fields']['actualizado'], sin_fechas['fields']['creado']
+        lineas = '\n'.join(json.dumps(o) for o in (sin_fechas, _material(1, 1, 'Jack RJ45')))
+        antes = timezone.now()
+        self._importar(self._archivo('respaldo.jsonl', lineas))
+
+        orden = ServiceOrder.objects.get(folio='OS-IMP-3')
+        self.assertGreaterEqual(orden.actualizado, antes)
+        self.assertGreaterEqual(orden.creado, antes)
+        self.assertEqual(orden.materiales.count(), 1)
+
+    def test_csv_utf16_de_la_exportacion(self):
+        csv = ('Folio\tCliente\tEstatus\tFecha de servicio\tHoras\n'
+               'OS-CSV-1\tTelefónica\tFinalizado\t2024-05-10\t2.5\n'
+               'OS-CSV-2\tÑandú SA\tborrador\t\t\n')
+        for nombre, datos in (('con_bom.csv', codecs.BOM_UTF16_LE + csv.encode('utf-16-le')),
+                              ('sin_bom.csv', csv.replace('OS-CSV', 'OS-LE').encode('utf-16-le'))):
+            self._importar(self._archivo(nombre, datos))
+
+        for prefijo in ('OS-CSV', 'OS-LE'):
+            primera = ServiceOrder.objects.get(folio=f'{prefijo}-1')
+            self.assertEqual(primera.cliente_nombre, 'Telefónica')
+            self.assertEqual(primera.estatus, 'finalizado')
+            self.assertEqual(primera.fecha_servicio, date(2024, 5, 10))
+            self.assertEqual(primera.horas, Decimal('2.5'))
+            self.assertEqual(ServiceOrder.objects.get(folio=f'{prefijo}-2').cliente_nombre, 'Ñandú SA')
+
+    def test_detectar_codificacion(self):
+        texto = 'folio,cliente\nOS-1,Peñoles\n'
+        casos = {
+            codecs.BOM_UTF8 + texto.encode('utf-8'): 'utf-8-sig',
+            codecs.BOM_UTF16_BE + texto.encode('utf-16-be'): 'utf-16',
+            texto.encode('utf-16-le'): 'utf-16-le',
+            texto.encode('utf-16-be'): 'utf-16-be',
+            texto.encode('utf-8'): 'utf-8',
+            texto.encode('cp1252'): 'cp1252',
+        }
+        for muestra, esperada in casos.items():
+            self.assertEqual(importacion.detectar_codificacion(muestra), esperada)
+
+
+# ------------------------------------------------------------
+# Respaldo y restauración (manage.py backup / restore)
+# ------------------------------------------------------------
+@sin_manifiesto
+class RespaldoTests(TransactionTestCase):
+    # TransactionTestCase: el respaldo abre su propia transacción REPEATABLE READ
+
+    def setUp(self):
+        temporal = tempfile.TemporaryDirectory()
+        self.addCleanup(temporal.cleanup)
+        self.base = os.path.join(temporal.name, 'respaldos')
+        media = override_settings(MEDIA_ROOT=os.path.join(temporal.name, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.uno = ServiceOrder.objects.create(cliente_nombre='ACME', horas=Decimal('1.5'),
+                                               tipos_servicio=['instalacion'])
+        Equipment.objects.create(order=self.uno, marca='Cisco', serie='SN-1')
+        ServiceMaterial.objects.create(order=self.uno, descripcion='Cable UTP', cantidad=4)
+        self.evidencia = ServiceEvidence.objects.create(order=self.uno, archivo=ContentFile(b'foto', name='foto.jpg'))
+        self.dos = ServiceOrder.objects.create(cliente_nombre='Peñoles', fecha_servicio=date(2024, 1, 5))
+        ServiceMaterial.objects.create(order=self.dos, descripcion='Jack RJ45')
+
+    def _foto(self):
+        return {
+            'ordenes': list(ServiceOrder.objects.order_by('pk').values()),
+            'equipos': list(Equipment.objects.order_by('pk').values()),
+            'materiales': list(ServiceMaterial.objects.order_by('pk').values()),
+            'evidencias': list(ServiceEvidence.objects.order_by('pk').values()),
+            'resumenes': list(ResumenDiario.objects.order_by('fecha', 'dimension', 'valor')
+                              .values_list('fecha', 'dimension', 'valor', 'ordenes', 'horas', 'costo_mxn')),
+        }
+
+    def _comando(self, *args):
+        call_command(*args, verbosity=0, stdout=open(os.devnull, 'w'))
+
+    def _desordenar(self):
+        """Cambia, borra y agrega órdenes y quita el archivo de la evidencia."""
+        ServiceOrder.objects.filter(pk=self.uno.pk).update(cliente_nombre='Cambiado')
+        ServiceMaterial.objects.filter(order=self.uno).delete()
+        self.dos.delete()
+        ServiceOrder.objects.create(cliente_nombre='Nueva')
+        os.remove(self.evidencia.archivo.path)
+
+    def test_completo(self):
+        antes = self._foto()
+        self._comando('backup', '--salida', self.base)
+        self._desordenar()
+
+        self._comando('restore', self.base)
+        self.assertEqual(self._foto(), antes)
+        with open(self.evidencia.archivo.path, 'rb') as f:
+            self.assertEqual(f.read(), b'foto')
+        # Las secuencias quedan después de los pk restaurados
+        self.assertGreater(ServiceOrder.objects.create(cliente_nombre='Otra').pk, max(o['id'] for o in antes['ordenes']))
+
+    def test_incremental(self):
+        self._comando('backup', '--salida', self.base)
+        self.dos.estatus = 'finalizado'
+        self.dos.save()
+        tres = ServiceOrder.objects.create(cliente_nombre='Tercera')
+        ServiceMaterial.objects.create(order=tres, descripcion='Cable UTP', cantidad=2)
+        antes = self._foto()
+        self._comando('backup', '--salida', self.base, '--desde', 'ultimo')
+        self.assertEqual(len(respaldo.cadena(self.base)), 2)
+        self._desordenar()
+
+        self._comando('restore', self.base)
+        self.assertEqual(self._foto(), antes)
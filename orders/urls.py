@@ -9,12 +9,14 @@ urlpatterns = [
     
     # --- LA LISTA VIEJA AHORA ESTÁ EN /orders/list/ ---
     path("list/", views.order_list, name="list"), 
+    path("list/exportar/", views.order_export, name="export"),
     
     # ... (El resto de tus rutas siguen aquí, revisa que no haya duplicados de la lista) ...
     path("new/", views.order_create, name="create"),
     path("nueva/", views.order_create, name="create_es"),
     path("<int:pk>/", views.order_detail, name="detail"),
     path("bulk-delete/", views.bulk_delete, name="bulk_delete"),
+    path("bulk-delete/<slug:trabajo>/", views.bulk_delete_progress, name="bulk_delete_progress"),
     path("logout/", views.logout_view, name="logout"),
     path("<int:pk>/email/", views.email_order, name="email"),
     path('usuarios/', views.user_list_view, name='user_list'),
@@ -27,4 +29,17 @@ urlpatterns = [
     path('memoria/previsualizar/', views.memory_preview_view, name='memory_preview'),
     path('memoria/descargar/', views.memory_download_view, name='memory_download'),
     path('preview/<int:pk>/', views.order_preview, name='preview'),
+    path('activos/', views.asset_list, name='asset_list'),
+    path('activos/buscar/', views.asset_autocomplete, name='asset_autocomplete'),
+    path('activos/<int:pk>/', views.asset_detail, name='asset_detail'),
+    path('materiales/', views.material_list, name='material_list'),
+    path('materiales/buscar/', views.material_autocomplete, name='material_autocomplete'),
+    path('materiales/consumo/', views.material_consumo, name='material_consumo'),
+    path('materiales/<int:pk>/sku/', views.material_sku, name='material_sku'),
+    path('resguardos/', views.equipos_en_resguardo, name='resguardos'),
+    path('resguardos/devolver/', views.resguardos_devolver, name='resguardos_devolver'),
+    path('agenda/', views.agenda_semana, name='agenda'),
+    path('agenda/<str:token>/reagendas.ics', views.agenda_calendario, name='agenda_ics'),
+    path('metricas/', views.metricas_view, name='metricas'),
+    path('metricas/prometheus/', views.metricas_prometheus, name='metricas_prometheus'),
 ]
\ No newline at end of file
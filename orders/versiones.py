@@ -0,0 +1,42 @@
+"""
+Versiones en caché para invalidar de golpe lo que depende de las órdenes.
+
+Lo cacheado (meses del reporte de materiales, calendarios de la agenda) se guarda bajo
+claves que llevan una versión; para descartarlo basta con cambiarla y las claves
+viejas caducan solas. La versión nueva se escribe hasta que se confirma la transacción
+(`renovar` usa on_commit): si se cambiara antes, otra petición podría volver a calcular
+con los datos aún sin confirmar y dejarlos en caché bajo la versión nueva. Quien lee la
+versión vieja y guarda después solo ensucia claves que ya nadie consulta.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Filas cacheadas de la lista de órdenes (order_list.html): la importación conserva
+# `actualizado` y `version` del respaldo, así que la llave de cada fila no basta
+FILAS_LISTA = 'orden_fila:version'
+
+
+def actuales(claves):
+    """{clave: versión} de varias claves en una sola consulta a la caché; crea las que falten."""
+    versiones = cache.get_many(list(claves))
+    for clave in claves:
+        if clave not in versiones:
+            nueva = uuid.uuid4().hex
+            # add: si otro proceso la creó entretanto, gana la suya
+            cache.add(clave, nueva, None)
+            versiones[clave] = cache.get(clave, nueva)
+    return versiones
+
+
+def actual(clave):
+    return actuales([clave])[clave]
+
+
+def renovar(*claves):
+    """Cambia la versión de `claves` al confirmarse la transacción (en seguida si no hay una)."""
+    def _renovar():
+        cache.set_many({clave: uuid.uuid4().hex for clave in claves}, None)
+    transaction.on_commit(_renovar)
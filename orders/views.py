@@ -1,19 +1,15 @@
 import os
+import mimetypes
 import uuid
 import base64
 import unicodedata
 import ast # Vital para leer listas de IDs
 import re
-import markdown
+from urllib.parse import quote
+from datetime import datetime, time, timedelta
 # --- TERCEROS ---
-import weasyprint
-from google import genai
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_ALIGN_VERTICAL, WD_TABLE_ALIGNMENT
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+# WeasyPrint, python-docx, google-genai y markdown NO se importan aquí: viven en
+# orders/documentos.py y orders/ia.py y se cargan en el primer uso (arranque más ligero).
 
 
 # --- DJANGO ---
@@ -21,12 +17,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.http import require_POST
 from django.views.decorators.cache import never_cache
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.contrib.auth import logout
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
-from django.db.models import Q
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.core.paginator import Paginator
 from django.contrib.auth.models import User
@@ -34,14 +31,25 @@ from django.contrib.auth.hashers import make_password
 from django.core.mail import EmailMessage
 from django.core.files.base import ContentFile
 from django.utils.dateparse import parse_date
+from django.utils.http import http_date
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.db import IntegrityError, transaction
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 
 # --- MODELOS Y FORMULARIOS ---
-from .models import ServiceOrder, EngineerProfile, ServiceEvidence, TechnicalMemory
+from .models import (
+    SERVICE_TYPES, Asset, Equipment, Material, ServiceOrder, EngineerProfile, ServiceEvidence, ShelterEquipment, TechnicalMemory,
+)
+from . import metricas
+from .metricas import medir
+from .almacenamiento import es_por_contenido
+from . import activos, agenda, borrado, exportacion, materiales, resumenes, versiones
 from .forms import (
     ServiceOrderForm, EquipmentFormSet, ServiceMaterialFormSet,
     ShelterEquipmentFormSet, ServiceEvidenceFormSet,
@@ -88,6 +96,81 @@ def guardar_firma(user, data_url):
     except Exception as e:
         print(f"Error guardando firma de usuario: {e}")
 
+CAMPOS_FECHA = ('creado', 'fecha_servicio')
+
+def rango_fechas(fecha_inicio, fecha_fin, campo='creado'):
+    """Convierte las fechas 'AAAA-MM-DD' del filtro en un rango semiabierto [desde, hasta).
+    Para 'creado' (timestamp) los límites son medianoche en hora local (America/Monterrey);
+    para 'fecha_servicio' (DateField) basta con las fechas. Fechas inválidas se ignoran."""
+    def _parse(valor):
+        try:
+            return parse_date(valor) if valor else None
+        except ValueError:
+            return None
+
+    desde = _parse(fecha_inicio)
+    hasta = _parse(fecha_fin)
+    if hasta:
+        hasta += timedelta(days=1)
+
+    if campo == 'creado':
+        tz = timezone.get_current_timezone()
+        desde = timezone.make_aware(datetime.combine(desde, time.min), tz) if desde else None
+        hasta = timezone.make_aware(datetime.combine(hasta, time.min), tz) if hasta else None
+    return desde, hasta
+
+def version_solicitada(request, pk):
+    """Versión con la que el cliente abrió la orden `pk` (cabecera If-Match o campo oculto 'version').
+    Retorna None si el cliente no envió ninguna (no se valida) y -1 si el ETag no es de esta orden."""
+    if_match = request.headers.get('If-Match', '').strip()
+    if if_match:
+        if if_match == '*':
+            return None
+        # Formato del ETag: "<pk>-<version>"
+        orden, _, version = if_match.removeprefix('W/').strip('"').rpartition('-')
+        if orden != str(pk) or not version.isdigit():
+            return -1
+        return int(version)
+    try:
+        return int(request.POST.get('version', ''))
+    except ValueError:
+        return None
+
+def diferencias_orden(actual, propuesta, form):
+    """Lista de campos donde la versión guardada y la enviada por el usuario no coinciden."""
+    diferencias = []
+    for campo in form.Meta.fields:
+        if campo in ('firma', 'estatus'):
+            continue
+        en_servidor = getattr(actual, campo)
+        enviado = getattr(propuesta, campo)
+        if (en_servidor or None) != (enviado or None):
+            diferencias.append({
+                'campo': campo,
+                'etiqueta': form.fields[campo].label or campo,
+                'servidor': '' if en_servidor is None else str(en_servidor),
+                'enviado': '' if enviado is None else str(enviado),
+            })
+    return diferencias
+
+def respuesta_conflicto(request, actual, diferencias, ctx):
+    """Responde a una edición hecha sobre una versión vieja de la orden, sin sobrescribir nada."""
+    if request.headers.get('If-Match') or 'application/json' in request.headers.get('Accept', ''):
+        status = 412 if request.headers.get('If-Match') else 409
+        response = JsonResponse({
+            'error': 'conflicto',
+            'version_actual': actual.version,
+            'diferencias': diferencias,
+        }, status=status)
+        response['ETag'] = actual.etag
+        return response
+
+    messages.error(request, "⚠️ Otra persona guardó cambios en esta orden mientras la editabas. Revisa las diferencias antes de volver a guardar.")
+    # Si el usuario vuelve a guardar, sobrescribe conscientemente la versión actual
+    ctx['version_form'] = actual.version
+    ctx['conflicto'] = diferencias
+    return render(request, "orders/order_form.html", ctx, status=409)
+
 
 # ================================================================
 # DASHBOARD (CEREBRO DEL SISTEMA)
@@ -123,6 +206,12 @@ def dashboard_view(request):
     # Muestra las últimas 5 que han entrado al sistema.
     recientes = ServiceOrder.objects.all().order_by('-creado')[:5]
 
+    # 6. EQUIPOS EN RESGUARDO (conteo sobre el índice parcial de abiertos)
+    en_resguardo = ShelterEquipment.objects.filter(estado='en_resguardo').count()
+
+    # 7. TENDENCIAS (solo lee los resúmenes diarios, no recorre las órdenes)
+    tendencias = resumenes.tendencias()
+
     context = {
         'total': total,
         'pendientes': pendientes,
@@ -130,6 +219,8 @@ def dashboard_view(request):
         'mis_asignadas': mis_asignadas,
         'nombre_busqueda': criterio_busqueda, # Esta será 0 si nadie te ha asignado nada a ti "Carlos"
         'recientes': recientes,
+        'tendencias': tendencias,
+        'en_resguardo': en_resguardo,
     }
     return render(request, 'orders/dashboard.html', context)
 
@@ -138,8 +229,8 @@ def dashboard_view(request):
 # VISTAS DE ÓRDENES (CRUD)
 # ================================================================
 
-@login_required
-def order_list(request):
+def ordenes_filtradas(request):
+    """Queryset de órdenes con los filtros GET de la lista (lo comparten order_list y order_export)."""
     orders = ServiceOrder.objects.all().order_by('-creado')
 
     # Filtros
@@ -147,8 +238,14 @@ def order_list(request):
     filtro_empresa = request.GET.get('empresa')
     filtro_estatus = request.GET.get('estatus')
     filtro_ingeniero = request.GET.get('ingeniero')
+    filtro_tipo = request.GET.get('tipo')
+    if filtro_tipo not in dict(SERVICE_TYPES):
+        filtro_tipo = None
     fecha_inicio = request.GET.get('fecha_inicio')
     fecha_fin = request.GET.get('fecha_fin')
+    campo_fecha = request.GET.get('campo_fecha')
+    if campo_fecha not in CAMPOS_FECHA:
+        campo_fecha = 'creado'
 
     if query:
         orders = orders.filter(
@@ -164,10 +261,35 @@ def order_list(request):
         orders = orders.filter(estatus=filtro_estatus)
     if filtro_ingeniero:
         orders = orders.filter(ingeniero_nombre__icontains=filtro_ingeniero)
-    if fecha_inicio:
-        orders = orders.filter(creado__date__gte=fecha_inicio) 
-    if fecha_fin:
-        orders = orders.filter(creado__date__lte=fecha_fin)
+    if filtro_tipo:
+        # tipos_servicio @> ARRAY[...]: lo resuelve el índice GIN
+        orders = orders.filter(tipos_servicio__contains=[filtro_tipo])
+    # Rango semiabierto [desde, hasta) sobre la columna directa para que use el índice
+    # (creado__date envuelve la columna en un CAST y obliga a un Seq Scan)
+    if campo_fecha == 'fecha_servicio':
+        orders = orders.order_by('-fecha_servicio', '-creado')
+    desde, hasta = rango_fechas(fecha_inicio, fecha_fin, campo_fecha)
+    if desde:
+        orders = orders.filter(**{f'{campo_fecha}__gte': desde})
+    if hasta:
+        orders = orders.filter(**{f'{campo_fecha}__lt': hasta})
+
+    filtros = {
+        'query': query,
+        'filtro_empresa': filtro_empresa,
+        'filtro_estatus': filtro_estatus,
+        'filtro_ingeniero': filtro_ingeniero,
+        'filtro_tipo': filtro_tipo,
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'campo_fecha': campo_fecha,
+    }
+    return orders, filtros
+
+
+@login_required
+def order_list(request):
+    orders, filtros = ordenes_filtradas(request)
 
     # Listas para selects de filtro
     empresas = ServiceOrder.objects.exclude(cliente_nombre__isnull=True).exclude(cliente_nombre__exact='').values_list('cliente_nombre', flat=True).distinct().order_by('cliente_nombre')
@@ -178,20 +300,56 @@ def order_list(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
+    # La paginación conserva todos los filtros (antes solo 'q')
+    filtros_qs = request.GET.copy()
+    filtros_qs.pop('page', None)
+
+    # ?borrado=<trabajo> tras un borrado masivo; un id que no es uuid se ignora (no revienta el reverse)
+    borrado_url = None
+    if request.user.is_superuser and request.GET.get('borrado'):
+        try:
+            trabajo = uuid.UUID(request.GET['borrado']).hex
+        except ValueError:
+            pass
+        else:
+            borrado_url = reverse('orders:bulk_delete_progress', args=[trabajo])
+
     ctx = {
         'page_obj': page_obj, 
-        'query': query,
+        'filtros_qs': filtros_qs.urlencode(),
+        'borrado_url': borrado_url,
+        'version_filas': versiones.actual(versiones.FILAS_LISTA),
         'empresas': empresas,
         'ingenieros_list': ingenieros_list,
-        'filtro_empresa': filtro_empresa,
-        'filtro_estatus': filtro_estatus,
-        'filtro_ingeniero': filtro_ingeniero,
-        'fecha_inicio': fecha_inicio,
-        'fecha_fin': fecha_fin,       
-        'STATUS_CHOICES': ServiceOrder.STATUS_CHOICES 
+        'STATUS_CHOICES': ServiceOrder.STATUS_CHOICES,
+        'SERVICE_TYPES': SERVICE_TYPES,
+        **filtros,
     }
     return render(request, 'orders/order_list.html', ctx)
 
+
+@login_required
+def order_export(request):
+    """La lista filtrada completa en CSV (?formato=csv) o Excel (?formato=xlsx), en streaming."""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in ('csv', 'xlsx'):
+        raise Http404("Formato de exportación no soportado")
+
+    orders, _ = ordenes_filtradas(request)
+    filas = exportacion.filas(orders)
+    if formato == 'xlsx':
+        response = StreamingHttpResponse(
+            exportacion.xlsx_streaming(filas),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    else:
+        response = StreamingHttpResponse(exportacion.csv_streaming(filas), content_type='text/csv; charset=utf-8')
+
+    nombre = f"ordenes-{timezone.localtime():%Y%m%d-%H%M}.{formato}"
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
 @login_required
 def order_detail(request, pk):
     order = get_object_or_404(ServiceOrder, pk=pk)
@@ -247,7 +405,7 @@ def order_create(request):
                 mensaje_exito = f"Orden {order.folio} FINALIZADA correctamente."
             else:
                 order.estatus = 'borrador'
-                mensaje_exito = f"Borrador guardado."
+                mensaje_exito = "Borrador guardado."
 
             # Firma Cliente
             firma_b64 = (request.POST.get("firma_b64") or "").strip()
@@ -300,6 +458,7 @@ def order_create(request):
 # ===== EDITAR ORDEN =====
 @login_required
 @user_passes_test(es_ingeniero_o_admin)
+@transaction.atomic
 def order_update(request, pk):
     order = get_object_or_404(ServiceOrder, pk=pk)
     # --- BLOQUEO DE SEGURIDAD INTELIGENTE ---
@@ -316,7 +475,22 @@ def order_update(request, pk):
         evidencias_fs = ServiceEvidenceFormSet(request.POST, request.FILES, instance=order, prefix="evidencias")
 
         if form.is_valid() and equipos_fs.is_valid() and materiales_fs.is_valid() and resguardos_fs.is_valid() and evidencias_fs.is_valid():
+            # --- CONTROL DE CONCURRENCIA ---
+            # Bloqueo corto solo mientras se guarda; nadie queda bloqueado mientras edita.
+            actual = ServiceOrder.objects.select_for_update().get(pk=pk)
+            version_cliente = version_solicitada(request, pk)
+            if version_cliente is not None and version_cliente != actual.version:
+                ctx = {
+                    "form": form, "equipos_fs": equipos_fs, "materiales_fs": materiales_fs,
+                    "resguardos_fs": resguardos_fs, "evidencias_fs": evidencias_fs,
+                    "titulo": f"Editar Orden {actual.folio}"
+                }
+                return respuesta_conflicto(request, actual, diferencias_orden(actual, form.instance, form), ctx)
+            # -------------------------------
+
             order = form.save(commit=False)
+            # `order` se leyó antes del bloqueo: se guarda sobre la versión actual, no sobre la que leyó
+            order.version = actual.version
             accion = request.POST.get('accion', 'borrador')
 
             if accion == 'finalizar':
@@ -331,7 +505,8 @@ def order_update(request, pk):
                     ctx = {
                         "form": form, "equipos_fs": equipos_fs, "materiales_fs": materiales_fs,
                         "resguardos_fs": resguardos_fs, "evidencias_fs": evidencias_fs,
-                        "titulo": f"Editar Orden {order.folio}"
+                        "titulo": f"Editar Orden {order.folio}",
+                        "version_form": request.POST.get('version'),
                     }
                     return render(request, "orders/order_form.html", ctx)
 
@@ -339,7 +514,7 @@ def order_update(request, pk):
                 mensaje = f"Orden {order.folio} FINALIZADA."
             else:
                 order.estatus = 'borrador'
-                mensaje = f"Cambios guardados."
+                mensaje = "Cambios guardados."
 
             firma_b64 = (request.POST.get("firma_b64") or "").strip()
             if firma_b64.startswith("data:image"):
@@ -379,9 +554,13 @@ def order_update(request, pk):
         "form": form,
         "equipos_fs": equipos_fs, "materiales_fs": materiales_fs,
         "resguardos_fs": resguardos_fs, "evidencias_fs": evidencias_fs,
-        "titulo": f"Editar Orden {order.folio}"
+        "titulo": f"Editar Orden {order.folio}",
+        # Al re-mostrar un POST con errores se conserva la versión con la que se abrió
+        "version_form": request.POST.get('version'),
     }
-    return render(request, "orders/order_form.html", ctx)
+    response = render(request, "orders/order_form.html", ctx)
+    response['ETag'] = order.etag
+    return response
 
 
 # ===== ELIMINAR ORDENES =====
@@ -394,12 +573,33 @@ def bulk_delete(request):
         messages.warning(request, "No seleccionaste ninguna orden.")
         return redirect("orders:list")
 
-    qs = ServiceOrder.objects.filter(id__in=ids)
-    count = qs.count()
-    qs.delete()
+    ids = [i for i in ids if str(i).isdigit()]
+
+    # Una página de la lista cabe en un lote: se borra aquí mismo
+    if len(ids) <= borrado.LOTE:
+        count = borrado.borrar_ordenes(ids)
+        messages.success(request, f"Se eliminaron {count} órdenes correctamente.")
+        return redirect("orders:list")
 
-    messages.success(request, f"Se eliminaron {count} órdenes correctamente.")
-    return redirect("orders:list")
+    # Selecciones grandes: por lotes, la lista los va pidiendo y mostrando el avance
+    trabajo = borrado.iniciar_borrado(ids)
+    messages.info(request, f"Eliminando {len(ids)} órdenes por lotes, no cierres la página...")
+    return redirect(f"{reverse('orders:list')}?borrado={trabajo}")
+
+
+@login_required
+@user_passes_test(es_superusuario)
+def bulk_delete_progress(request, trabajo):
+    # GET solo consulta; POST (la lista, en cadena) borra el siguiente lote
+    if request.method == "POST":
+        estado = borrado.avanzar(trabajo)
+    else:
+        estado = borrado.progreso(trabajo)
+    if estado is None:
+        raise Http404("Trabajo de borrado desconocido")
+    response = JsonResponse(estado)
+    patch_cache_control(response, no_store=True)
+    return response
 
 
 # ===== ENVIAR CORREO =====
@@ -420,7 +620,7 @@ def email_order(request, pk):
     survey_link = "https://www.cognitoforms.com/INOVATECH1/EncuestaDeServicio"
 
     try:
-        import weasyprint
+        from . import documentos
         import smtplib
         import ssl
         from email.mime.multipart import MIMEMultipart
@@ -433,10 +633,7 @@ def email_order(request, pk):
             'firma_ingeniero_url': firma_ingeniero_url 
         }, request=request)
 
-        pdf_bytes = weasyprint.HTML(
-            string=html_string,
-            base_url=request.build_absolute_uri()
-        ).write_pdf()
+        pdf_bytes = documentos.generar_pdf(html_string, request.build_absolute_uri())
 
         # Configuración SMTP
         smtp_server = settings.EMAIL_HOST
@@ -488,27 +685,441 @@ def email_order(request, pk):
     return redirect('orders:detail', pk=pk)
 
 #----------preview order 
-def order_preview(request, pk):
-    try:
-        # Usamos el modelo correcto: ServiceOrder
-        orden = ServiceOrder.objects.get(pk=pk)
-        
-        # Renderizamos el template chiquito para el panel lateral
-        return render(request, 'orders/partials/order_preview.html', {'orden': orden})
+# Solo lo que pinta el panel lateral: una consulta, sin relaciones
+CAMPOS_PREVIEW = ('folio', 'titulo', 'cliente_nombre', 'estatus', 'creado', 'actualizado',
+                  'ingeniero_nombre', 'actividades')
 
-    except ServiceOrder.DoesNotExist:
+@login_required
+def order_preview(request, pk):
+    """
+    Vista rápida del panel lateral (order_list y memory_selection): fragmento HTML,
+    o JSON con ?formato=json. El ETag sale de `actualizado`, así que el navegador
+    la guarda un minuto y después solo revalida (304) hasta que la orden cambie.
+    """
+    orden = ServiceOrder.objects.only(*CAMPOS_PREVIEW).filter(pk=pk).first()
+    if orden is None:
         # Si la orden no existe (ej. ID incorrecto)
         return HttpResponse(
             "<div class='p-4 text-danger text-center'>Error: Orden no encontrada.</div>", 
             status=404
         )
-        
-    except Exception as e:
-        # Error general
-        return HttpResponse(
-            f"<div class='p-4 text-danger'>Error interno: {str(e)}</div>", 
-            status=500
+
+    como_json = request.GET.get('formato') == 'json'
+    etag = f'"prev-{orden.pk}-{orden.actualizado.timestamp():.6f}{"-json" if como_json else ""}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if como_json:
+            response = JsonResponse({
+                'id': orden.pk,
+                'folio': orden.folio,
+                'titulo': orden.titulo,
+                'cliente': orden.cliente_nombre,
+                'estatus': orden.estatus,
+                'estatus_texto': orden.get_estatus_display(),
+                'creado': orden.creado.isoformat(),
+                'ingeniero': orden.ingeniero_nombre,
+                'actividades': orden.actividades,
+                'url_detalle': reverse('orders:detail', args=[orden.pk]),
+            })
+        else:
+            # Renderizamos el template chiquito para el panel lateral
+            response = render(request, 'orders/partials/order_preview.html', {'orden': orden})
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+# ================================================================
+# ARCHIVOS MEDIA (EVIDENCIAS Y FIRMAS) CON SESIÓN
+# ================================================================
+
+RANGO_BYTES = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class ArchivoParcial:
+    """Lee solo `restantes` bytes de un archivo ya posicionado (respuestas 206)."""
+
+    def __init__(self, archivo, restantes, bloque=64 * 1024):
+        self.archivo, self.restantes, self.bloque = archivo, restantes, bloque
+
+    def __iter__(self):
+        try:
+            while self.restantes > 0:
+                datos = self.archivo.read(min(self.bloque, self.restantes))
+                if not datos:
+                    break
+                self.restantes -= len(datos)
+                yield datos
+        finally:
+            self.archivo.close()
+
+
+def rango_solicitado(request, tamano, etag):
+    """(inicio, fin) del encabezado Range, None si se manda completo, False si no se puede cumplir."""
+    encabezado = request.headers.get('Range', '')
+    m = RANGO_BYTES.match(encabezado.strip())
+    if not m or request.method != 'GET':
+        return None  # sin Range, o varios rangos: se manda todo
+    # If-Range con otra versión del archivo: se manda completo
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+    inicio, fin = m.groups()
+    if inicio == '':
+        # "bytes=-500": los últimos 500
+        if fin == '' or int(fin) == 0:
+            return False
+        inicio, fin = max(tamano - int(fin), 0), tamano - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+@login_required
+def media_protegida(request, ruta):
+    """
+    Sirve /media/ (evidencias, firmas) solo con sesión iniciada. Soporta GET condicional
+    (ETag/Last-Modified -> 304) y rangos (206). Con MEDIA_SERVIDOR el envío lo hace
+    nginx (X-Accel-Redirect) o Apache (X-Sendfile) y el worker queda libre al instante.
+    """
+    try:
+        ruta_absoluta = default_storage.path(ruta)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(ruta_absoluta):
+        raise Http404
+
+    info = os.stat(ruta_absoluta)
+    etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+    tipo = mimetypes.guess_type(ruta_absoluta)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+    if response is None:
+        servidor = settings.MEDIA_SERVIDOR
+        if servidor == 'nginx':
+            # nginx resuelve rangos y condicionales por su cuenta
+            response = HttpResponse(content_type=tipo)
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(ruta)
+        elif servidor == 'apache':
+            response = HttpResponse(content_type=tipo)
+            response['X-Sendfile'] = ruta_absoluta
+        else:
+            rango = rango_solicitado(request, info.st_size, etag)
+            if rango is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{info.st_size}'
+            elif rango:
+                inicio, fin = rango
+                archivo = open(ruta_absoluta, 'rb')
+                archivo.seek(inicio)
+                response = StreamingHttpResponse(ArchivoParcial(archivo, fin - inicio + 1), status=206,
+                                                 content_type=tipo)
+                response['Content-Range'] = f'bytes {inicio}-{fin}/{info.st_size}'
+                response['Content-Length'] = fin - inicio + 1
+            else:
+                # FileResponse usa wsgi.file_wrapper: gunicorn lo manda con sendfile()
+                response = FileResponse(open(ruta_absoluta, 'rb'), content_type=tipo)
+        response['Accept-Ranges'] = 'bytes'
+        response['Last-Modified'] = http_date(info.st_mtime)
+
+    response['ETag'] = etag
+    if es_por_contenido(ruta):
+        # El nombre es el SHA-256 del contenido: nunca cambia
+        patch_cache_control(response, private=True, max_age=31536000, immutable=True)
+    else:
+        patch_cache_control(response, private=True, max_age=3600)
+    return response
+
+# ================================================================
+# ACTIVOS (HISTORIAL POR NÚMERO DE SERIE)
+# ================================================================
+
+@login_required
+def asset_list(request):
+    """Búsqueda por serie (prefijo); si solo un activo coincide, va directo a su historial."""
+    query = request.GET.get('q', '').strip()
+    resultados = activos.buscar(query)
+    if query:
+        primeros = list(resultados[:2])
+        if len(primeros) == 1:
+            return redirect('orders:asset_detail', pk=primeros[0].pk)
+
+    page_obj = Paginator(resultados, 20).get_page(request.GET.get('page'))
+    return render(request, 'orders/asset_list.html', {'page_obj': page_obj, 'query': query})
+
+
+@login_required
+def asset_detail(request, pk):
+    """Todo lo que se le ha hecho a un equipo: sus filas de Equipment con la orden, en un solo JOIN."""
+    asset = get_object_or_404(Asset, pk=pk)
+    equipos = (
+        Equipment.objects.filter(asset=asset).select_related('order')
+        .only('marca', 'modelo', 'serie', 'descripcion', 'order__folio', 'order__fecha_servicio',
+              'order__creado', 'order__cliente_nombre', 'order__ingeniero_nombre', 'order__titulo',
+              'order__tipos_servicio', 'order__estatus')
+        .order_by('-order__fecha_servicio', '-order__creado')
+    )
+    return render(request, 'orders/asset_detail.html', {'asset': asset, 'equipos': equipos})
+
+
+@login_required
+@user_passes_test(es_ingeniero_o_admin)
+def asset_autocomplete(request):
+    """Sugerencias para el campo Serie del formset de equipos (?q=prefijo)."""
+    query = request.GET.get('q', '')
+    resultados = []
+    if len(activos.normalizar(query)) >= 2:
+        resultados = list(activos.buscar(query).values('id', 'serie', 'marca', 'modelo', 'cliente_nombre')[:10])
+    response = JsonResponse({'resultados': resultados})
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+
+# ================================================================
+# CATÁLOGO Y CONSUMO DE MATERIALES
+# ================================================================
+
+@login_required
+def material_list(request):
+    """El catálogo con lo consumido de cada pieza; con ?q= busca por parecido (trigramas)."""
+    query = request.GET.get('q', '').strip()
+    catalogo = materiales.sugerir(query) if query else Material.objects.order_by('descripcion')
+    catalogo = catalogo.annotate(piezas=Coalesce(Sum('consumos__cantidad'), 0), lineas=Count('consumos'))
+    page_obj = Paginator(catalogo, 30).get_page(request.GET.get('page'))
+    return render(request, 'orders/material_list.html', {'page_obj': page_obj, 'query': query})
+
+
+@login_required
+@user_passes_test(es_superusuario)
+@require_POST
+def material_sku(request, pk):
+    """Asigna (o quita) el SKU de una pieza del catálogo."""
+    material = get_object_or_404(Material, pk=pk)
+    material.sku = request.POST.get('sku', '').strip()[:Material._meta.get_field('sku').max_length]
+    try:
+        with transaction.atomic():
+            material.save(update_fields=['sku'])
+    except IntegrityError:
+        messages.error(request, f"El SKU {material.sku} ya está asignado a otra pieza.")
+    else:
+        messages.success(request, f"SKU de «{material.descripcion}» actualizado.")
+    query = request.POST.get('q', '').strip()
+    return redirect(reverse('orders:material_list') + (f'?q={quote(query)}' if query else ''))
+
+
+@login_required
+@user_passes_test(es_ingeniero_o_admin)
+def material_autocomplete(request):
+    """Sugerencias para la descripción del formset de materiales (?q=texto)."""
+    query = request.GET.get('q', '')
+    resultados = []
+    if len(materiales.normalizar(query)) >= 2:
+        resultados = list(materiales.sugerir(query).values('id', 'descripcion', 'sku')[:10])
+    response = JsonResponse({'resultados': resultados})
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+
+def _mes_solicitado(valor, omision):
+    """'2026-03' -> date(2026, 3, 1); `omision` si no viene o no es válido."""
+    try:
+        return datetime.strptime(valor, '%Y-%m').date()
+    except (TypeError, ValueError):
+        return omision
+
+
+@login_required
+def material_consumo(request):
+    """Piezas consumidas por mes (?desde=AAAA-MM&hasta=AAAA-MM&cliente=), para conciliar inventario."""
+    hasta = _mes_solicitado(request.GET.get('hasta'), timezone.localdate().replace(day=1))
+    desde = _mes_solicitado(request.GET.get('desde'), materiales.sumar_meses(hasta, -5))  # seis meses
+    # Entre un mes y dos años por pantalla
+    desde = max(min(desde, hasta), materiales.sumar_meses(hasta, -23))
+    filtro_cliente = request.GET.get('cliente', '').strip()
+
+    reporte = materiales.consumo_mensual(desde, hasta, filtro_cliente)
+    empresas = ServiceOrder.objects.exclude(cliente_nombre__isnull=True).exclude(cliente_nombre__exact='').values_list('cliente_nombre', flat=True).distinct().order_by('cliente_nombre')
+    return render(request, 'orders/material_consumo.html', {
+        **reporte,
+        'totales': [sum(col) for col in zip(*(f['por_mes'] for f in reporte['filas']))],
+        'desde': desde,
+        'hasta': hasta,
+        'filtro_cliente': filtro_cliente,
+        'empresas': empresas,
+    })
+
+
+# ================================================================
+# EQUIPOS EN RESGUARDO (CUSTODIA)
+# ================================================================
+
+@login_required
+def equipos_en_resguardo(request):
+    """Lo que seguimos custodiando, agrupado por cliente. Todo sale de resguardo_abierto_idx."""
+    abiertos = ShelterEquipment.objects.filter(estado='en_resguardo')
+    filtro_cliente = request.GET.get('cliente', '').strip()
+
+    resguardos = abiertos.select_related('order').only(
+        'cantidad', 'descripcion', 'comentarios', 'order__folio', 'order__cliente_nombre',
+        'order__fecha_servicio', 'order__creado', 'order__ingeniero_nombre',
+    ).order_by('order__cliente_nombre', 'order__fecha_servicio', 'pk')
+    if filtro_cliente:
+        resguardos = resguardos.filter(order__cliente_nombre=filtro_cliente)
+    page_obj = Paginator(resguardos, 50).get_page(request.GET.get('page'))
+
+    # Partidas y piezas por cliente (selector y totales), una consulta agrupada
+    por_cliente = list(abiertos.values('order__cliente_nombre')
+                       .annotate(partidas=Count('pk'), piezas=Sum(Coalesce('cantidad', 1)))
+                       .order_by('order__cliente_nombre'))
+
+    return render(request, 'orders/resguardos.html', {
+        'page_obj': page_obj,
+        'por_cliente': por_cliente,
+        'total_partidas': sum(fila['partidas'] for fila in por_cliente),
+        'filtro_cliente': filtro_cliente,
+        'hoy': timezone.localdate(),
+    })
+
+
+@login_required
+@user_passes_test(es_ingeniero_o_admin)
+@require_POST
+def resguardos_devolver(request):
+    """Cierra la custodia de los resguardos marcados (opcionalmente ligados a la orden de entrega)."""
+    ids = [int(i) for i in request.POST.getlist('ids') if i.isdigit()]
+    filtro_cliente = request.POST.get('cliente', '')
+    destino = reverse('orders:resguardos') + (f'?cliente={quote(filtro_cliente)}' if filtro_cliente else '')
+    if not ids:
+        messages.warning(request, "No seleccionaste ningún equipo.")
+        return redirect(destino)
+
+    texto_fecha = request.POST.get('fecha_devolucion', '').strip()
+    try:
+        # parse_date regresa None si no tiene forma de fecha y truena si no existe (2026-02-30)
+        fecha = parse_date(texto_fecha) if texto_fecha else timezone.localdate()
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        messages.error(request, f"La fecha {texto_fecha} no es válida; no se registró la devolución.")
+        return redirect(destino)
+    folio = request.POST.get('folio_devolucion', '').strip().upper()
+    orden = None
+    if folio:
+        orden = ServiceOrder.objects.filter(folio=folio).only('pk').first()
+        if orden is None:
+            messages.error(request, f"No existe la orden {folio}; no se registró la devolución.")
+            return redirect(destino)
+
+    devueltos = ShelterEquipment.objects.filter(pk__in=ids, estado='en_resguardo').update(
+        estado='devuelto', fecha_devolucion=fecha, orden_devolucion=orden, actualizado=timezone.now(),
+    )
+    messages.success(request, f"{devueltos} equipo(s) marcados como devueltos el {fecha:%d/%m/%Y}.")
+    return redirect(destino)
+
+
+# ================================================================
+# AGENDA DE VISITAS REAGENDADAS
+# ================================================================
+
+@login_required
+@user_passes_test(es_ingeniero_o_admin)
+def agenda_semana(request):
+    """
+    Visitas reagendadas de una semana (?semana=AAAA-MM-DD, cualquier día de ella).
+    ?ingeniero=<nombre> o ?ingeniero=todos; por omisión, las del usuario.
+    """
+    hoy = timezone.localdate()
+    try:
+        fecha = parse_date(request.GET.get('semana') or '') or hoy
+    except ValueError:
+        fecha = hoy
+    inicio = agenda.lunes(fecha)
+
+    filtro_ingeniero = request.GET.get('ingeniero', '').strip()
+    if not filtro_ingeniero:
+        nombres = agenda.nombres_de(request.user)
+    elif filtro_ingeniero == 'todos':
+        nombres = None
+    else:
+        nombres = [filtro_ingeniero]
+
+    dias = [{'fecha': inicio + timedelta(days=n), 'visitas': []} for n in range(7)]
+    for orden in agenda.visitas(inicio, inicio + timedelta(days=7), nombres):
+        dias[(orden.reagenda_fecha - inicio).days]['visitas'].append(orden)
+
+    calendario_url = request.build_absolute_uri(reverse('orders:agenda_ics', args=[agenda.token(request.user)]))
+    return render(request, 'orders/agenda.html', {
+        'dias': dias,
+        'total': sum(len(dia['visitas']) for dia in dias),
+        'inicio': inicio,
+        'fin': inicio + timedelta(days=6),
+        'anterior': inicio - timedelta(days=7),
+        'siguiente': inicio + timedelta(days=7),
+        'hoy': hoy,
+        'filtro_ingeniero': filtro_ingeniero,
+        'ingenieros': agenda.ingenieros(),
+        'calendario_url': calendario_url,
+        'calendario_webcal': 'webcal://' + calendario_url.split('://', 1)[1],
+    })
+
+
+def agenda_calendario(request, token):
+    """
+    Calendario .ics con las visitas reagendadas del dueño del token (los clientes de
+    calendario no tienen sesión). Mientras no cambie ninguna orden, If-None-Match -> 304
+    sin consultar órdenes.
+    """
+    user = agenda.usuario_del_token(token)
+    if user is None:
+        raise Http404
+
+    hoy = timezone.localdate()
+    etag = agenda.etag(user, hoy)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        contenido = agenda.calendario(
+            user, hoy, etag,
+            url_orden=lambda orden: request.build_absolute_uri(reverse('orders:detail', args=[orden.pk])),
+            dominio=request.get_host().split(':')[0],
         )
+        response = HttpResponse(contenido, content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="reagendas.ics"'
+    response['ETag'] = etag
+    # no-cache: el cliente siempre revalida (y casi siempre recibe un 304)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# ================================================================
+# MÉTRICAS DE RENDIMIENTO
+# ================================================================
+
+@login_required
+@user_passes_test(es_superusuario)
+def metricas_view(request):
+    """Acumulados por vista de este worker (los llena MetricasMiddleware)."""
+    if request.method == "POST":
+        metricas.reiniciar()
+        messages.info(request, "Métricas reiniciadas.")
+        return redirect('orders:metricas')
+    return render(request, 'orders/metricas.html', {
+        'filas': metricas.resumen(),
+        'componentes': metricas.COMPONENTES,
+        'umbral_ms': getattr(settings, 'SLOW_REQUEST_MS', 1000),
+    })
+
+def metricas_prometheus(request):
+    """Formato de texto Prometheus. Acceso: superusuario o 'Authorization: Bearer <METRICS_TOKEN>'."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    autorizado = es_superusuario(request.user) or (
+        token and constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}")
+    )
+    if not autorizado:
+        return HttpResponse("No autorizado", status=403, content_type="text/plain")
+    return HttpResponse(metricas.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 # ================================================================
 # GESTIÓN DE USUARIOS
@@ -615,47 +1226,6 @@ def logout_view(request):
 
 
 
-# ================================================================
-# AUXILIARES PARA EL WORD (DISEÑO CORPORATIVO)
-# ================================================================
-
-def add_page_number(run):
-    """Inserta numeración dinámica 'Página X'."""
-    fldChar = OxmlElement('w:fldChar')
-    fldChar.set(qn('w:fldCharType'), 'begin')
-    run._r.append(fldChar)
-    instrText = OxmlElement('w:instrText')
-    instrText.set(qn('xml:space'), 'preserve')
-    instrText.text = "PAGE"
-    run._r.append(instrText)
-    fldChar = OxmlElement('w:fldChar')
-    fldChar.set(qn('w:fldCharType'), 'end')
-    run._r.append(fldChar)
-
-def add_table_of_contents(paragraph):
-    """Inserta el código de campo para el Índice Automático (TOC)."""
-    run = paragraph.add_run()
-    fldChar = OxmlElement('w:fldChar')
-    fldChar.set(qn('w:fldCharType'), 'begin')
-    run._r.append(fldChar)
-    instrText = OxmlElement('w:instrText')
-    instrText.set(qn('xml:space'), 'preserve')
-    instrText.text = 'TOC \\o "1-3" \\h \\z \\u'
-    run._r.append(instrText)
-    fldChar = OxmlElement('w:fldChar')
-    fldChar.set(qn('w:fldCharType'), 'end')
-    run._r.append(fldChar)
-
-def add_formatted_text(paragraph, text):
-    """Parsea negritas (**) para aplicarlas en el Word."""
-    parts = re.split(r'(\*\*.*?\*\*)', text)
-    for part in parts:
-        if part.startswith('**') and part.endswith('**'):
-            run = paragraph.add_run(part.replace('**', ''))
-            run.bold = True
-        else:
-            paragraph.add_run(part)
-
 # ================================================================
 # VISTA 1: SELECCIÓN (RESTAURADA PARA EVITAR ATTRIBUTEERROR)
 # ================================================================
@@ -702,18 +1272,9 @@ def memory_preview_view(request):
     cliente_raw = ordenes.first().cliente_nombre
     cliente_busqueda = cliente_raw.strip()
 
-    # Generación con IA (gemini-flash-latest)
-    contexto = "".join([f"\n[FOLIO {o.folio}] Actividades: {o.actividades}." for o in ordenes])
-    prompt = f"Actúa como Consultor Senior. Redacta una MEMORIA TÉCNICA para {cliente_busqueda}. Usa Markdown. Datos: {contexto}"
-    
-    try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        response = client.models.generate_content(model="gemini-flash-latest", contents=prompt)
-        texto_ia = response.text if response.text else "Redacte manualmente."
-    except Exception:
-        texto_ia = "Error de conexión con Gemini."
-
-    texto_html = markdown.markdown(texto_ia)
+    # Generación con IA (gemini-flash-latest); el SDK se carga en el primer uso
+    from .ia import redactar_memoria
+    texto_html = redactar_memoria(cliente_busqueda, ordenes)
 
     # Persistencia v1
     memoria_db = TechnicalMemory.objects.create(
@@ -768,309 +1329,28 @@ def memory_download_view(request):
     except: 
         return redirect('orders:memory_select')
 
-    document = Document()
-
-    # --- ENCABEZADO Y PIE (Logo Inova y Páginas) ---
-    section = document.sections[0]
-    header_para = section.header.paragraphs[0]
-    header_para.alignment = 2 # Derecha
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'orders', 'inovatech-logo.png')
-    if os.path.exists(logo_path):
-        header_para.add_run().add_picture(logo_path, width=Inches(1.0))
-
-    footer_para = section.footer.paragraphs[0]
-    footer_para.alignment = 1 # Centro
-    footer_para.add_run("Página ")
-    add_page_number(footer_para.add_run())
-
-    # --- PORTADA (RESTAURADA SEGÚN TU DISEÑO) ---
-    meses_es = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
-    mes_es = meses_es[timezone.now().month - 1]
-    
-    document.add_paragraph("\n" * 4)
-    p_titulo = document.add_paragraph()
-    p_titulo.alignment = 1
-    run_t = p_titulo.add_run("MEMORIA TÉCNICA")
-    run_t.bold = True; run_t.font.size = Pt(28); run_t.font.color.rgb = RGBColor(31, 78, 120)
-
-    document.add_paragraph("\n" * 2)
-    p_cliente = document.add_paragraph()
-    p_cliente.alignment = 1
-    run_c = p_cliente.add_run(memoria.cliente_nombre.upper())
-    run_c.bold = True; run_c.font.size = Pt(22)
-    
-    p_sub = document.add_paragraph("Servicio de Ingeniería y Soporte Técnico")
-    p_sub.alignment = 1; p_sub.runs[0].font.size = Pt(14)
-
-    document.add_paragraph("\n" * 7)
-    p_empresa = document.add_paragraph("IT SOLUCIONES DE INNOVACION TECNOLOGICA AVANZA SA DE CV")
-    p_empresa.alignment = 1; p_empresa.runs[0].bold = True
-    
-    p_loc = document.add_paragraph(f"Monterrey, N.L. México | {mes_es} {timezone.now().year}")
-    p_loc.alignment = 1
-    document.add_page_break()
-
-    # --- TABLAS DE CONTROL ---
-    document.add_heading('CONTROL DE DOCUMENTACIÓN', level=1)
-    table_info = document.add_table(rows=3, cols=2); table_info.style = 'Table Grid'
-    for i, (l, v) in enumerate([("Autor:", request.user.get_full_name() or request.user.username), ("Área:", "Ingeniería de IT"), ("Localidad:", "Monterrey, Nuevo León")]):
-        table_info.cell(i, 0).text = l; table_info.cell(i, 1).text = v
-
-    document.add_paragraph("\n")
-    document.add_heading('HISTORIAL DE VERSIONES', level=1)
-    table_hist = document.add_table(rows=2, cols=5); table_hist.style = 'Table Grid'
-    for i, h in enumerate(["Versión", "Fecha", "Nombre", "Estado", "Comentario"]): table_hist.cell(0, i).text = h
-    row = table_hist.rows[1].cells
-    row[0].text = "2.0" if memoria.contenido_v2_user else "1.0"
-    row[1].text = timezone.now().strftime("%d/%m/%Y"); row[2].text = tecnico
-    row[3].text = "Finalizado"; row[4].text = "Revisión y firma"
-    document.add_page_break()
-
-    # --- TABLA DE CONTENIDOS (REEMPLAZA AL ÍNDICE) ---
-    document.add_heading('TABLA DE CONTENIDOS', level=1)
-    add_table_of_contents(document.add_paragraph())
-    document.add_page_break()
-
-    # --- RESUMEN DEL SERVICIO ---
-    document.add_heading('RESUMEN DEL SERVICIO', level=1)
-    table_sum = document.add_table(rows=5, cols=2); table_sum.style = 'Table Grid'
-    resumen_data = [
-        ("Folio de Referencia:", orden_principal.folio if orden_principal else "N/A"),
-        ("Cliente:", memoria.cliente_nombre),
-        ("Ubicación del Servicio:", orden_principal.ubicacion if (orden_principal and orden_principal.ubicacion) else "No especificada"),
-        ("Fecha de Ejecución:", fecha_ejecucion),
-        ("Técnico Responsable:", tecnico)
-    ]
-    for i, (l, v) in enumerate(resumen_data):
-        table_sum.cell(i, 0).text = l; table_sum.cell(i, 1).text = str(v)
-    document.add_paragraph("\n")
-
-    # --- CUERPO TÉCNICO (Detección refinada de Títulos) ---
-    for line in texto_limpio.split('\n'):
-        line = line.strip()
-        if not line: continue
-        
-        # Regla: Solo números romanos I al X al inicio de línea son Heading 2
-        # Quitamos la regla de 'isupper' para que no tome textos normales como títulos
-        if re.match(r'^(I|II|III|IV|V|VI|VII|VIII|IX|X)\.\s', line):
-            document.add_heading(line, level=2)
-        # Regla: A., B., C. o 1., 2. son Heading 3
-        elif re.match(r'^([A-Z]|\d+)\.\s', line):
-            document.add_heading(line, level=3)
-        else:
-            p = document.add_paragraph(); p.alignment = 3
-            add_formatted_text(p, line)
-
-    # --- ANEXO FOTOGRÁFICO (ANTES DE ELABORO) ---
-    evidencias = []
-    for o in ordenes: evidencias.extend(o.evidencias.all())
-
-    if evidencias:
-        document.add_page_break()
-        document.add_heading('ANEXO FOTOGRÁFICO', level=1)
-        table_pics = document.add_table(rows=0, cols=2)
-        for i in range(0, len(evidencias), 2):
-            row_cells = table_pics.add_row().cells
-            for j in range(2):
-                if i + j < len(evidencias):
-                    ev = evidencias[i+j]
-                    if ev.archivo and os.path.exists(ev.archivo.path):
-                        p = row_cells[j].paragraphs[0]; p.alignment = 1
-                        try:
-                            run = p.add_run(); run.add_picture(ev.archivo.path, width=Inches(2.5))
-                            cap = row_cells[j].add_paragraph(f"Fig {i+j+1}. {ev.comentario or 'Evidencia'}")
-                            cap.alignment = 1; cap.runs[0].font.size = Pt(9)
-                        except: pass
-
-    # --- FIRMA (ELABORO) ---
-    document.add_page_break()
-    document.add_paragraph("\n" * 5)
-    f = document.add_paragraph("ELABORO:"); f.alignment = 1
-    f.add_run("\n" * 3 + f"{tecnico.upper()}\n").bold = True
-    f.add_run("Gerencia Técnica")
+    # python-docx se carga aquí (primer uso), no al arrancar el worker
+    from . import documentos
+    document = documentos.generar_memoria_word(
+        memoria, ordenes, orden_principal, texto_limpio,
+        request.user.get_full_name() or request.user.username, tecnico, fecha_ejecucion,
+    )
 
     response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
     response['Content-Disposition'] = f'attachment; filename="Memoria_{memoria.cliente_nombre.replace(" ", "_")}.docx"'
-    document.save(response)
+    with medir('docx'):
+        document.save(response)
     return response
 
-    # ================================================================
-# RESTAURACIÓN: FUNCIONES PARA WORD INDIVIDUAL (REPORTES CLÁSICOS)
-# ================================================================
-
-# --- Helpers para estilos de Word ---
-def set_cell_color(cell, color):
-    tc = cell._tc.get_or_add_tcPr()
-    shd = OxmlElement('w:shd')
-    shd.set(qn('w:fill'), color)
-    tc.append(shd)
-
-def make_header_blue(cell, text):
-    cell.text = ""; p = cell.paragraphs[0]; r = p.add_run(text)
-    r.bold = True; r.font.color.rgb = RGBColor(255,255,255); set_cell_color(cell, '1F4E78')
-
-def make_label_gray(cell, text):
-    cell.text = ""; p = cell.paragraphs[0]; r = p.add_run(text)
-    r.bold = True; r.font.size = Pt(9); r.font.color.rgb = RGBColor(0,0,0); set_cell_color(cell, 'F2F2F2')
-
-def set_value_text(cell, text):
-    cell.text = str(text) if text else "-"; cell.paragraphs[0].runs[0].font.size = Pt(9)
-
-def insert_signature(cell, title, img_field, name):
-    cell.text = ""; p = cell.paragraphs[0]; p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    if img_field:
-        try:
-            if hasattr(img_field, 'path') and os.path.exists(img_field.path):
-                p.add_run().add_picture(img_field.path, height=Inches(0.6))
-            elif isinstance(img_field, str) and os.path.exists(img_field):
-                p.add_run().add_picture(img_field, height=Inches(0.6))
-        except: pass
-    else: p.add_run("\n\n\n")
-    p.add_run("\n_______________________\n")
-    if name: p.add_run(str(name)+"\n").bold=True
-    p.add_run(title).font.size = Pt(7)
-
 @login_required
 def download_word(request, pk):
     order = get_object_or_404(ServiceOrder, pk=pk)
-    doc = Document()
-    
-    # Márgenes
-    s = doc.sections[0]
-    s.left_margin = s.right_margin = s.top_margin = s.bottom_margin = Inches(0.4)
-    w_total = s.page_width - s.left_margin - s.right_margin
-
-    # Encabezado con Logo
-    t = doc.add_table(rows=1, cols=3); t.autofit=False; t.alignment = WD_TABLE_ALIGNMENT.CENTER
-    t.columns[0].width = int(w_total*0.2)
-    t.columns[1].width = int(w_total*0.5)
-    t.columns[2].width = int(w_total*0.3)
-    
-    logo = os.path.join(settings.BASE_DIR, 'static', 'orders', 'inovatech-logo.png')
-    if os.path.exists(logo):
-        t.rows[0].cells[0].paragraphs[0].add_run().add_picture(logo, width=Inches(1.2))
-    
-    p = t.rows[0].cells[1].paragraphs[0]; p.alignment=1
-    r = p.add_run("ORDEN DE SERVICIO TÉCNICO"); r.bold=True; r.font.size=Pt(16); r.font.color.rgb=RGBColor(31,78,120)
-    
-    # Cuadro de Folio
-    tf = t.rows[0].cells[2].add_table(rows=2, cols=1); tf.alignment=2
-    tbl = tf._tbl; borders = OxmlElement('w:tblBorders')
-    for b in ['top','left','bottom','right','insideH']:
-        el = OxmlElement(f'w:{b}'); el.set(qn('w:val'),'single'); el.set(qn('w:sz'),'4'); borders.append(el)
-    tbl.tblPr.append(borders)
-    
-    tf.cell(0,0).paragraphs[0].add_run("FOLIO").bold=True
-    r = tf.cell(1,0).paragraphs[0].add_run(str(order.folio)); r.bold=True; r.font.color.rgb=RGBColor(192,0,0); r.font.size=Pt(12)
-    doc.add_paragraph()
-
-    # Tabla Principal
-    t = doc.add_table(rows=0, cols=4); t.style='Table Grid'
-    w1=int(w_total*0.15); w2=int(w_total*0.35)
-    for i in range(4): t.columns[i].width = w1 if i%2==0 else w2
-
-    # A. Info General
-    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " A. INFORMACIÓN GENERAL")
-    r=t.add_row(); make_label_gray(r.cells[0],"1. Cliente"); set_value_text(r.cells[1], order.cliente_nombre)
-    make_label_gray(r.cells[2],"2. Ubicación"); set_value_text(r.cells[3], order.ubicacion)
-    
-    r=t.add_row(); make_label_gray(r.cells[0],"3. Fecha"); set_value_text(r.cells[1], order.fecha_servicio)
-    make_label_gray(r.cells[2],"4. Contacto"); set_value_text(r.cells[3], order.cliente_contacto)
-
-    r=t.add_row(); make_label_gray(r.cells[0],"5. Tipo serv.")
-    bd = str(order.tipos_servicio).lower()
-    chk = lambda x: "☒" if x in bd else "☐"
-    txt = (f"{chk('instal')} Instalación   {chk('config')} Configuración\n"
-           f"{chk('mantenim')} Mantenimiento   {chk('garant')} Garantía\n"
-           f"{chk('revis')} Falla/Revisión   {chk('capacit')} Capacitación")
-    set_value_text(r.cells[1], txt)
-    make_label_gray(r.cells[2],"6. Ingeniero"); set_value_text(r.cells[3], order.ingeniero_nombre)
-
-    r=t.add_row(); set_cell_color(r.cells[0],'FFFFFF'); set_cell_color(r.cells[1],'FFFFFF')
-    make_label_gray(r.cells[2],"7. ID Ticket"); set_value_text(r.cells[3], order.ticket_id)
-
-    # B. Equipo
-    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " B. DATOS DEL EQUIPO")
-    r=t.add_row()
-    for i,x in enumerate(["Marca","Modelo","Serie","Descripción"]): make_label_gray(r.cells[i], x)
-    eq = order.equipos.first()
-    r=t.add_row()
-    if eq:
-        set_value_text(r.cells[0], eq.marca); set_value_text(r.cells[1], eq.modelo)
-        set_value_text(r.cells[2], eq.serie); set_value_text(r.cells[3], eq.descripcion)
-    else: r.cells[0].merge(r.cells[3]); set_value_text(r.cells[0], "Sin equipo.")
-
-    # C. Datos Técnicos
-    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " C. DATOS TÉCNICOS")
-    r=t.add_row(); make_label_gray(r.cells[0],"1. Título"); r.cells[1].merge(r.cells[3]); set_value_text(r.cells[1], order.titulo)
-    
-    r=t.add_row(); make_label_gray(r.cells[0],"2. Actividades"); c=r.cells[1]; c.merge(r.cells[3]); c.text=""
-    c.paragraphs[0].add_run(str(order.actividades)).font.size=Pt(9)
-    
-    # Evidencias en Word individual
-    if order.evidencias.exists():
-        c.paragraphs[0].add_run("\n\n--- EVIDENCIA FOTOGRÁFICA ---\n").bold=True
-        for f in order.evidencias.all():
-            if f.archivo and os.path.exists(f.archivo.path):
-                try: c.paragraphs[0].add_run().add_picture(f.archivo.path, width=Inches(2.5))
-                except: pass
-
-    r=t.add_row(); make_label_gray(r.cells[0],"3. Comentarios"); r.cells[1].merge(r.cells[3]); set_value_text(r.cells[1], order.comentarios)
-
-    # D. Costos
-    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " D. COSTOS Y TIEMPOS")
-    r=t.add_row(); make_label_gray(r.cells[0],"Tiempo (hrs)"); set_value_text(r.cells[1], order.horas)
-    make_label_gray(r.cells[2],"Costo"); set_value_text(r.cells[3], str(order.costo_mxn))
-
-    # E. Firmas
-    r=t.add_row(); r.cells[0].merge(r.cells[3]); make_header_blue(r.cells[0], " E. ACEPTACIÓN DEL SERVICIO")
-    r=t.add_row(); r.cells[0].merge(r.cells[3])
-    r.cells[0].paragraphs[0].add_run("Al firmar este documento se da por aceptada la conformidad de la entrega y finalización de los servicios y/o trabajos realizados. Este documento será comprobante del servicio realizado. Cualquier cambio posterior a la instalación (reinstalación, modificaciones, reubicación, reconfiguración o implementación adicional) podrá generar cargos extra. Es responsabilidad del cliente realizar el respaldo de la información contenida en los equipos antes de la atención del servicio. ").font.size=Pt(9)
-
-    r=t.add_row(); c=r.cells[0]; c.merge(r.cells[3]); ts=c.add_table(rows=1,cols=3); ts.autofit=False; ts.alignment=1
-    w3 = int(w_total/3)
-    for cl in ts.rows[0].cells: cl.width = w3
-
-    # Buscador de firmas
-    def find_u(n):
-        if not n: return None
-        target = str(n).lower().strip()
-        for u in User.objects.all():
-            fn = (u.get_full_name() or "").lower().strip()
-            un = u.username.lower().strip()
-            if fn == target or un == target: return u
-        return None
-
-    fi = None; ui = find_u(order.ingeniero_nombre)
-    if ui:
-        if hasattr(ui,'engineerprofile') and ui.engineerprofile.firma: fi=ui.engineerprofile.firma
-        elif hasattr(ui,'profile') and ui.profile.firma: fi=ui.profile.firma
-    
-    fv = None; uv = find_u(order.contacto_nombre)
-    if uv:
-        if hasattr(uv,'engineerprofile') and uv.engineerprofile.firma: fv=uv.engineerprofile.firma
-        elif hasattr(uv,'profile') and uv.profile.firma: fv=uv.profile.firma
-    
-# Firma del Visor (Ejecutivo de Ventas)
-    fv = None
-    nombre_visor = ""
-    if order.visor:
-     nombre_visor = order.visor.get_full_name() or order.visor.username
-    if hasattr(order.visor, 'profile') and order.visor.profile.firma:
-        fv = order.visor.profile.firma
-
-# -----------------------------------------------------------------------------------
-    # ESTE BLOQUE DEBE TENER 4 ESPACIOS AL INICIO (ESTAR DENTRO DE LA FUNCIÓN)
-    # -----------------------------------------------------------------------------------
-    
-    insert_signature(ts.cell(0,0), "Ingeniero de Soporte", fi, order.ingeniero_nombre)
-    insert_signature(ts.cell(0,1), "Cliente", order.firma, order.cliente_contacto)
-    
-    # Esta es la línea nueva para el Visor
-    insert_signature(ts.cell(0,2), "Contacto Ventas (Visor)", fv, nombre_visor)
+    from . import documentos
+    doc = documentos.generar_word_orden(order)
 
     resp = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
     resp['Content-Disposition'] = f'attachment; filename="Orden_{order.folio}.docx"'
-    doc.save(resp)
+    with medir('docx'):
+        doc.save(resp)
     
     return resp
\ No newline at end of file
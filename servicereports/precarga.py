@@ -0,0 +1,57 @@
+"""
+Precalentamiento del proceso antes de que gunicorn haga fork de los workers.
+
+Con preload_app el master ejecuta esto una vez; los workers heredan por copy-on-write
+las plantillas compiladas, el URLconf, las fuentes de WeasyPrint y el logo, en lugar
+de construirlos cada uno en su primera petición.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger('gunicorn.error')
+
+
+def precompilar_plantillas():
+    """Compila todas las plantillas del proyecto; el loader cacheado las guarda en memoria."""
+    total = 0
+    for directorio in settings.TEMPLATES[0]['DIRS']:
+        for ruta in sorted(directorio.rglob('*.html')):
+            try:
+                get_template(ruta.relative_to(directorio).as_posix())
+                total += 1
+            except (TemplateDoesNotExist, TemplateSyntaxError) as e:
+                logger.warning("Plantilla no precompilada %s: %s", ruta, e)
+    return total
+
+
+def precargar(documentos=True):
+    inicio = time.perf_counter()
+    plantillas = precompilar_plantillas()
+    # Fuerza la construcción de los patrones de URL (normalmente en la primera petición)
+    get_resolver().url_patterns
+
+    if documentos:
+        from orders import documentos as docs
+        import orders.ia  # noqa: F401
+
+        docs.logo_bytes()
+        try:
+            docs.precalentar_fuentes()
+        except Exception:
+            # Sin Pango/fontconfig el worker igual arranca; el PDF fallará donde se use
+            logger.exception("No se pudo inicializar WeasyPrint")
+
+    # Ninguna conexión abierta en el master debe heredarse a los workers; si algo
+    # llegó a crear el pool de psycopg aquí, se cierra para que cada worker abra el suyo
+    # (close_pool() no hace nada si la base no usa pool; cerrar uno sin abrir no conecta)
+    connections.close_all()
+    for conexion in connections.all():
+        if hasattr(conexion, 'close_pool'):
+            conexion.close_pool()
+    logger.info("Precarga lista: %d plantillas en %.0f ms", plantillas, (time.perf_counter() - inicio) * 1000)
@@ -0,0 +1,18 @@
+"""
+Settings por perfil. DJANGO_ENV elige cuál se carga:
+  dev  (por defecto) -> servicereports/settings/dev.py
+  prod               -> servicereports/settings/prod.py
+DJANGO_SETTINGS_MODULE sigue siendo "servicereports.settings".
+"""
+import os
+
+ENTORNO = os.getenv("DJANGO_ENV", "dev").lower()
+
+if ENTORNO in ("prod", "production", "produccion"):
+    from .prod import *  # noqa: F401,F403
+elif ENTORNO in ("dev", "desarrollo", "local"):
+    from .dev import *  # noqa: F401,F403
+else:
+    from django.core.exceptions import ImproperlyConfigured
+
+    raise ImproperlyConfigured(f"DJANGO_ENV desconocido: {ENTORNO!r} (usa 'dev' o 'prod')")
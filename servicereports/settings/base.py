@@ -30,15 +30,13 @@ ssl.create_default_context = _insecure_create_default_context
 # ------------------------------------------------------------
 # Rutas base y Variables
 # ------------------------------------------------------------
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
 load_dotenv(dotenv_path=BASE_DIR / ".env", override=True)
 
 # ------------------------------------------------------------
 # Seguridad y Debug
 # ------------------------------------------------------------
-SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "django-insecure-clave-maestra-2025")
-DEBUG = True
-ALLOWED_HOSTS = ['*']
+# DEBUG, ALLOWED_HOSTS y SECRET_KEY los define cada perfil (dev.py / prod.py)
 # Agrega tu dominio de ngrok a la lista de orígenes de confianza
 CSRF_TRUSTED_ORIGINS = [
     'https://gena-uncontributory-rohan.ngrok-free.dev',
@@ -54,6 +52,8 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    # Lookups de pg_trgm (trigram_similar / trigram_word_similar) del catálogo de materiales
+    "django.contrib.postgres",
     
     # --- NECESARIO PARA AUTH SOCIAL ---
     "django.contrib.sites", 
@@ -77,6 +77,8 @@ SITE_ID = 1  # Requerido por allauth
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    # Métricas por petición (Server-Timing, /metricas/, log de peticiones lentas)
+    "orders.middleware.MetricasMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -92,6 +94,23 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "servicereports.urls"
 
+# ------------------------------------------------------------
+# Métricas y log de peticiones lentas
+# ------------------------------------------------------------
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "1000"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # Para que Prometheus lea /metricas/prometheus/
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "orders.lento": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+    },
+}
+
 # ------------------------------------------------------------
 # Templates
 # ------------------------------------------------------------
@@ -99,8 +118,15 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
+            # Plantillas compiladas una sola vez por proceso (runserver limpia la caché
+            # al editar un archivo). Con "loaders" explícito no se puede usar APP_DIRS.
+            "loaders": [
+                ("django.template.loaders.cached.Loader", [
+                    "django.template.loaders.filesystem.Loader",
+                    "django.template.loaders.app_directories.Loader",
+                ]),
+            ],
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -121,25 +147,108 @@ WSGI_APPLICATION = "servicereports.wsgi.application"
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'serviciotech',
-        'USER': 'serviciotech',
-        'PASSWORD': 'Inovatech2025',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.getenv("DB_NAME", "serviciotech"),
+        'USER': os.getenv("DB_USER", "serviciotech"),
+        'PASSWORD': os.getenv("DB_PASSWORD", ""),
+        'HOST': os.getenv("DB_HOST", "localhost"),
+        'PORT': os.getenv("DB_PORT", "5432"),
     }
 }
 
+# Pool de conexiones de psycopg3 (Django 5.1): cada worker reutiliza conexiones
+# abiertas en lugar de conectarse y autenticarse en cada petición.
+# El pool es por proceso: conexiones totales = workers de gunicorn x DB_POOL_MAX
+# (un worker sync solo usa una a la vez). Con DB_POOL=0 se usan conexiones
+# persistentes clásicas (CONN_MAX_AGE).
+if os.getenv("DB_POOL", "1") != "0":
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv("DB_POOL_MIN", "1")),
+            'max_size': int(os.getenv("DB_POOL_MAX", "4")),
+            'timeout': float(os.getenv("DB_POOL_TIMEOUT", "10")),  # espera máx. por una conexión libre
+            'max_idle': float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+            'max_lifetime': float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+# Verifica la conexión antes de usarla (reinicios de Postgres, cortes de red);
+# con pool, Django se lo pasa como ConnectionPool.check_connection
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# ------------------------------------------------------------
+# Caché y sesiones
+# ------------------------------------------------------------
+# CACHE_URL elige el backend compartido por todos los workers:
+#   redis://localhost:6379/1   -> Redis (o compatible: Valkey, KeyDB); requiere `pip install redis`
+#   file:///var/tmp/serviciotech-cache -> archivos en disco
+#   vacío -> lo que defina el perfil (memoria local en dev, archivos en prod)
+# Los fragmentos cacheados incluyen URLs de estáticos con hash: sube CACHE_VERSION
+# al desplegar cambios de CSS/imágenes si la caché sobrevive al despliegue.
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_VERSION = int(os.getenv("CACHE_VERSION", "1"))
+
+
+def cache_desde_url(url):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": url,
+                "KEY_PREFIX": "serviciotech", "VERSION": CACHE_VERSION}
+    if url.startswith("file://"):
+        return {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": url.removeprefix("file://"), "VERSION": CACHE_VERSION,
+                "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "20000"))}}
+    return {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "serviciotech",
+            "VERSION": CACHE_VERSION}
+
+
+CACHES = {"default": cache_desde_url(CACHE_URL)}
+
+# Sesión leída de la caché; la BD solo se consulta si la caché no la tiene
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
 # ------------------------------------------------------------
 # Estáticos y Media
 # ------------------------------------------------------------
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# Django 5.1 ya no lee STATICFILES_STORAGE: sin STORAGES los estáticos salían sin hash
+# ni comprimir. collectstatic genera nombres con hash + variantes .gz/.br, y WhiteNoise
+# sirve los archivos con hash con "Cache-Control: max-age=315360000, immutable".
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
+
+# Paquetes que arma `manage.py build_static` (concatenados y minificados) y que
+# base.html carga con {% paquete %}; con DEBUG se cargan los archivos sueltos.
+STATIC_BUNDLES = {
+    "orders/dist/app.css": [
+        "vendor/bootstrap-5.3.3/bootstrap.min.css",
+        "vendor/bootstrap-icons-1.13.1/bootstrap-icons.min.css",
+        "orders/style.css",
+        "orders/print.css",
+    ],
+    "orders/dist/app.js": [
+        "vendor/bootstrap-5.3.3/bootstrap.bundle.min.js",
+        "orders/equipos.js",
+        "orders/signature.js",
+        "orders/preview.js",
+    ],
+}
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# /media/ siempre pasa por orders.views.media_protegida (pide sesión). Después de
+# revisar permisos, la transferencia la hace:
+#   ""       -> gunicorn con FileResponse (sendfile del sistema) y soporte de rangos
+#   "nginx"  -> nginx vía X-Accel-Redirect, con una location interna como:
+#                 location /media-interna/ { internal; alias /ruta/a/media/; }
+#   "apache" -> Apache vía X-Sendfile (mod_xsendfile) con la ruta absoluta
+MEDIA_SERVIDOR = os.getenv("MEDIA_SERVIDOR", "")
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/media-interna/")
+
 # ------------------------------------------------------------
 # Configuración Regional
 # ------------------------------------------------------------
@@ -154,11 +263,13 @@ USE_TZ = True
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Configuración de Backends para soportar ambos logins
+# Ambos son los de Django/allauth, pero leen el usuario de la caché en cada
+# petición (orders/autenticacion.py)
 AUTHENTICATION_BACKENDS = [
     # Necesario para entrar al admin de django con usuario/contraseña normal
-    'django.contrib.auth.backends.ModelBackend',
+    'orders.autenticacion.ModelBackendEnCache',
     # Necesario para entrar con Microsoft (Allauth)
-    'allauth.account.auth_backends.AuthenticationBackend',
+    'orders.autenticacion.AllauthBackendEnCache',
 ]
 
 # Rutas
@@ -201,7 +312,7 @@ SOCIALACCOUNT_PROVIDERS = {
     }
 }
 
-print(f"✅ SISTEMA REINICIADO: Conexión BD OK | Login MS (Tenant Fijo) | Parche SSL SMTP Activo")
+print("✅ SISTEMA REINICIADO: Conexión BD OK | Login MS (Tenant Fijo) | Parche SSL SMTP Activo")
 
 # --- PARCHE PARA NGROK (OBLIGATORIO) ---
 # Le dice a Django que confíe en que ngrok maneja la seguridad
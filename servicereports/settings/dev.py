@@ -0,0 +1,13 @@
+"""Perfil de desarrollo: DEBUG activo y valores por defecto para trabajar en local."""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES
+
+DEBUG = True
+ALLOWED_HOSTS = ['*']
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "django-insecure-clave-maestra-2025")
+
+# Credenciales de la base local de siempre (en prod vienen del entorno)
+DATABASES['default']['PASSWORD'] = os.getenv("DB_PASSWORD", "Inovatech2025")
+
@@ -0,0 +1,31 @@
+"""
+Perfil de producción (DJANGO_ENV=prod): DEBUG apagado, secretos desde el entorno
+y caché compartida entre los workers de gunicorn.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import CACHE_URL, CACHES
+
+# Con DEBUG apagado Django deja de guardar cada consulta en connection.queries
+DEBUG = False
+
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "")
+if not SECRET_KEY:
+    raise ImproperlyConfigured("Define DJANGO_SECRET_KEY para el perfil prod")
+
+ALLOWED_HOSTS = [h.strip() for h in os.getenv("DJANGO_ALLOWED_HOSTS", "").split(",") if h.strip()]
+if not ALLOWED_HOSTS:
+    raise ImproperlyConfigured("Define DJANGO_ALLOWED_HOSTS (separados por coma) para el perfil prod")
+
+# Sin CACHE_URL, caché en disco: la comparten todos los workers del servidor
+if not CACHE_URL:
+    CACHES['default'] = cache_desde_url(  # noqa: F405
+        "file://" + os.getenv("CACHE_DIR", "/var/tmp/serviciotech-cache")
+    )
+
+# Todo se sirve detrás de HTTPS (ver SECURE_PROXY_SSL_HEADER en base.py)
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
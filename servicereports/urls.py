@@ -3,7 +3,7 @@ from django.urls import path, include
 
 # --- 1. AGREGA ESTAS DOS IMPORTACIONES NUEVAS ---
 from django.conf import settings
-from django.conf.urls.static import static
+from orders.views import media_protegida
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,8 +11,9 @@ urlpatterns = [
     path('', include('orders.urls')), 
 ]
 
-# --- 2. AGREGA ESTE BLOQUE AL FINAL ---
-# Esto le dice a Django: "Si estamos en modo DEBUG, sirve las fotos tú mismo"
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    
\ No newline at end of file
+# --- 2. ARCHIVOS MEDIA (evidencias, firmas) ---
+# Siempre por Django para revisar la sesión; el envío del archivo lo puede hacer
+# nginx/Apache (ver MEDIA_SERVIDOR en settings)
+urlpatterns += [
+    path(settings.MEDIA_URL.lstrip('/') + '<path:ruta>', media_protegida, name='media'),
+]
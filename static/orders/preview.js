@@ -0,0 +1,71 @@
+/* Vista rápida de órdenes (panel lateral) en order_list y memory_selection.
+ *
+ * El servidor ya manda ETag y Cache-Control; aquí además cada vista se guarda en
+ * memoria mientras la página está abierta, se pide al pasar el mouse por el ojo
+ * y, al abrir una, se precargan las siguientes filas de la tabla.
+ */
+(function () {
+  const vistas = new Map();
+  const PRECARGAR = 3;
+
+  function urlVista(id) {
+    // data-preview-url trae la URL de la orden 0 ("/preview/0/")
+    const plantilla = document.getElementById('quickViewOffcanvas').dataset.previewUrl;
+    return plantilla.replace('/0/', `/${id}/`);
+  }
+
+  function cargar(id) {
+    id = String(id);
+    if (!vistas.has(id)) {
+      const peticion = fetch(urlVista(id), { credentials: 'same-origin' })
+        .then(res => {
+          if (!res.ok) throw new Error('Error HTTP ' + res.status);
+          return res.text();
+        })
+        .catch(err => {
+          vistas.delete(id); // que el siguiente clic lo reintente
+          throw err;
+        });
+      vistas.set(id, peticion);
+    }
+    return vistas.get(id);
+  }
+
+  function precargarSiguientes(id) {
+    const ids = Array.from(document.querySelectorAll('[data-preview]'), b => b.dataset.preview);
+    const i = ids.indexOf(String(id));
+    if (i === -1) return;
+    ids.slice(i + 1, i + 1 + PRECARGAR).forEach(sig => cargar(sig).catch(() => {}));
+  }
+
+  window.openQuickView = function (event, orderId) {
+    // Importante: detener la propagación para que no se dispare el click de la fila
+    event.stopPropagation();
+
+    const panel = document.getElementById('quickViewOffcanvas');
+    bootstrap.Offcanvas.getOrCreateInstance(panel).show();
+
+    const loader = document.getElementById('offcanvas-loader');
+    const content = document.getElementById('offcanvas-content');
+    loader.classList.remove('d-none');
+    content.innerHTML = '';
+
+    cargar(orderId)
+      .then(html => {
+        content.innerHTML = html;
+        loader.classList.add('d-none');
+        precargarSiguientes(orderId);
+      })
+      .catch(error => {
+        console.error(error);
+        content.innerHTML = '<div class="p-5 text-center text-danger"><i class="bi bi-exclamation-triangle"></i> Error al cargar datos.</div>';
+        loader.classList.add('d-none');
+      });
+  };
+
+  // Al pasar el mouse por el ojo se adelanta la petición (suele llegar antes del clic)
+  document.addEventListener('mouseover', event => {
+    const boton = event.target.closest('[data-preview]');
+    if (boton) cargar(boton.dataset.preview).catch(() => {});
+  });
+})();